@@ -15,121 +15,20 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Import bot va dispatcher
-from loader import dp, bot, user_db
+from loader import dp, bot, user_db, group_db, channel_db, async_user_db, db_profiler
 
 # Handlerlarni import qilish
 import handlers
+from handlers.admin.admin_broadcast import resume_broadcasts
+from utils.misc.reminders import reminder_scheduler
+from utils.misc.activity import activity_tracker, ActivityMiddleware
+from utils.db_api.migrations import migrate
 
+# Faollik (last_active) har bir update da buferga yoziladi
+dp.middleware.setup(ActivityMiddleware())
 
-def run_migrations():
-    """
-    Database migratsiyalarni ishga tushirish
-    Yangi ustunlar qo'shish (agar mavjud bo'lmasa)
-    """
-    logger.info("🔄 Database migratsiyalar tekshirilmoqda...")
-
-    migrations = [
-        # Kelajakda yangi ustunlar qo'shish uchun
-        # {
-        #     'name': 'new_column',
-        #     'table': 'Users',
-        #     'sql': 'ALTER TABLE Users ADD COLUMN new_column TEXT'
-        # },
-    ]
-
-    for migration in migrations:
-        try:
-            # Ustun mavjudligini tekshirish
-            check_sql = f"PRAGMA table_info({migration['table']})"
-            columns = user_db.execute(check_sql, fetchall=True)
-            column_names = [col[1] for col in columns]
-
-            if migration['name'] not in column_names:
-                # Ustun yo'q - qo'shish
-                user_db.execute(migration['sql'], commit=True)
-                logger.info(f"✅ Migration qo'shildi: {migration['name']}")
-            else:
-                logger.info(f"ℹ️ Migration mavjud: {migration['name']}")
-
-        except Exception as e:
-            logger.error(f"❌ Migration xato ({migration['name']}): {e}")
-
-
-def create_all_tables():
-    """Barcha database jadvallarini yaratish"""
-    logger.info("📦 Database jadvallari yaratilmoqda...")
-
-    try:
-        # 1. Foydalanuvchilar
-        user_db.create_table_users()
-        logger.info("  ✅ Users jadvali")
-
-        # 2. Adminlar
-        user_db.create_table_admins()
-        logger.info("  ✅ Admins jadvali")
-
-        # 3. Kurslar
-        user_db.create_table_courses()
-        logger.info("  ✅ Courses jadvali")
-
-        # 4. Modullar
-        user_db.create_table_modules()
-        logger.info("  ✅ Modules jadvali")
-
-        # 5. Darslar
-        user_db.create_table_lessons()
-        logger.info("  ✅ Lessons jadvali")
-
-        # 6. Dars materiallari
-        user_db.create_table_lesson_materials()
-        logger.info("  ✅ LessonMaterials jadvali")
-
-        # 7. Testlar
-        user_db.create_table_tests()
-        logger.info("  ✅ Tests jadvali")
-
-        # 8. Test savollari
-        user_db.create_table_questions()
-        logger.info("  ✅ Questions jadvali")
-
-        # 9. Foydalanuvchi progressi
-        user_db.create_table_user_progress()
-        logger.info("  ✅ UserProgress jadvali")
-
-        # 10. Test natijalari
-        user_db.create_table_test_results()
-        logger.info("  ✅ TestResults jadvali")
-
-        # 11. Fikr-mulohazalar
-        user_db.create_table_feedbacks()
-        logger.info("  ✅ Feedbacks jadvali")
-
-        # 12. To'lovlar
-        user_db.create_table_payments()
-        logger.info("  ✅ Payments jadvali")
-
-        # 13. Qo'lda dostup
-        user_db.create_table_manual_access()
-        logger.info("  ✅ ManualAccess jadvali")
-
-        # 14. Sertifikatlar
-        user_db.create_table_certificates()
-        logger.info("  ✅ Certificates jadvali")
-
-        # 15. Sozlamalar
-        user_db.create_table_settings()
-        logger.info("  ✅ Settings jadvali")
-
-        #16 referal havola
-        user_db.create_table_referrals()
-        logger.info("  ✅ Referal  jadvali")
-
-        logger.info("📦 Barcha jadvallar tayyor! (15 ta)")
-        return True
-
-    except Exception as e:
-        logger.error(f"❌ Jadval yaratishda xato: {e}")
-        return False
+# Orqa fon vazifalari (on_shutdown da to'xtatiladi)
+background_tasks = []
 
 
 async def on_startup(dispatcher):
@@ -138,15 +37,14 @@ async def on_startup(dispatcher):
     logger.info("🚀 O'QUV MARKAZ BOT ISHGA TUSHMOQDA...")
     logger.info("=" * 50)
 
-    # Database jadvallarini yaratish
-    create_all_tables()
+    # Database sxemasi: yangilangan bazada faqat PRAGMA user_version o'qiladi,
+    # bajarilmagan migratsiyalar bitta tranzaksiyada qo'llanadi.
+    # Xato bo'lsa bot ishga tushmaydi - kod eski sxemada ishlay olmaydi.
+    migrate(user_db)
 
-    # Migratsiyalarni ishga tushirish
-    try:
-        run_migrations()
-        logger.info("✅ Database migratsiyalar tayyor")
-    except Exception as e:
-        logger.error(f"❌ Migration xato: {e}")
+    # Sozlamalarni xotiraga yuklash (keyin bazadan o'qilmaydi)
+    settings = user_db.load_settings()
+    logger.info(f"⚙️ Sozlamalar yuklandi: {len(settings)} ta")
 
     # Bot ma'lumotlarini olish
     try:
@@ -162,6 +60,19 @@ async def on_startup(dispatcher):
     except:
         pass
 
+    # Tugallanmagan reklamalarni davom ettirish
+    try:
+        await resume_broadcasts()
+    except Exception as e:
+        logger.error(f"❌ Reklamalarni tiklashda xato: {e}")
+
+    # Faollikni (last_active) davriy saqlash
+    background_tasks.append(asyncio.create_task(activity_tracker.run()))
+
+    # Kunlik eslatmalar jadvali
+    background_tasks.append(asyncio.create_task(reminder_scheduler()))
+    logger.info("⏰ Kunlik eslatma jadvali ishga tushdi")
+
     logger.info("=" * 50)
     logger.info("✅ BOT TAYYOR!")
     logger.info("=" * 50)
@@ -173,10 +84,26 @@ async def on_shutdown(dispatcher):
     logger.info("⏹ BOT TO'XTATILMOQDA...")
     logger.info("=" * 50)
 
+    # Orqa fon vazifalarini to'xtatish
+    for task in background_tasks:
+        task.cancel()
+
     # Connectionlarni yopish
     await dp.storage.close()
     await dp.storage.wait_closed()
 
+    # Buferdagi faollikni saqlab qo'yish
+    await activity_tracker.flush()
+
+    # SQL statistikasini saqlab qo'yish (profiler yoqilgan bo'lsa)
+    if db_profiler:
+        db_profiler.dump()
+
+    # Database ulanishlarini yopish
+    async_user_db.close()
+    for db in (user_db, group_db, channel_db):
+        db.close()
+
     logger.info("=" * 50)
     logger.info("✅ BOT TO'XTATILDI")
     logger.info("=" * 50)
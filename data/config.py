@@ -8,3 +8,15 @@ env.read_env()
 BOT_TOKEN = env.str("BOT_TOKEN")  # Bot toekn
 ADMINS = list(map(int, env.list("ADMINS")))
 IP = env.str("ip")  # Xosting ip manzili
+
+
+# SQL profiler (ixtiyoriy, faqat tahlil uchun yoqiladi)
+DB_PROFILE = env.bool("DB_PROFILE", False)
+DB_PROFILE_SAMPLE_RATE = env.float("DB_PROFILE_SAMPLE_RATE", 0.1)  # 0..1
+DB_SLOW_QUERY_MS = env.float("DB_SLOW_QUERY_MS", 100)
+
+# Foydalanuvchi faolligi (last_active) bazaga shuncha soniyada bir marta yoziladi
+ACTIVITY_FLUSH_INTERVAL = env.int("ACTIVITY_FLUSH_INTERVAL", 30)
+
+# Dashboard va hisobotlar statistikasi keshi (soniya)
+STATS_CACHE_TTL = env.int("STATS_CACHE_TTL", 60)
@@ -11,46 +11,81 @@ from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Text
 from aiogram.utils import exceptions
 
-from loader import dp, bot, user_db
+from loader import dp, bot, user_db, async_user_db
 from keyboards.inline.admin_keyboards import broadcast_menu, back_button
 from keyboards.default.admin_keyboards import admin_cancel_button, admin_confirm_keyboard, admin_skip_button, \
     remove_keyboard
 from states.admin_states import BroadcastStates
 from handlers.admin.admin_start import admin_required
+from utils.misc.broadcast import BroadcastEngine, BLOCKED
 
 # ============================================================
 #                BROADCAST MANAGER (MOTOR)
 # ============================================================
-# Bu klass xabar tarqatish jarayonini to'liq boshqaradi
+# Bu klass xabar tarqatish jarayonini to'liq boshqaradi.
+# Kampaniya va qabul qiluvchilar navbati bazada (BroadcastCampaigns / BroadcastOutbox)
+# saqlanadi, shuning uchun bot qayta ishga tushsa reklama to'xtagan joyidan davom etadi.
 
 active_broadcasts = {}  # Aktiv reklamalarni saqlash uchun
 
 
 class BroadcastCampaign:
-    def __init__(self, campaign_id, users, message_data, creator_id, schedule_time=None):
-        self.id = campaign_id
-        self.users = users  # Userlar ro'yxati (ID lar)
-        self.data = message_data  # Xabar matni, media, tugmalar
-        self.creator_id = creator_id
-        self.schedule_time = schedule_time
-
-        # Statuslar
-        self.running = True
-        self.paused = False
-        self.stopped = False
-
-        # Statistika
-        self.sent = 0
-        self.failed = 0
-        self.blocked = 0
-        self.total = len(users)
+    STATUS_INTERVAL = 3  # Status xabarini yangilash (va natijalarni saqlash) oralig'i (soniya)
+    BATCH_SIZE = 500     # Navbatdan bir marta o'qiladigan qabul qiluvchilar soni
+
+    def __init__(self, campaign: dict):
+        self.id = campaign['id']
+        self.data = campaign['payload']  # Xabar matni, media, tugmalar
+        self.creator_id = campaign['creator_id']
+        self.schedule_time = campaign['scheduled_at']
+        self.initial_status = campaign['status']
+        self.total = campaign['total']
+        self.cursor = campaign['cursor']  # Shu ID gacha barcha yozuvlar qayta ishlangan
+        self.audience_done = campaign['audience_done']  # Navbat to'liq to'ldirilganmi
+
+        keyboard = self.data.get('keyboard')
+        self.keyboard = types.InlineKeyboardMarkup.to_object(keyboard) if keyboard else None
+
+        # Oldingi ishga tushirishlardagi natijalar
+        self._base_sent = campaign['sent']
+        self._base_blocked = campaign['blocked']
+        self._base_failed = campaign['failed']
+
+        # Yuborish dvigateli (tezlik limiti, parallel yuborish, flood-wait)
+        self.engine = BroadcastEngine(self._send, on_result=self._on_result)
+
+        self._results = []        # Bazaga hali yozilmagan natijalar: (status, error, outbox_id)
+        self._dead = []           # Botni bloklagan userlar (Users.deliverable ga yoziladi)
+        self._in_flight = set()   # Navbatdan o'qilgan, lekin natijasi yo'q yozuvlar
+        self._last_read = self.cursor
         self.status_msg = None
 
-    async def start(self):
-        """Reklamani ishga tushirish"""
+    # Statistika: bazadagi + joriy ishga tushirish
+    @property
+    def sent(self):
+        return self._base_sent + self.engine.sent
+
+    @property
+    def failed(self):
+        return self._base_failed + self.engine.failed
+
+    @property
+    def blocked(self):
+        return self._base_blocked + self.engine.blocked
+
+    @property
+    def paused(self):
+        return self.engine.paused
+
+    @property
+    def stopped(self):
+        return self.engine.stopped
+
+    async def start(self, resumed=False):
+        """Reklamani ishga tushirish (resumed=True - bot qayta ishga tushgandan keyin)"""
 
         # 1. Agar vaqt belgilangan bo'lsa, kutamiz
-        if self.schedule_time:
+        if self.schedule_time and self.initial_status == 'scheduled':
             now = datetime.now()
             delay = (self.schedule_time - now).total_seconds()
             if delay > 0:
@@ -62,96 +97,196 @@ class BroadcastCampaign:
                 )
                 await asyncio.sleep(delay)
 
+        if self.stopped:
+            await self._finish()
+            return
+
+        if self.initial_status == 'paused':
+            self.engine.pause()
+        if not self.paused:
+            await async_user_db.update_broadcast(self.id, status='running')
+
         # 2. Jarayon boshlanishi haqida xabar
+        start_text = "🔄 Qayta tiklandi..." if resumed else "🚀 Boshlanmoqda..."
         self.status_msg = await bot.send_message(
             self.creator_id,
-            self._get_report_text("🚀 Boshlanmoqda..."),
+            self._get_report_text("⏸ Pauza" if self.paused else start_text),
             reply_markup=self._get_control_keyboard()
         )
 
-        # 3. Asosiy sikl
-        for i, user_id in enumerate(self.users, 1):
-            # Agar to'xtatilgan bo'lsa
-            if self.stopped:
-                break
+        # 3. Yuborish (statistika alohida vazifada yangilanadi)
+        reporter = asyncio.create_task(self._report_loop())
+        try:
+            await self.engine.run(self._recipients())
+            reporter.cancel()
+            await self._finish()
+        except asyncio.CancelledError:
+            # Bot to'xtatilmoqda - kampaniya keyingi ishga tushirishda davom etadi
+            reporter.cancel()
+            await self._interrupt()
+            raise
+        except Exception as e:
+            reporter.cancel()
+            print(f"❌ Reklama #{self.id} uzildi: {e}")
+            await self._interrupt()
+
+    async def _is_drained(self) -> bool:
+        """Auditoriya to'liq navbatga qo'shilgan va navbatda yuborilmagan yozuv qolmaganmi"""
+        campaign = await async_user_db.get_broadcast(self.id)
+        if not campaign or not campaign['audience_done']:
+            return False
+        return await async_user_db.count_broadcast_pending(self.id) == 0
+
+    async def _interrupt(self):
+        """
+        Xato yoki bot to'xtashi: natijalarni saqlash, holat o'zgarmaydi
+
+        Kampaniya 'running' / 'paused' holatida qoladi, navbat va kursor
+        saqlanadi - resume_broadcasts uni bot qayta ishga tushganda davom ettiradi.
+        """
+        try:
+            await self._flush()
+        except Exception as e:
+            print(f"❌ Reklama #{self.id} natijalarini saqlashda xato: {e}")
 
-            # Agar pauza bo'lsa, kutib turamiz
-            while self.paused:
-                await asyncio.sleep(1)
-                if self.stopped: break
+        try:
+            text = self._get_report_text("⚠️ Uzildi (bot qayta ishga tushganda davom etadi)")
+            if self.status_msg:
+                await self.status_msg.edit_text(text)
+            else:
+                await bot.send_message(self.creator_id, text)
+        except:
+            pass
 
-            # Xabar yuborish
-            if isinstance(user_id, (tuple, list)):
-                user_id = user_id[0]  # Bazadan tuple qaytishi mumkin
+        if active_broadcasts.get(self.id) is self:
+            del active_broadcasts[self.id]
+
+    async def _finish(self):
+        """Natijalarni saqlash, holatni yopish va yakuniy hisobot"""
+        await self._flush()
+
+        if self.stopped:
+            final_status = "⛔️ To'xtatildi"
+            await async_user_db.update_broadcast(
+                self.id, status='stopped', finished_at=datetime.now().isoformat())
+        elif not await self._is_drained():
+            # Navbat o'qilmay qolgan (masalan, baza xatosi) - 'done' qilinmaydi
+            await self._interrupt()
+            return
+        else:
+            final_status = "✅ Yakunlandi"
+            await async_user_db.update_broadcast(
+                self.id, status='done', finished_at=datetime.now().isoformat())
 
-            success, error = await self._send_safe(user_id)
+        # Xato bilan tugaganlarni qayta yuborish imkoniyati
+        keyboard = None
+        if self.failed and not self.stopped:
+            keyboard = types.InlineKeyboardMarkup()
+            keyboard.add(types.InlineKeyboardButton(
+                f"🔁 Xatolarni qayta yuborish ({self.failed})", callback_data=f"broadcast:retry:{self.id}"))
 
-            if success:
-                self.sent += 1
-            else:
-                if error == "blocked":
-                    self.blocked += 1
-                else:
-                    self.failed += 1
-
-            # Har 20 ta xabarda statistika yangilash
-            if i % 20 == 0:
-                try:
-                    await self.status_msg.edit_text(
-                        self._get_report_text("📤 Yuborilmoqda..."),
-                        reply_markup=self._get_control_keyboard()
-                    )
-                except:
-                    pass
-
-            # Telegram limitlari uchun kichik pauza
-            await asyncio.sleep(0.05)
-
-        # 4. Yakunlash
-        final_status = "⛔️ To'xtatildi" if self.stopped else "✅ Yakunlandi"
         try:
-            await self.status_msg.edit_text(
-                self._get_report_text(final_status),
-                reply_markup=None  # Tugmalarni olib tashlaymiz
-            )
+            if self.status_msg:
+                await self.status_msg.edit_text(self._get_report_text(final_status), reply_markup=keyboard)
+            else:
+                await bot.send_message(self.creator_id, self._get_report_text(final_status), reply_markup=keyboard)
         except:
             pass
 
         # Ro'yxatdan o'chirish
-        if self.id in active_broadcasts:
+        if active_broadcasts.get(self.id) is self:
             del active_broadcasts[self.id]
 
-    async def _send_safe(self, user_id):
-        """Xavfsiz xabar yuborish funksiyasi"""
-        try:
-            text = self.data.get('text')
-            media_type = self.data.get('media_type')
-            media_id = self.data.get('media_id')
-            keyboard = self.data.get('keyboard')
-
-            if media_type == 'photo':
-                await bot.send_photo(user_id, media_id, caption=text, reply_markup=keyboard)
-            elif media_type == 'video':
-                await bot.send_video(user_id, media_id, caption=text, reply_markup=keyboard)
-            else:
-                await bot.send_message(user_id, text, reply_markup=keyboard, disable_web_page_preview=True)
-            return True, None
-
-        except exceptions.BotBlocked:
-            return False, "blocked"
-        except exceptions.UserDeactivated:
-            return False, "blocked"
-        except exceptions.RetryAfter as e:
-            await asyncio.sleep(e.timeout)
-            return await self._send_safe(user_id)
-        except Exception as e:
-            return False, str(e)
+    async def _recipients(self):
+        """
+        Navbatdan qabul qiluvchilarni qismlab o'qish: (outbox_id, telegram_id)
+
+        Navbat auditoriyadan bir sahifa oldinda to'ldiriladi (Users.id bo'yicha),
+        shuning uchun yuborish butun ro'yxat tayyor bo'lishini kutmaydi.
+        """
+        after_id = self.cursor
+        while not self.stopped:
+            if not self.audience_done:
+                scanned = await async_user_db.fill_broadcast_outbox(self.id, self.BATCH_SIZE)
+                if scanned < self.BATCH_SIZE:
+                    self.audience_done = True
+                    # Aniq son fill_broadcast_outbox da hisoblangan
+                    campaign = await async_user_db.get_broadcast(self.id)
+                    if campaign:
+                        self.total = campaign['total']
+
+            rows = await async_user_db.get_broadcast_pending(self.id, after_id, self.BATCH_SIZE)
+            if not rows:
+                if self.audience_done:
+                    return
+                continue
+            for outbox_id, telegram_id in rows:
+                self._in_flight.add(outbox_id)
+                self._last_read = outbox_id
+                yield outbox_id, telegram_id
+            after_id = rows[-1][0]
+
+    async def _on_result(self, item, status, error):
+        outbox_id = item[0]
+        self._in_flight.discard(outbox_id)
+        self._results.append((status, error, outbox_id))
+        if status == BLOCKED:
+            self._dead.append(item[1])
+
+    async def _flush(self):
+        """Yig'ilgan natijalar va kursorni bitta tranzaksiyada saqlash"""
+        results, self._results = self._results, []
+        dead, self._dead = self._dead, []
+        # Kursor: undan oldingi barcha yozuvlarning natijasi `results` ichida
+        cursor = min(self._in_flight) - 1 if self._in_flight else self._last_read
+
+        if results:
+            await async_user_db.save_broadcast_results(results)
+        if dead:
+            await async_user_db.mark_undeliverable(dead)
+        if results or cursor != self.cursor:
+            self.cursor = cursor
+            await async_user_db.update_broadcast(
+                self.id, cursor=cursor, sent=self.sent, blocked=self.blocked, failed=self.failed)
+
+    async def _report_loop(self):
+        """Status xabarini yangilash va natijalarni bazaga yozish"""
+        while True:
+            await asyncio.sleep(self.STATUS_INTERVAL)
+            try:
+                await self._flush()
+            except Exception as e:
+                print(f"❌ Reklama #{self.id} natijalarini saqlashda xato: {e}")
+
+            status = "⏸ Pauza" if self.paused else "📤 Yuborilmoqda..."
+            try:
+                await self.status_msg.edit_text(
+                    self._get_report_text(status),
+                    reply_markup=self._get_control_keyboard()
+                )
+            except:
+                pass
+
+    async def _send(self, item):
+        """Bitta userga xabar yuborish (xatolar dvigatelda qayta ishlanadi)"""
+        user_id = item[1]
+        text = self.data.get('text')
+        media_type = self.data.get('media_type')
+        media_id = self.data.get('media_id')
+        keyboard = self.keyboard
+
+        if media_type == 'photo':
+            await bot.send_photo(user_id, media_id, caption=text, reply_markup=keyboard)
+        elif media_type == 'video':
+            await bot.send_video(user_id, media_id, caption=text, reply_markup=keyboard)
+        else:
+            await bot.send_message(user_id, text, reply_markup=keyboard, disable_web_page_preview=True)
 
     def _get_report_text(self, status):
         progress = self.sent + self.failed + self.blocked
         percent = (progress / self.total * 100) if self.total > 0 else 0
 
-        return (
+        text = (
             f"📢 <b>Reklama #{self.id}</b>\n\n"
             f"📊 Holat: <b>{status}</b>\n"
             f"📈 Progress: {progress}/{self.total} ({percent:.1f}%)\n\n"
@@ -160,6 +295,15 @@ class BroadcastCampaign:
             f"❌ Xatolik: {self.failed}"
         )
 
+        if self.engine.started_at:
+            text += f"\n\n⚡️ Tezlik: {self.engine.speed:.1f} xabar/s"
+            eta = self.engine.eta(self.total - (progress - self.engine.processed))
+            if eta is not None and progress < self.total:
+                text += f"\n⏱ Qolgan vaqt: ~{timedelta(seconds=int(eta))}"
+            if self.engine.flood_waits:
+                text += f"\n⏳ Flood-wait: {self.engine.flood_waits} marta"
+        return text
+
     def _get_control_keyboard(self):
         keyboard = types.InlineKeyboardMarkup(row_width=2)
         if self.paused:
@@ -171,15 +315,38 @@ class BroadcastCampaign:
         keyboard.insert(types.InlineKeyboardButton("⛔️ To'xtatish", callback_data=f"broadcast:stop:{self.id}"))
         return keyboard
 
-    def pause(self):
-        self.paused = True
+    async def pause(self):
+        self.engine.pause()
+        await async_user_db.update_broadcast(self.id, status='paused')
+
+    async def resume(self):
+        self.engine.resume()
+        await async_user_db.update_broadcast(self.id, status='running')
+
+    async def stop(self):
+        self.engine.stop()
+        await async_user_db.update_broadcast(self.id, status='stopped')
+
 
-    def resume(self):
-        self.paused = False
+def launch_broadcast(campaign_id, resumed=False):
+    """Bazadagi kampaniyani ishga tushirish (orqa fonda)"""
+    row = user_db.get_broadcast(campaign_id)
+    if not row or campaign_id in active_broadcasts:
+        return None
 
-    def stop(self):
-        self.stopped = True
-        self.paused = False  # Loopdan chiqish uchun
+    campaign = BroadcastCampaign(row)
+    active_broadcasts[campaign_id] = campaign
+    asyncio.create_task(campaign.start(resumed=resumed))
+    return campaign
+
+
+async def resume_broadcasts():
+    """Bot ishga tushganda tugallanmagan reklamalarni davom ettirish"""
+    campaigns = await async_user_db.get_unfinished_broadcasts()
+    for row in campaigns:
+        launch_broadcast(row['id'], resumed=row['status'] != 'scheduled')
+    if campaigns:
+        print(f"📢 {len(campaigns)} ta tugallanmagan reklama tiklandi")
 
 
 # ============================================================
@@ -428,47 +595,30 @@ async def execute_broadcast(message: types.Message, state: FSMContext):
     data = await state.get_data()
     await state.finish()
 
-    # 1. Userlarni bazadan olish
-    users = []
-    if data['target'] == "all":
-        users = user_db.execute("SELECT telegram_id FROM Users", fetchall=True)
-    elif data['target'] == "paid":
-        users = user_db.execute(
-            "SELECT DISTINCT u.telegram_id FROM Users u JOIN Payments p ON u.id=p.user_id WHERE p.status='approved'",
-            fetchall=True)
-    elif data['target'] == "free":
-        users = user_db.execute(
-            "SELECT telegram_id FROM Users u WHERE NOT EXISTS (SELECT 1 FROM Payments p WHERE p.user_id=u.id AND p.status='approved')",
-            fetchall=True)
-    elif data['target'] == "course":
-        users = user_db.execute(
-            "SELECT DISTINCT u.telegram_id FROM Users u JOIN Payments p ON u.id=p.user_id WHERE p.course_id=? AND p.status='approved'",
-            (data['target_id'],), fetchall=True)
-
-    if not users:
-        await message.answer("❌ Xatolik: Userlar topilmadi.")
-        return
-
-    # Listga o'tkazish
-    user_ids = [u[0] for u in users]
-
-    # 2. Campaign yaratish
-    campaign_id = len(active_broadcasts) + 1
-    campaign = BroadcastCampaign(
-        campaign_id=campaign_id,
-        users=user_ids,
-        message_data=data,
+    # 1. Kampaniya va qabul qiluvchilar navbatini bazaga yozish
+    keyboard = data.get('keyboard')
+    payload = {
+        'text': data.get('text'),
+        'media_type': data.get('media_type'),
+        'media_id': data.get('media_id'),
+        'keyboard': keyboard.to_python() if keyboard else None
+    }
+    campaign_id = await async_user_db.create_broadcast(
         creator_id=message.chat.id,
-        schedule_time=data.get('schedule_time')
+        payload=payload,
+        target=data['target'],
+        target_id=data.get('target_id'),
+        scheduled_at=data.get('schedule_time')
     )
 
-    # 3. Global ro'yxatga qo'shish va ishga tushirish
-    active_broadcasts[campaign_id] = campaign
+    if not campaign_id:
+        await message.answer("❌ Xatolik: Userlar topilmadi.")
+        return
 
     await message.answer("✅ Qabul qilindi!", reply_markup=remove_keyboard())
 
-    # Orqa fonda ishga tushirish
-    asyncio.create_task(campaign.start())
+    # 2. Orqa fonda ishga tushirish
+    launch_broadcast(campaign_id)
 
 
 # ============================================================
@@ -476,10 +626,27 @@ async def execute_broadcast(message: types.Message, state: FSMContext):
 # ============================================================
 
 @dp.callback_query_handler(text_startswith="broadcast:")
+@admin_required
 async def control_broadcast(call: types.CallbackQuery):
     action, campaign_id = call.data.split(":")[1:]
     campaign_id = int(campaign_id)
 
+    if action == "retry":
+        if campaign_id in active_broadcasts:
+            await call.answer("⚠️ Bu reklama hali yuborilmoqda.", show_alert=True)
+            return
+        count = await async_user_db.retry_failed_broadcast(campaign_id)
+        if not count:
+            await call.answer("📭 Qayta yuboriladigan xabarlar yo'q.", show_alert=True)
+            return
+        await call.answer(f"🔁 {count} ta xabar qayta yuborilmoqda")
+        try:
+            await call.message.edit_reply_markup(reply_markup=None)
+        except:
+            pass
+        launch_broadcast(campaign_id, resumed=True)
+        return
+
     campaign = active_broadcasts.get(campaign_id)
 
     if not campaign:
@@ -487,13 +654,13 @@ async def control_broadcast(call: types.CallbackQuery):
         return
 
     if action == "pause":
-        campaign.pause()
+        await campaign.pause()
         await call.answer("⏸ Pauza qilindi")
     elif action == "resume":
-        campaign.resume()
+        await campaign.resume()
         await call.answer("▶️ Davom ettirilmoqda")
     elif action == "stop":
-        campaign.stop()
+        await campaign.stop()
         await call.answer("⛔️ To'xtatildi")
 
     # Klaviaturani yangilash (Xabar o'zi loop ichida yangilanadi, lekin biz darhol reaksiya beramiz)
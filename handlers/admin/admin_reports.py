@@ -5,16 +5,21 @@ Vaqt mintaqasi va mantiqiy xatolar to'g'irlangan versiya
 """
 
 from aiogram import types
+from html import escape
 import pytz  # <--- MUHIM: Vaqt mintaqasi uchun
 from datetime import datetime, timedelta
 
-from loader import dp, user_db
-from keyboards.inline.admin_keyboards import reports_menu, back_button
+from loader import dp, user_db, db_profiler
+from keyboards.inline.admin_keyboards import reports_menu, export_menu, back_button
 from handlers.admin.admin_start import admin_required
+from utils.misc.broadcast import GLOBAL_RATE
+from utils.misc.export import EXPORTS, send_export
 
 # O'zbekiston vaqti
 TASHKENT_TZ = pytz.timezone('Asia/Tashkent')
 
+MESSAGE_LIMIT = 4096  # Telegram xabar uzunligi chegarasi
+
 
 # ============================================================
 #                    HISOBOTLAR MENYUSI
@@ -32,6 +37,8 @@ Quyidagi hisobotlardan birini tanlang:
 👥 <b>Foydalanuvchilar</b> - Foydalanuvchilar tahlili
 💰 <b>Moliyaviy</b> - Daromadlar tahlili
 📚 <b>Kurslar</b> - Kurslar statistikasi
+📭 <b>Xabar yetkazish</b> - Botni bloklaganlar
+📥 <b>Excel eksport</b> - Ma'lumotlarni yuklab olish
 
 ⬇️ Tanlang:
 """
@@ -40,84 +47,73 @@ Quyidagi hisobotlardan birini tanlang:
 
 
 # ============================================================
-#                    UMUMIY HISOBOT
+#                    EXCEL EKSPORT
 # ============================================================
 
-@dp.callback_query_handler(text="admin:report:general")
+@dp.callback_query_handler(text="admin:export")
 @admin_required
-async def show_general_report(call: types.CallbackQuery):
-    # Hozirgi vaqtni Toshkent vaqti bilan olamiz
-    now = datetime.now(TASHKENT_TZ)
-
-    today = now.strftime('%Y-%m-%d')
-    week_ago = (now - timedelta(days=7)).strftime('%Y-%m-%d')
-    month_ago = (now - timedelta(days=30)).strftime('%Y-%m-%d')
-
-    # SQL so'rovlarda DATE() funksiyasi server vaqtiga emas, saqlangan matnga qaraydi
-    # SQLite da 'created_at' to'g'ri formatda saqlangan bo'lishi kerak (ISO format)
+async def show_export_menu(call: types.CallbackQuery):
+    text = """
+📥 <b>Excel eksport</b>
 
-    total_users = user_db.execute("SELECT COUNT(*) FROM Users", fetchone=True)
+Qaysi ma'lumotlarni yuklab olmoqchisiz?
 
-    # Bugungi userlar (DATE funksiyasi orqali)
-    today_users = user_db.execute(
-        f"SELECT COUNT(*) FROM Users WHERE DATE(created_at) >= DATE('{today}')",
-        fetchone=True
-    )
+<i>Katta ro'yxatlar bir necha soniya tayyorlanadi.</i>
+"""
+    await call.message.edit_text(text, reply_markup=export_menu())
+    await call.answer()
 
-    week_users = user_db.execute(
-        f"SELECT COUNT(*) FROM Users WHERE DATE(created_at) >= DATE('{week_ago}')",
-        fetchone=True
-    )
 
-    month_users = user_db.execute(
-        f"SELECT COUNT(*) FROM Users WHERE DATE(created_at) >= DATE('{month_ago}')",
-        fetchone=True
-    )
+@dp.callback_query_handler(lambda c: c.data.startswith("admin:export:"))
+@admin_required
+async def export_data(call: types.CallbackQuery):
+    kind = call.data.split(":")[-1]
+    if kind not in EXPORTS:
+        await call.answer("❌ Noma'lum eksport", show_alert=True)
+        return
 
-    # Kurslar va Darslar
-    total_courses = user_db.execute("SELECT COUNT(*) FROM Courses WHERE is_active = TRUE", fetchone=True)
-    total_lessons = user_db.execute("SELECT COUNT(*) FROM Lessons WHERE is_active = TRUE", fetchone=True)
+    await call.answer("⏳ Fayl tayyorlanmoqda...", show_alert=False)
+    await send_export(call.message, kind)
 
-    # To'lovlar
-    total_payments = user_db.execute("SELECT COUNT(*), SUM(amount) FROM Payments WHERE status = 'approved'",
-                                     fetchone=True)
-    pending_payments = user_db.execute("SELECT COUNT(*) FROM Payments WHERE status = 'pending'", fetchone=True)
 
-    # Testlar
-    total_tests = user_db.execute("SELECT COUNT(*) FROM TestResults", fetchone=True)
-    passed_tests = user_db.execute("SELECT COUNT(*) FROM TestResults WHERE passed = TRUE", fetchone=True)
+# ============================================================
+#                    UMUMIY HISOBOT
+# ============================================================
 
-    # Fikrlar
-    total_feedbacks = user_db.execute("SELECT COUNT(*), AVG(rating) FROM Feedbacks", fetchone=True)
+@dp.callback_query_handler(text="admin:report:general")
+@admin_required
+async def show_general_report(call: types.CallbackQuery):
+    # Hozirgi vaqtni Toshkent vaqti bilan olamiz
+    today = datetime.now(TASHKENT_TZ).strftime('%Y-%m-%d')
 
-    payments_sum = total_payments[1] if total_payments and total_payments[1] else 0
-    feedbacks_avg = total_feedbacks[1] if total_feedbacks and total_feedbacks[1] else 0
+    # Dashboard bilan umumiy, qisqa muddat keshlangan statistika
+    stats = user_db.get_stats_snapshot()
 
     text = f"""
 📊 <b>Umumiy hisobot</b> (Sana: {today})
 
 👥 <b>Foydalanuvchilar:</b>
-├ Jami: <b>{total_users[0] if total_users else 0}</b>
-├ Bugun: <b>{today_users[0] if today_users else 0}</b>
-├ Shu hafta: <b>{week_users[0] if week_users else 0}</b>
-└ Shu oy: <b>{month_users[0] if month_users else 0}</b>
+├ Jami: <b>{stats['total_users']}</b>
+├ Bugun: <b>{stats['users_since_today']}</b>
+├ Shu hafta: <b>{stats['users_last_7_days']}</b>
+└ Shu oy: <b>{stats['users_last_30_days']}</b>
 
 📚 <b>Kontent:</b>
-├ Kurslar: <b>{total_courses[0] if total_courses else 0}</b>
-└ Darslar: <b>{total_lessons[0] if total_lessons else 0}</b>
+├ Kurslar: <b>{stats['total_courses']}</b>
+└ Darslar: <b>{stats['active_lessons']}</b>
 
 💰 <b>To'lovlar:</b>
-├ Tasdiqlangan: <b>{total_payments[0] if total_payments else 0}</b>
-├ Summa: <b>{payments_sum:,.0f}</b> so'm
-└ Kutilayotgan: <b>{pending_payments[0] if pending_payments else 0}</b>
+├ Tasdiqlangan: <b>{stats['approved_payments']}</b>
+├ Summa: <b>{stats['approved_payments_sum']:,.0f}</b> so'm
+└ Kutilayotgan: <b>{stats['pending_payments']}</b>
 
 📝 <b>Testlar:</b>
-├ Jami: <b>{total_tests[0] if total_tests else 0}</b>
-└ Muvaffaqiyatli: <b>{passed_tests[0] if passed_tests else 0}</b>
+├ Jami: <b>{stats['total_tests']}</b>
+└ Muvaffaqiyatli: <b>{stats['passed_tests']}</b>
 
 💬 <b>Fikrlar:</b>
-├ Jami: <b>{total_feedbacks[0] if total_feedbacks else 0}</b>
-└ O'rtacha: <b>{feedbacks_avg:.1f}</b> ⭐️
+├ Jami: <b>{stats['total_feedbacks']}</b>
+└ O'rtacha: <b>{stats['avg_rating']:.1f}</b> ⭐️
 """
     await call.message.edit_text(text, reply_markup=back_button("admin:reports"))
     await call.answer()
@@ -133,23 +129,18 @@ async def show_users_report(call: types.CallbackQuery):
     """Foydalanuvchilar hisoboti"""
     now = datetime.now(TASHKENT_TZ)
 
-    # Kunlik dinamika (so'nggi 7 kun)
-    daily_stats = []
-    for i in range(6, -1, -1):
-        date_obj = now - timedelta(days=i)
-        date_str = date_obj.strftime('%Y-%m-%d')
-
-        count = user_db.execute(
-            f"SELECT COUNT(*) FROM Users WHERE DATE(created_at) = DATE('{date_str}')",
-            fetchone=True
-        )
-        daily_stats.append((date_str[5:], count[0] if count else 0))
+    # Kunlik dinamika (so'nggi 7 kun) - StatsDaily agregatidan
+    days = [(now - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
+    daily = user_db.get_daily_stats(days[0])
+    daily_stats = [(day[5:], daily.get(day, {}).get('new_users', 0)) for day in days]
 
     week_ago = (now - timedelta(days=7)).strftime('%Y-%m-%d')
+    tomorrow = (now + timedelta(days=1)).strftime('%Y-%m-%d')
 
-    # Active userlar (Agar last_active NULL bo'lsa hisoblanmaydi)
+    # Active userlar: [week_ago, ertaga) diapazoni idx_users_last_active bo'yicha (NULL kirmaydi)
     active_users = user_db.execute(
-        f"SELECT COUNT(*) FROM Users WHERE last_active IS NOT NULL AND DATE(last_active) >= DATE('{week_ago}')",
+        "SELECT COUNT(*) FROM Users WHERE last_active >= ? AND last_active < ?",
+        parameters=(week_ago, tomorrow),
         fetchone=True
     )
 
@@ -209,53 +200,36 @@ async def show_users_report(call: types.CallbackQuery):
 async def show_finance_report(call: types.CallbackQuery):
     now = datetime.now(TASHKENT_TZ)
 
-    daily_income = []
-    for i in range(6, -1, -1):
-        date_obj = now - timedelta(days=i)
-        date_str = date_obj.strftime('%Y-%m-%d')
-
-        income = user_db.execute(
-            f"""SELECT SUM(amount) FROM Payments 
-               WHERE status = 'approved' AND DATE(updated_at) = DATE('{date_str}')""",
-            fetchone=True
-        )
-        daily_income.append((date_str[5:], income[0] if income and income[0] else 0))
-
+    # Hammasi tayyor agregatlardan: StatsDaily (kunlar), StatsCourse (kurslar)
     week_ago = (now - timedelta(days=7)).strftime('%Y-%m-%d')
     month_ago = (now - timedelta(days=30)).strftime('%Y-%m-%d')
+    daily = user_db.get_daily_stats(month_ago)
 
-    week_income = user_db.execute(
-        f"""SELECT SUM(amount), COUNT(*) FROM Payments 
-           WHERE status = 'approved' AND DATE(updated_at) >= DATE('{week_ago}')""",
-        fetchone=True
-    )
+    days = [(now - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
+    daily_income = [(day[5:], daily.get(day, {}).get('approved_amount', 0)) for day in days]
 
-    month_income = user_db.execute(
-        f"""SELECT SUM(amount), COUNT(*) FROM Payments 
-           WHERE status = 'approved' AND DATE(updated_at) >= DATE('{month_ago}')""",
-        fetchone=True
+    week_income = (
+        sum(d['approved_amount'] for day, d in daily.items() if day >= week_ago),
+        sum(d['approved_payments'] for day, d in daily.items() if day >= week_ago)
     )
-
-    total_income = user_db.execute(
-        "SELECT SUM(amount), COUNT(*) FROM Payments WHERE status = 'approved'",
-        fetchone=True
+    month_income = (
+        sum(d['approved_amount'] for d in daily.values()),
+        sum(d['approved_payments'] for d in daily.values())
     )
 
-    avg_check = user_db.execute(
-        "SELECT AVG(amount) FROM Payments WHERE status = 'approved'",
-        fetchone=True
-    )
+    course_stats = user_db.get_course_aggregates()
+    total_sum = sum(c['approved_amount'] for c in course_stats.values())
+    total_count = sum(c['approved_payments'] for c in course_stats.values())
+    total_income = (total_sum, total_count)
+    avg_check = (total_sum / total_count if total_count else None,)
 
-    by_course = user_db.execute(
-        """SELECT c.name, COUNT(p.id), SUM(p.amount)
-           FROM Payments p
-           JOIN Courses c ON p.course_id = c.id
-           WHERE p.status = 'approved'
-           GROUP BY c.id
-           ORDER BY SUM(p.amount) DESC
-           LIMIT 5""",
-        fetchall=True
-    )
+    courses = {c['id']: c['name'] for c in user_db.get_all_courses(active_only=False)}
+    by_course = sorted(
+        [(courses[course_id], c['approved_payments'], c['approved_amount'])
+         for course_id, c in course_stats.items()
+         if c['approved_payments'] > 0 and course_id in courses],
+        key=lambda x: x[2], reverse=True
+    )[:5]
 
     text = """
 💰 <b>Moliyaviy hisobot</b>
@@ -303,19 +277,18 @@ async def show_finance_report(call: types.CallbackQuery):
 async def show_courses_report(call: types.CallbackQuery):
     """Kurslar hisoboti - Optimallashtirilgan"""
 
-    # Bu yerda og'ir querylarni soddalashtiramiz
+    # O'quvchilar, daromad va sertifikatlar - StatsCourse agregatidan
     courses = user_db.execute(
         """SELECT c.id, c.name,
                   (SELECT COUNT(*) FROM Modules m WHERE m.course_id = c.id AND m.is_active = TRUE) as modules,
                   (SELECT COUNT(*) FROM Lessons l 
                    JOIN Modules m ON l.module_id = m.id 
                    WHERE m.course_id = c.id AND l.is_active = TRUE) as lessons,
-                  (SELECT COUNT(DISTINCT p.user_id) FROM Payments p 
-                   WHERE p.course_id = c.id AND p.status = 'approved') as students,
-                  (SELECT SUM(p.amount) FROM Payments p 
-                   WHERE p.course_id = c.id AND p.status = 'approved') as income,
-                  (SELECT COUNT(*) FROM Certificates cert WHERE cert.course_id = c.id) as graduates
+                  s.students,
+                  NULLIF(s.approved_amount, 0) as income,
+                  s.completions as graduates
            FROM Courses c
+           LEFT JOIN StatsCourse s ON s.course_id = c.id
            WHERE c.is_active = TRUE
            ORDER BY income DESC NULLS LAST""",
         fetchall=True
@@ -349,4 +322,96 @@ async def show_courses_report(call: types.CallbackQuery):
         text += "\n📭 Hozircha faol kurslar yo'q"
 
     await call.message.edit_text(text, reply_markup=back_button("admin:reports"))
-    await call.answer()
\ No newline at end of file
+    await call.answer()
+
+
+# ============================================================
+#                    XABAR YETKAZISH HISOBOTI
+# ============================================================
+
+@dp.callback_query_handler(text="admin:report:delivery")
+@admin_required
+async def show_delivery_report(call: types.CallbackQuery):
+    """Botni bloklagan userlar va tejalgan yuborish imkoniyati"""
+    stats = user_db.get_delivery_stats()
+
+    undeliverable = stats['undeliverable']
+    percent = (undeliverable / stats['total'] * 100) if stats['total'] else 0
+    # Har bir "Barchaga" reklamada shuncha so'rov va vaqt tejaladi
+    saved_time = timedelta(seconds=int(undeliverable / GLOBAL_RATE))
+
+    text = f"""
+📭 <b>Xabar yetkazish hisoboti</b>
+
+👥 Jami userlar: <b>{stats['total']}</b>
+✅ Xabar yetadi: <b>{stats['deliverable']}</b>
+🚫 Yetmaydi (bloklagan / o'chirilgan): <b>{undeliverable}</b> ({percent:.1f}%)
+
+📅 <b>Yangi aniqlanganlar:</b>
+├ 7 kunda: {stats['undeliverable_week']}
+└ 30 kunda: {stats['undeliverable_month']}
+
+⚡️ <b>Tejalgan imkoniyat (har bir reklamada):</b>
+├ So'rovlar: {undeliverable} ta
+└ Vaqt: ~{saved_time} ({GLOBAL_RATE} xabar/s da)
+
+<i>User botga qayta yozsa, avtomatik ravishda ro'yxatga qaytadi.</i>
+"""
+    await call.message.edit_text(text, reply_markup=back_button("admin:reports"))
+    await call.answer()
+
+
+# ============================================================
+#                    SQL PROFILER (COMMAND)
+# ============================================================
+
+@dp.message_handler(commands=['dbprofile'])
+@admin_required
+async def db_profile_command(message: types.Message):
+    """
+    Eng sekin SQL so'rovlar statistikasi
+    Format: /dbprofile [dump | reset]
+    """
+    if db_profiler is None:
+        await message.answer(
+            "⚠️ SQL profiler o'chirilgan.\n\n"
+            "Yoqish uchun .env faylga <code>DB_PROFILE=true</code> qo'shing."
+        )
+        return
+
+    args = message.text.split()
+    action = args[1] if len(args) > 1 else None
+
+    if action == "reset":
+        db_profiler.reset()
+        await message.answer("✅ SQL statistikasi tozalandi")
+        return
+
+    if action == "dump":
+        path = db_profiler.dump()
+        await message.answer_document(types.InputFile(path), caption="📄 SQL statistikasi")
+        return
+
+    top = db_profiler.top(limit=10)
+    if not top:
+        await message.answer("📭 Hozircha o'lchangan so'rovlar yo'q")
+        return
+
+    # Har bir so'rov - yaxlit HTML blok. Xabarga faqat butun bloklar qo'shiladi:
+    # matnni o'rtasidan kesish teg yoki entity ni buzib, parse xatosiga olib keladi.
+    text = f"🐢 <b>SQL profiler</b> (namuna: {db_profiler.sample_rate:.0%})\n\n"
+    for i, q in enumerate(top, 1):
+        callers = escape(", ".join(list(q['callers'])[:3]))
+        sql = escape(q['sql'][:120])
+        block = (
+            f"<b>{i}.</b> <code>{sql}</code>\n"
+            f"├ Soni: {q['count']} | Jami: {q['total_ms']:.0f} ms\n"
+            f"├ O'rtacha: {q['avg_ms']:.2f} ms | Max: {q['max_ms']:.1f} ms\n"
+            f"└ {callers}\n\n"
+        )
+        if len(text) + len(block) > MESSAGE_LIMIT:
+            await message.answer(text)
+            text = ""
+        text += block
+
+    await message.answer(text)
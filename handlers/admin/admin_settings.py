@@ -4,6 +4,9 @@ Admin Settings Handler
 Sozlamalar va admin boshqaruvi handlerlari
 """
 
+import asyncio
+import logging
+from html import escape
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Text
@@ -13,6 +16,12 @@ from keyboards.inline.admin_keyboards import settings_menu, back_button
 from keyboards.default.admin_keyboards import admin_cancel_button, admin_confirm_keyboard, remove_keyboard
 from states.admin_states import SettingsStates, AdminManageStates
 from handlers.admin.admin_start import admin_required
+from utils.misc import reminders
+
+logger = logging.getLogger(__name__)
+
+# Qo'lda ishga tushirilgan eslatma vazifalari (GC yig'ib olmasligi uchun havola)
+reminder_tasks = set()
 
 
 # ============================================================
@@ -814,14 +823,19 @@ async def save_card_holder(message: types.Message, state: FSMContext):
 @admin_required
 async def show_reminder_settings(call: types.CallbackQuery):
     reminder_days = user_db.get_setting('reminder_days') or '3'
+    reminder_hour = user_db.get_setting('reminder_hour') or '10'
+    enabled = user_db.get_setting('reminder_enabled', 'true') == 'true'
 
     text = f"""
 ⏰ <b>Eslatma sozlamalari</b>
 
 <b>Joriy sozlamalar:</b>
-└ 📅 Eslatma kunlari: <b>{reminder_days} kun</b>
+├ 📅 Eslatma kunlari: <b>{reminder_days} kun</b>
+├ 🕐 Yuborish vaqti: <b>har kuni {int(reminder_hour):02d}:00</b>
+└ 🔔 Avtomatik eslatma: <b>{'Yoqilgan' if enabled else "O'chirilgan"}</b>
 
-<i>Agar foydalanuvchi {reminder_days} kun davomida faol bo'lmasa, eslatma yuboriladi.</i>
+<i>Agar foydalanuvchi {reminder_days} kun davomida faol bo'lmasa, eslatma yuboriladi.
+Bir foydalanuvchiga {reminder_days} kunda ko'pi bilan bitta eslatma ketadi.</i>
 
 ⬇️ O'zgartirish uchun tanlang:
 """
@@ -829,6 +843,11 @@ async def show_reminder_settings(call: types.CallbackQuery):
     keyboard = types.InlineKeyboardMarkup(row_width=1)
     keyboard.add(
         types.InlineKeyboardButton("📅 Kun sonini o'zgartirish", callback_data="admin:setting:reminder_days"),
+        types.InlineKeyboardButton("🕐 Soatni o'zgartirish", callback_data="admin:setting:reminder_hour"),
+        types.InlineKeyboardButton(
+            "🔕 Avtomatik eslatmani o'chirish" if enabled else "🔔 Avtomatik eslatmani yoqish",
+            callback_data="admin:setting:reminder_toggle"
+        ),
         types.InlineKeyboardButton("📤 Hozir eslatma yuborish", callback_data="admin:setting:send_reminders"),
         types.InlineKeyboardButton("⬅️ Orqaga", callback_data="admin:settings")
     )
@@ -870,38 +889,92 @@ async def save_reminder_days(message: types.Message, state: FSMContext):
     await message.answer(f"✅ Eslatma <b>{days} kun</b> ga o'zgartirildi!", reply_markup=remove_keyboard())
 
 
+@dp.callback_query_handler(text="admin:setting:reminder_hour")
+@admin_required
+async def change_reminder_hour(call: types.CallbackQuery, state: FSMContext):
+    await call.message.edit_text(
+        "🕐 <b>Eslatma vaqti</b>\n\n"
+        "Har kuni soat nechida yuborilsin? (0-23, Toshkent vaqti):"
+    )
+    await call.message.answer("✍️ Soat:", reply_markup=admin_cancel_button())
+    await SettingsStates.reminder_hour.set()
+    await call.answer()
+
+
+@dp.message_handler(state=SettingsStates.reminder_hour)
+async def save_reminder_hour(message: types.Message, state: FSMContext):
+    if message.text == "❌ Bekor qilish":
+        await state.finish()
+        await message.answer("❌ Bekor qilindi", reply_markup=remove_keyboard())
+        return
+
+    try:
+        hour = int(message.text.strip())
+        if not 0 <= hour <= 23:
+            raise ValueError
+    except ValueError:
+        await message.answer("❌ 0-23 orasida son kiriting!")
+        return
+
+    user_db.set_setting('reminder_hour', str(hour))
+
+    await state.finish()
+    await message.answer(
+        f"✅ Eslatmalar har kuni <b>{hour:02d}:00</b> da yuboriladi!",
+        reply_markup=remove_keyboard()
+    )
+
+
+@dp.callback_query_handler(text="admin:setting:reminder_toggle")
+@admin_required
+async def toggle_reminders(call: types.CallbackQuery):
+    enabled = user_db.get_setting('reminder_enabled', 'true') == 'true'
+    user_db.set_setting('reminder_enabled', 'false' if enabled else 'true')
+    await show_reminder_settings(call)
+
+
 @dp.callback_query_handler(text="admin:setting:send_reminders")
 @admin_required
 async def send_reminders_now(call: types.CallbackQuery):
-    reminder_days = int(user_db.get_setting('reminder_days') or '3')
-    inactive_users = user_db.get_inactive_users(days=reminder_days)
-
-    if not inactive_users:
-        await call.answer(f"📭 {reminder_days} kundan ortiq faol bo'lmagan foydalanuvchilar yo'q", show_alert=True)
+    if reminders.is_running():
+        await call.answer("⏳ Eslatmalar hozir yuborilmoqda, kuting...", show_alert=True)
         return
 
-    await call.answer(f"📤 {len(inactive_users)} ta foydalanuvchiga eslatma yuborilmoqda...")
+    await call.answer("📤 Eslatmalar orqa fonda yuborilmoqda...")
+    task = asyncio.create_task(_send_reminders_and_report(call.from_user.id))
+    reminder_tasks.add(task)
+    task.add_done_callback(reminder_tasks.discard)
 
-    success = 0
-    failed = 0
 
-    for user in inactive_users:
+async def _send_reminders_and_report(admin_id: int):
+    """Eslatmalarni yuborib, natijani adminga yuborish"""
+    try:
+        stats = await reminders.send_reminders()
+    except Exception as e:
+        logger.exception(f"❌ Eslatmalarni yuborishda xato: {e}")
+        text = f"❌ <b>Eslatmalarni yuborishda xato</b>\n\n{escape(str(e))}"
         try:
-            await bot.send_message(
-                user['telegram_id'],
-                "👋 <b>Salom!</b>\n\n"
-                "Sizni sog'indik! Darslaringizni davom ettiring va yangi bilimlar oling. 📚\n\n"
-                "Davom etish uchun /start buyrug'ini yuboring."
-            )
-            success += 1
-        except:
-            failed += 1
+            await bot.send_message(admin_id, text)
+        except Exception:
+            pass
+        return
 
-    await call.message.answer(
-        f"✅ <b>Eslatmalar yuborildi!</b>\n\n"
-        f"📤 Yuborildi: {success}\n"
-        f"❌ Xato: {failed}"
-    )
+    if stats is None:
+        return
+
+    if not stats['sent'] + stats['blocked'] + stats['failed']:
+        text = "📭 Eslatma yuboriladigan foydalanuvchilar yo'q"
+    else:
+        text = (
+            f"✅ <b>Eslatmalar yuborildi!</b>\n\n"
+            f"📤 Yuborildi: {stats['sent']}\n"
+            f"🚫 Bloklagan: {stats['blocked']}\n"
+            f"❌ Xato: {stats['failed']}"
+        )
+    try:
+        await bot.send_message(admin_id, text)
+    except:
+        pass
 
 
 # ============================================================
@@ -712,11 +712,7 @@ async def edit_passing_score(message: types.Message, state: FSMContext):
     data = await state.get_data()
 
     # Test jadvalida passing_score ni yangilash
-    user_db.execute(
-        "UPDATE Tests SET passing_score = ? WHERE id = ?",
-        parameters=(new_score, data['test_id']),
-        commit=True
-    )
+    user_db.update_test(data['test_id'], passing_score=new_score)
 
     await message.answer(
         f"✅ O'tish bali yangilandi!\n\n"
@@ -195,8 +195,7 @@ async def save_feedback(telegram_id: int, state: FSMContext, message: types.Mess
 
     if result:
         # Ball sozlamadan olinadi
-        feedback_score = user_db.get_setting('feedback_score')
-        score_to_add = int(feedback_score) if feedback_score and feedback_score.isdigit() else 2
+        score_to_add = user_db.get_setting_int('feedback_score', 2)
 
         stars = "⭐️" * data['rating']
 
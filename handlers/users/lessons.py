@@ -8,7 +8,7 @@ Dars → Video → Test (agar bor bo'lsa) → Keyingi dars
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 
-from loader import dp, bot, user_db
+from loader import dp, bot, async_user_db
 from keyboards.inline.user_keyboards import (
     simple_lessons_list,
     lesson_view,
@@ -18,30 +18,12 @@ from keyboards.inline.user_keyboards import (
     back_to_lessons
 )
 
-def check_has_paid_course(user_id: int) -> bool:
+async def check_has_paid_course(user_id: int) -> bool:
     """
     User kursni sotib olganmi?
-    Payments va ManualAccess tekshiriladi
+    Payments va ManualAccess (faol, muddati o'tmagan) - dostup keshidan
     """
-    # 1. Payments tekshirish (revoked bo'lmagan)
-    result = user_db.execute(
-        "SELECT 1 FROM Payments WHERE user_id = ? AND status = 'approved' LIMIT 1",
-        parameters=(user_id,),
-        fetchone=True
-    )
-    if result:
-        return True
-
-    # 2. ManualAccess tekshirish (is_active = TRUE va muddati o'tmagan)
-    result = user_db.execute(
-        """SELECT 1 FROM ManualAccess WHERE user_id = ? 
-           AND is_active = 1
-           AND (expires_at IS NULL OR expires_at > datetime('now')) 
-           LIMIT 1""",
-        parameters=(user_id,),
-        fetchone=True
-    )
-    return bool(result)
+    return await async_user_db.has_any_access(user_id)
 
 
 # ============================================================
@@ -54,7 +36,7 @@ async def my_lessons_handler(message: types.Message):
     Mening darslarim tugmasi bosilganda
     """
     telegram_id = message.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     # Ro'yxatdan o'tmaganmi?
     if not user:
@@ -64,7 +46,7 @@ async def my_lessons_handler(message: types.Message):
     user_id = user['id']
 
     # Kursni sotib olganmi?
-    if check_has_paid_course(user_id):
+    if await check_has_paid_course(user_id):
         # Sotib olgan - barcha darslar
         await show_paid_lessons(message, user_id)
     else:
@@ -75,7 +57,7 @@ async def show_paid_lessons(message: types.Message, user_id: int):
     """
     Sotib olgan user uchun - qisqa ko'rinish (3 ta dars)
     """
-    lessons = get_all_lessons_with_status(user_id)
+    lessons = await get_all_lessons_with_status(user_id)
 
     if not lessons:
         await message.answer("📭 Darslar topilmadi")
@@ -153,7 +135,7 @@ async def show_all_lessons(call: types.CallbackQuery):
     To'liq darslar ro'yxati
     """
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
@@ -161,11 +143,11 @@ async def show_all_lessons(call: types.CallbackQuery):
 
     user_id = user['id']
 
-    if not check_has_paid_course(user_id):
+    if not await check_has_paid_course(user_id):
         await call.answer("🔒 Kursni sotib oling!", show_alert=True)
         return
 
-    lessons = get_all_lessons_with_status(user_id)
+    lessons = await get_all_lessons_with_status(user_id)
 
     if not lessons:
         await call.answer("📭 Darslar topilmadi", show_alert=True)
@@ -192,7 +174,7 @@ async def show_free_lessons(message: types.Message):
     """
     Sotib olmagan user uchun - faqat bepul darslar
     """
-    free_lessons = user_db.execute(
+    free_lessons = await async_user_db.execute(
         """SELECT l.id, l.name
            FROM Lessons l
            JOIN Modules m ON l.module_id = m.id
@@ -237,7 +219,7 @@ async def view_free_lesson(call: types.CallbackQuery):
     lesson_id = int(call.data.split(":")[-1])
     telegram_id = call.from_user.id
 
-    lesson = user_db.get_lesson(lesson_id)
+    lesson = await async_user_db.get_lesson(lesson_id)
 
     # Himoya: faqat bepul darsga ruxsat
     if not lesson or not lesson.get('is_free'):
@@ -264,7 +246,7 @@ async def view_free_lesson(call: types.CallbackQuery):
         await bot.send_message(telegram_id, caption)
 
     # Keyingi bepul dars
-    next_free = user_db.execute(
+    next_free = await async_user_db.execute(
         """SELECT l.id, l.name FROM Lessons l
            JOIN Modules m ON l.module_id = m.id
            WHERE l.is_free = 1 AND l.is_active = 1 AND l.id != ?
@@ -337,7 +319,7 @@ async def show_lessons_list(call: types.CallbackQuery):
     Barcha darslar ro'yxati (modul ko'rinmaydi)
     """
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
@@ -346,7 +328,7 @@ async def show_lessons_list(call: types.CallbackQuery):
     user_id = user['id']
 
     # Darslarni olish
-    lessons = get_all_lessons_with_status(user_id)
+    lessons = await get_all_lessons_with_status(user_id)
 
     if not lessons:
         await call.message.edit_text("📭 Darslar topilmadi")
@@ -384,7 +366,7 @@ async def view_lesson(call: types.CallbackQuery):
     lesson_id = int(call.data.split(":")[-1])
 
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
@@ -393,18 +375,18 @@ async def view_lesson(call: types.CallbackQuery):
     user_id = user['id']
 
     # ⛔ HIMOYA: Kursni sotib olganmi?
-    if not check_has_paid_course(user_id):
+    if not await check_has_paid_course(user_id):
         await call.answer("🔒 Bu pullik dars! Kursni sotib oling.", show_alert=True)
         return
 
-    lesson = user_db.get_lesson(lesson_id)
+    lesson = await async_user_db.get_lesson(lesson_id)
 
     if not lesson:
         await call.answer("❌ Dars topilmadi", show_alert=True)
         return
 
     # Status tekshirish
-    status = get_lesson_status(user_id, lesson_id)
+    status = await get_lesson_status(user_id, lesson_id)
 
     if status == 'locked':
         await call.answer("🔒 Bu dars yopiq! Avvalgi darsni yakunlang.", show_alert=True)
@@ -437,8 +419,8 @@ async def view_lesson(call: types.CallbackQuery):
 
     # Keyingi tugmalar
     has_test = lesson.get('has_test', False)
-    materials_count = user_db.count_lesson_materials(lesson_id)
-    next_lesson = get_next_lesson(lesson_id)
+    materials_count = await async_user_db.count_lesson_materials(lesson_id)
+    next_lesson = await get_next_lesson(lesson_id)
 
     # Tugmalar
     keyboard = types.InlineKeyboardMarkup(row_width=1)
@@ -457,8 +439,8 @@ async def view_lesson(call: types.CallbackQuery):
     else:
         # Test yo'q - darsni avtomatik tugatish
         if status != 'completed':
-            complete_lesson_db(user_id, lesson_id)
-            user_db.add_score(telegram_id, 10)
+            await complete_lesson_db(user_id, lesson_id)
+            await async_user_db.add_score(telegram_id, 10)
 
         if next_lesson:
             keyboard.add(types.InlineKeyboardButton(
@@ -483,7 +465,7 @@ async def paid_lessons_back(call: types.CallbackQuery):
     Pullik darslar ro'yxatiga qaytish
     """
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
@@ -510,7 +492,7 @@ async def watch_video(call: types.CallbackQuery):
     lesson_id = int(call.data.split(":")[-1])
 
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
@@ -519,7 +501,7 @@ async def watch_video(call: types.CallbackQuery):
     user_id = user['id']
 
     # Dars ma'lumotlari
-    lesson = user_db.get_lesson(lesson_id)
+    lesson = await async_user_db.get_lesson(lesson_id)
 
     if not lesson:
         await call.answer("❌ Dars topilmadi", show_alert=True)
@@ -565,7 +547,7 @@ async def watch_video(call: types.CallbackQuery):
 
     # Test bormi?
     has_test = lesson.get('has_test', False)
-    next_lesson = get_next_lesson(lesson_id)
+    next_lesson = await get_next_lesson(lesson_id)
 
     if has_test:
         # Test bor - test yechishga yo'naltirish
@@ -581,14 +563,14 @@ Endi testni yeching:
         )
     else:
         # Test yo'q - darsni avtomatik tugatish
-        current_status = get_lesson_status(user_id, lesson_id)
+        current_status = await get_lesson_status(user_id, lesson_id)
 
         if current_status != 'completed':
             # Darsni tugatish
-            complete_lesson_db(user_id, lesson_id)
+            await complete_lesson_db(user_id, lesson_id)
 
             # Ball qo'shish
-            user_db.add_score(telegram_id, 10)
+            await async_user_db.add_score(telegram_id, 10)
 
             text = """
 ✅ Dars tugallandi! +10 ball
@@ -616,13 +598,13 @@ async def show_materials(call: types.CallbackQuery):
     """
     lesson_id = int(call.data.split(":")[-1])
 
-    lesson = user_db.get_lesson(lesson_id)
+    lesson = await async_user_db.get_lesson(lesson_id)
 
     if not lesson:
         await call.answer("❌ Dars topilmadi", show_alert=True)
         return
 
-    materials = user_db.get_lesson_materials(lesson_id)
+    materials = await async_user_db.get_lesson_materials(lesson_id)
 
     if not materials:
         await call.answer("📭 Materiallar yo'q", show_alert=True)
@@ -645,7 +627,7 @@ async def download_material(call: types.CallbackQuery):
     """
     material_id = int(call.data.split(":")[-1])
 
-    material = user_db.get_material(material_id)
+    material = await async_user_db.get_material(material_id)
 
     if not material:
         await call.answer("❌ Material topilmadi", show_alert=True)
@@ -689,159 +671,41 @@ async def locked_lesson(call: types.CallbackQuery):
 #                    YORDAMCHI FUNKSIYALAR
 # ============================================================
 
-def get_all_lessons_with_status(user_id: int) -> list:
+async def get_all_lessons_with_status(user_id: int) -> list:
     """
     Barcha darslarni ketma-ket status bilan olish
-    Modul ko'rinmaydi
+    Modul ko'rinmaydi (katalog + progress keshidan)
     """
-    # Barcha darslar (modul va kurs bo'yicha tartiblangan)
-    lessons = user_db.execute(
-        """SELECT l.id, l.name
-           FROM Lessons l
-           JOIN Modules m ON l.module_id = m.id
-           JOIN Courses c ON m.course_id = c.id
-           WHERE l.is_active = TRUE AND m.is_active = TRUE AND c.is_active = TRUE
-           ORDER BY c.order_num, m.order_num, l.order_num""",
-        fetchall=True
-    )
-
-    if not lessons:
-        return []
-
-    # User progress
-    progress = user_db.execute(
-        "SELECT lesson_id, status FROM UserProgress WHERE user_id = ?",
-        parameters=(user_id,),
-        fetchall=True
-    )
-    progress_dict = {p[0]: p[1] for p in progress} if progress else {}
-
-    result = []
-    order = 0
-    prev_completed = True  # Birinchi dars ochiq
-
-    for lesson in lessons:
-        order += 1
-        lesson_id = lesson[0]
-        name = lesson[1]
-
-        user_status = progress_dict.get(lesson_id)
-
-        if user_status == 'completed':
-            status = 'completed'
-            prev_completed = True
-        elif prev_completed:
-            status = 'unlocked'
-            prev_completed = False
-        else:
-            status = 'locked'
+    return await async_user_db.get_sequential_lessons_with_status(user_id)
 
-        result.append({
-            'id': lesson_id,
-            'order_num': order,
-            'name': name,
-            'status': status
-        })
 
-    return result
-
-
-def get_lesson_status(user_id: int, lesson_id: int) -> str:
+async def get_lesson_status(user_id: int, lesson_id: int) -> str:
     """
-    Bitta dars statusini olish
+    Bitta dars statusini olish (O(1), progress keshidan)
     """
-    lessons = get_all_lessons_with_status(user_id)
-
-    for lesson in lessons:
-        if lesson['id'] == lesson_id:
-            return lesson['status']
+    return await async_user_db.get_sequential_lesson_status(user_id, lesson_id)
 
-    return 'locked'
 
-
-def get_next_lesson(current_lesson_id: int) -> dict | None:
+async def get_next_lesson(current_lesson_id: int) -> dict | None:
     """
-    Keyingi darsni olish
+    Keyingi darsni olish (katalogdagi darslar ketma-ketligi indeksidan)
     """
-    current = user_db.get_lesson(current_lesson_id)
-    if not current:
-        return None
-
-    # Shu modul ichidagi keyingi dars
-    next_in_module = user_db.execute(
-        """SELECT id, name FROM Lessons 
-           WHERE module_id = ? AND order_num > ? AND is_active = TRUE
-           ORDER BY order_num LIMIT 1""",
-        parameters=(current['module_id'], current['order_num']),
-        fetchone=True
-    )
-
-    if next_in_module:
-        return {'id': next_in_module[0], 'name': next_in_module[1]}
-
-    # Keyingi modulning birinchi darsi
-    module = user_db.get_module(current['module_id'])
-    if not module:
-        return None
-
-    next_module = user_db.execute(
-        """SELECT id FROM Modules 
-           WHERE course_id = ? AND order_num > ? AND is_active = TRUE
-           ORDER BY order_num LIMIT 1""",
-        parameters=(module['course_id'], module['order_num']),
-        fetchone=True
-    )
-
-    if next_module:
-        first_lesson = user_db.execute(
-            """SELECT id, name FROM Lessons 
-               WHERE module_id = ? AND is_active = TRUE
-               ORDER BY order_num LIMIT 1""",
-            parameters=(next_module[0],),
-            fetchone=True
-        )
+    return await async_user_db.get_next_lesson(current_lesson_id)
 
-        if first_lesson:
-            return {'id': first_lesson[0], 'name': first_lesson[1]}
 
-    return None
-
-
-def complete_lesson_db(user_id: int, lesson_id: int):
+async def complete_lesson_db(user_id: int, lesson_id: int):
     """
     Darsni tugatish (bazada)
     """
-    # Progress mavjudmi?
-    existing = user_db.execute(
-        "SELECT id, status FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
-        parameters=(user_id, lesson_id),
-        fetchone=True
-    )
-
-    if existing:
-        if existing[1] != 'completed':
-            user_db.execute(
-                """UPDATE UserProgress 
-                   SET status = 'completed', completed_at = datetime('now')
-                   WHERE user_id = ? AND lesson_id = ?""",
-                parameters=(user_id, lesson_id),
-                commit=True
-            )
-    else:
-        user_db.execute(
-            """INSERT INTO UserProgress (user_id, lesson_id, status, completed_at)
-               VALUES (?, ?, 'completed', datetime('now'))""",
-            parameters=(user_id, lesson_id),
-            commit=True
-        )
+    await async_user_db.mark_lesson_completed(user_id, lesson_id)
 
 
-def check_course_completion(user_id: int) -> bool:
+async def check_course_completion(user_id: int) -> bool:
     """
     Kurs tugadimi tekshirish
     """
     # Barcha darslar
-    total = user_db.execute(
+    total = await async_user_db.execute(
         """SELECT COUNT(*) FROM Lessons l
            JOIN Modules m ON l.module_id = m.id
            JOIN Courses c ON m.course_id = c.id
@@ -850,7 +714,7 @@ def check_course_completion(user_id: int) -> bool:
     )
 
     # Tugallangan darslar
-    completed = user_db.execute(
+    completed = await async_user_db.execute(
         """SELECT COUNT(*) FROM UserProgress 
            WHERE user_id = ? AND status = 'completed'""",
         parameters=(user_id,),
@@ -14,7 +14,7 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from loader import dp, bot, user_db
+from loader import dp, bot, async_user_db
 from utils.cert_gen import create_certificate
 from data.config import ADMINS
 from states.user_states import CertificateStates
@@ -37,7 +37,7 @@ async def show_results_menu(call: types.CallbackQuery):
     Foydalanuvchi natijalari bosh sahifasi
     """
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Foydalanuvchi topilmadi!", show_alert=True)
@@ -49,7 +49,7 @@ async def show_results_menu(call: types.CallbackQuery):
     total_score = user.get('total_score', 0)
 
     # 2. Test statistikasi
-    test_results = user_db.execute(
+    test_results = await async_user_db.execute(
         """SELECT COUNT(*), SUM(CASE WHEN passed = 1 THEN 1 ELSE 0 END)
            FROM TestResults WHERE user_id = ?""",
         parameters=(user_id,),
@@ -59,7 +59,7 @@ async def show_results_menu(call: types.CallbackQuery):
     passed_tests = test_results[1] if test_results and test_results[1] else 0
 
     # 3. Tugatilgan darslar soni
-    completed_lessons = user_db.execute(
+    completed_lessons = await async_user_db.execute(
         """SELECT COUNT(*) FROM UserProgress 
            WHERE user_id = ? AND status = 'completed'""",
         parameters=(user_id,),
@@ -68,7 +68,7 @@ async def show_results_menu(call: types.CallbackQuery):
     completed_count = completed_lessons[0] if completed_lessons else 0
 
     # 4. Sertifikatlar soni
-    certificates = user_db.execute(
+    certificates = await async_user_db.execute(
         """SELECT COUNT(*) FROM Certificates WHERE user_id = ?""",
         parameters=(user_id,),
         fetchone=True
@@ -100,10 +100,10 @@ async def show_my_courses_progress(call: types.CallbackQuery):
     Foydalanuvchi qatnashayotgan kurslar ro'yxati
     """
     telegram_id = call.from_user.id
-    user_id = user_db.get_user_id(telegram_id)
+    user_id = await async_user_db.get_user_id(telegram_id)
 
     # Kurslarni olish
-    result = user_db.execute(
+    result = await async_user_db.execute(
         """SELECT DISTINCT c.id, c.name
            FROM Courses c
            LEFT JOIN Payments p ON c.id = p.course_id AND p.user_id = ? AND p.status = 'approved'
@@ -118,7 +118,7 @@ async def show_my_courses_progress(call: types.CallbackQuery):
 
     if not result:
         # Fallback: Agar UserProgress da biror dars bo'lsa
-        check_progress = user_db.execute(
+        check_progress = await async_user_db.execute(
             """SELECT DISTINCT c.id, c.name FROM UserProgress up
                JOIN Lessons l ON up.lesson_id = l.id
                JOIN Modules m ON l.module_id = m.id
@@ -152,14 +152,14 @@ Quyidagi kurslardan birini tanlang:
         course_name = row[1]
 
         # Jami darslar
-        res_total = user_db.execute(
+        res_total = await async_user_db.execute(
             "SELECT COUNT(*) FROM Lessons l JOIN Modules m ON l.module_id = m.id WHERE m.course_id = ?",
             parameters=(course_id,), fetchone=True
         )
         total = res_total[0] if res_total else 0
 
         # Tugatilgan darslar
-        res_done = user_db.execute(
+        res_done = await async_user_db.execute(
             """SELECT COUNT(*) FROM UserProgress up 
                JOIN Lessons l ON up.lesson_id = l.id
                JOIN Modules m ON l.module_id = m.id
@@ -187,21 +187,21 @@ Quyidagi kurslardan birini tanlang:
 async def show_course_progress(call: types.CallbackQuery):
     course_id = int(call.data.split(":")[-1])
     telegram_id = call.from_user.id
-    user_id = user_db.get_user_id(telegram_id)
+    user_id = await async_user_db.get_user_id(telegram_id)
 
-    course = user_db.get_course(course_id)
+    course = await async_user_db.get_course(course_id)
     if not course:
         await call.answer("❌ Kurs topilmadi!", show_alert=True)
         return
 
     # Umumiy hisob
-    res_total = user_db.execute(
+    res_total = await async_user_db.execute(
         "SELECT COUNT(*) FROM Lessons l JOIN Modules m ON l.module_id = m.id WHERE m.course_id = ?",
         parameters=(course_id,), fetchone=True
     )
     total_lessons = res_total[0] if res_total else 0
 
-    res_completed = user_db.execute(
+    res_completed = await async_user_db.execute(
         """SELECT COUNT(*) FROM UserProgress up 
            JOIN Lessons l ON up.lesson_id = l.id
            JOIN Modules m ON l.module_id = m.id
@@ -213,20 +213,14 @@ async def show_course_progress(call: types.CallbackQuery):
     percentage = (completed_lessons / total_lessons * 100) if total_lessons > 0 else 0
 
     # Modullar matni
-    modules = user_db.get_course_modules(course_id, active_only=True)
+    modules = await async_user_db.get_course_modules(course_id, active_only=True)
     modules_text = ""
 
+    progress_map = await async_user_db.get_progress_map(user_id)
     for module in modules:
-        mod_lessons = user_db.get_module_lessons(module['id'], active_only=True)
+        mod_lessons = await async_user_db.get_module_lessons(module['id'], active_only=True)
         mod_total = len(mod_lessons)
-        mod_done = 0
-        for lesson in mod_lessons:
-            status_row = user_db.execute(
-                "SELECT status FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
-                parameters=(user_id, lesson['id']), fetchone=True
-            )
-            if status_row and status_row[0] == 'completed':
-                mod_done += 1
+        mod_done = sum(1 for lesson in mod_lessons if progress_map.get(lesson['id']) == 'completed')
 
         if mod_total > 0:
             modules_text += f"✅ <b>{module['name']}</b>: {mod_done}/{mod_total}\n"
@@ -269,9 +263,9 @@ async def show_course_progress(call: types.CallbackQuery):
 @dp.callback_query_handler(text="user:test_results")
 async def show_test_results(call: types.CallbackQuery):
     telegram_id = call.from_user.id
-    user_id = user_db.get_user_id(telegram_id)
+    user_id = await async_user_db.get_user_id(telegram_id)
 
-    results = user_db.execute(
+    results = await async_user_db.execute(
         """SELECT tr.score, tr.correct_answers, tr.passed, tr.created_at,
                   l.name as lesson_name
            FROM TestResults tr
@@ -303,9 +297,9 @@ async def show_test_results(call: types.CallbackQuery):
 @dp.callback_query_handler(text="user:certificates")
 async def show_certificates_list(call: types.CallbackQuery):
     telegram_id = call.from_user.id
-    user_id = user_db.get_user_id(telegram_id)
+    user_id = await async_user_db.get_user_id(telegram_id)
 
-    certs = user_db.execute(
+    certs = await async_user_db.execute(
         """SELECT cert.id, cert.certificate_code, cert.grade, cert.percentage, 
                   c.name as course_name
            FROM Certificates cert
@@ -344,21 +338,21 @@ async def show_certificates_list(call: types.CallbackQuery):
 async def check_and_ask_name(call: types.CallbackQuery):
     course_id = int(call.data.split(":")[-1])
     telegram_id = call.from_user.id
-    user_id = user_db.get_user_id(telegram_id)
+    user_id = await async_user_db.get_user_id(telegram_id)
 
     # 1. Progressni tekshirish (Manual SQL)
-    res_total = user_db.execute(
+    res_total = await async_user_db.execute(
         "SELECT COUNT(*) FROM Lessons l JOIN Modules m ON l.module_id = m.id WHERE m.course_id = ?",
         parameters=(course_id,), fetchone=True
     )
     total = res_total[0] if res_total else 0
     if total == 0:
         course_id = 1
-        res_total = user_db.execute(
+        res_total = await async_user_db.execute(
             "SELECT COUNT(*) FROM Lessons l JOIN Modules m ON l.module_id = m.id WHERE m.course_id = 1", fetchone=True)
         total = res_total[0] if res_total else 0
 
-    res_done = user_db.execute(
+    res_done = await async_user_db.execute(
         """SELECT COUNT(*) FROM UserProgress up 
            JOIN Lessons l ON up.lesson_id = l.id
            JOIN Modules m ON l.module_id = m.id
@@ -373,13 +367,13 @@ async def check_and_ask_name(call: types.CallbackQuery):
         return
 
     # 2. Agar oldin olgan bo'lsa -> Darhol beramiz
-    existing = user_db.get_certificate(telegram_id, course_id)
+    existing = await async_user_db.get_certificate(telegram_id, course_id)
     if existing:
         await generate_and_send_final(call, telegram_id, course_id, existing)
         return
 
     # 3. Agar yo'q bo'lsa -> ISMNI TASDIQLASH
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
     full_name = user['full_name']
 
     text = f"""
@@ -415,7 +409,7 @@ async def change_name_save(message: types.Message, state: FSMContext):
     new_name = message.text.strip()
 
     # Bazani yangilash
-    user_db.execute(
+    await async_user_db.execute(
         "UPDATE Users SET full_name = ? WHERE telegram_id = ?",
         parameters=(new_name, message.from_user.id),
         commit=True
@@ -447,10 +441,10 @@ async def confirm_generation(call: types.CallbackQuery):
     await call.answer("⏳ Sertifikat tayyorlanmoqda...", show_alert=False)
 
     # Bazada yaratish
-    cert_data = user_db.generate_certificate(telegram_id, course_id)
+    cert_data = await async_user_db.generate_certificate(telegram_id, course_id)
 
     if not cert_data:
-        cert_data = user_db.get_certificate(telegram_id, course_id)
+        cert_data = await async_user_db.get_certificate(telegram_id, course_id)
 
     # Yuborish funksiyasini chaqiramiz
     await generate_and_send_final(call, telegram_id, course_id, cert_data)
@@ -461,8 +455,8 @@ async def confirm_generation(call: types.CallbackQuery):
 # ============================================================
 async def generate_and_send_final(call: types.CallbackQuery, telegram_id, course_id, cert_data):
     try:
-        user = user_db.get_user(telegram_id)
-        course = user_db.get_course(course_id)
+        user = await async_user_db.get_user(telegram_id)
+        course = await async_user_db.get_course(course_id)
         course_name = course['name'] if course else "Maxsus Kurs"
         full_name = user['full_name']
 
@@ -529,7 +523,7 @@ async def generate_and_send_final(call: types.CallbackQuery, telegram_id, course
 async def view_existing_certificate(call: types.CallbackQuery):
     cert_id = int(call.data.split(":")[-1])
 
-    cert_row = user_db.execute(
+    cert_row = await async_user_db.execute(
         """SELECT c.certificate_code, c.grade, co.name, u.full_name
            FROM Certificates c
            JOIN Courses co ON c.course_id = co.id
@@ -20,7 +20,7 @@ async def show_referral(message: types.Message):
     ref_link = f"https://t.me/{bot_info.username}?start={ref_code}"
 
     # 2. Sozlamalarni olish
-    cashback_percent = user_db.get_setting('referral_cashback', '10')
+    cashback_percent = user_db.get_setting_int('referral_cashback', 10)
 
     # 3. Statistikani olish (Nechta odam chaqirdi, qancha pul ishladi)
     # get_referral_stats funksiyasi sizning UserDatabase da bor
@@ -13,7 +13,7 @@ from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import CommandStart, Text
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from loader import dp, user_db,bot
+from loader import dp, async_user_db, user_db, bot
 from keyboards.default.user_keyboards import phone_request, remove_keyboard, user_main_menu
 from keyboards.inline.user_keyboards import (
     demo_lesson_button,
@@ -24,22 +24,24 @@ from keyboards.inline.user_keyboards import (
     payment_pending
 )
 from states.user_states import RegistrationStates, PaymentStates
+from utils.misc.activity import activity_tracker
 
 
 # handlers/users/start.py oxiriga qo'shing:
 
 @dp.message_handler(commands=['fix_my_progress'])
 async def force_complete_all(message: types.Message):
-    user_id = user_db.get_user_id(message.from_user.id)
+    user_id = await async_user_db.get_user_id(message.from_user.id)
 
     # 1. Barcha aktiv darslarni topamiz
-    user_db.execute(
+    await async_user_db.execute(
         """INSERT OR REPLACE INTO UserProgress (user_id, lesson_id, status, completed_at)
            SELECT ?, id, 'completed', datetime('now')
            FROM Lessons WHERE is_active = 1""",
         parameters=(user_id,),
         commit=True
     )
+    await async_user_db.invalidate_progress_cache(user_id)
 
     await message.answer(
         "✅ **TUZATILDI!**\n\nBarcha darslar 'Tugatilgan' deb belgilandi.\nEndi bemalol Sertifikat olishingiz mumkin.")
@@ -48,11 +50,11 @@ async def force_complete_all(message: types.Message):
 
 @dp.message_handler(commands=['check_my_progress'])
 async def debug_progress(message: types.Message):
-    user_id = user_db.get_user_id(message.from_user.id)
+    user_id = await async_user_db.get_user_id(message.from_user.id)
 
     # Barcha darslarni olamiz (faqat aktivlarini)
     # Hozircha 1-kurs deb hisoblaymiz
-    lessons = user_db.execute(
+    lessons = await async_user_db.execute(
         """SELECT l.id, l.name, l.order_num 
            FROM Lessons l 
            JOIN Modules m ON l.module_id = m.id 
@@ -67,7 +69,7 @@ async def debug_progress(message: types.Message):
     for l in lessons:
         lid, name, order = l
         # Har bir dars uchun statusni tekshiramiz
-        status = user_db.execute(
+        status = await async_user_db.execute(
             "SELECT status FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
             (user_id, lid), fetchone=True
         )
@@ -108,20 +110,20 @@ async def cmd_start(message: types.Message, state: FSMContext):
     referral_code = args if args and args.startswith('REF_') else None
 
     # Foydalanuvchi bazada bormi?
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         # Yangi user
-        user_db.add_user(telegram_id, username=username, full_name=full_name)
+        await async_user_db.add_user(telegram_id, username=username, full_name=full_name)
 
         # Referal orqali kelgan bo'lsa
         if referral_code:
-            referrer = user_db.get_user_by_referral_code(referral_code)
+            referrer = await async_user_db.get_user_by_referral_code(referral_code)
             if referrer and referrer['telegram_id'] != telegram_id:
-                if user_db.register_referral(referrer['telegram_id'], telegram_id):
+                if await async_user_db.register_referral(referrer['telegram_id'], telegram_id):
                     # Taklif qiluvchiga xabar
                     try:
-                        bonus = user_db.get_setting('referral_bonus_register', '5')
+                        bonus = user_db.get_setting_int('referral_bonus_register', 5)
                         await bot.send_message(
                             referrer['telegram_id'],
                             f"🎉 Yangi taklif!\n\n"
@@ -132,10 +134,10 @@ async def cmd_start(message: types.Message, state: FSMContext):
                         pass
     else:
         # Mavjud user
-        user_db.update_user(telegram_id, username=username)
-        user_db.update_last_active(telegram_id)
+        await async_user_db.update_user(telegram_id, username=username)
+        activity_tracker.touch(telegram_id)
 
-        if check_has_paid_course(user['id']):
+        if await check_has_paid_course(user['id']):
             await show_lessons_list(message, user['id'])
             return
 
@@ -172,7 +174,7 @@ async def show_demo_lesson(call: types.CallbackQuery):
     """
     Demo darsni ko'rsatish - video + kurs info + tugma
     """
-    demo = user_db.execute(
+    demo = await async_user_db.execute(
         """SELECT l.id, l.name, l.description, l.video_file_id
            FROM Lessons l
            JOIN Modules m ON l.module_id = m.id
@@ -211,8 +213,8 @@ async def show_demo_lesson(call: types.CallbackQuery):
         await call.message.answer(caption)
 
     # Kurs haqida ma'lumot
-    course_info = get_course_info()
-    user = user_db.get_user(call.from_user.id)
+    course_info = await get_course_info()
+    user = await async_user_db.get_user(call.from_user.id)
 
     if user and user.get('phone'):
         keyboard = after_demo_registered()
@@ -343,7 +345,7 @@ async def finish_registration(message: types.Message, state: FSMContext, phone:
     full_name = data.get('full_name', message.from_user.full_name)
 
     # Bazaga saqlash
-    user_db.update_user(
+    await async_user_db.update_user(
         message.from_user.id,
         full_name=full_name,
         phone=phone
@@ -361,7 +363,7 @@ async def finish_registration(message: types.Message, state: FSMContext, phone:
     await message.answer(text, reply_markup=user_main_menu())
 
     # Keyingi tugma - kursni boshlash yoki sotib olish
-    course = get_main_course()
+    course = await get_main_course()
 
     if course and course.get('price', 0) > 0:
         # Pullik kurs - to'lov kerak
@@ -395,7 +397,7 @@ async def start_course(call: types.CallbackQuery):
     Kursni boshlash - 1-darsni ko'rsatish
     """
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Avval ro'yxatdan o'ting", show_alert=True)
@@ -412,7 +414,7 @@ async def buy_course(call: types.CallbackQuery, state: FSMContext):
     Kursni sotib olish - to'lov ma'lumotlari
     """
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user or not user.get('phone'):
         try:
@@ -426,7 +428,7 @@ async def buy_course(call: types.CallbackQuery, state: FSMContext):
         await call.answer()
         return
 
-    course = get_main_course()
+    course = await get_main_course()
 
     if not course:
         await call.answer("❌ Kurs topilmadi", show_alert=True)
@@ -437,9 +439,9 @@ async def buy_course(call: types.CallbackQuery, state: FSMContext):
     price_text = f"{price:,.0f}".replace(",", " ")
 
     # Kurs info
-    course_info = get_course_info()
+    course_info = await get_course_info()
 
-    # TODO: Config dan olish
+    # Sozlamalar xotiradagi keshdan o'qiladi (DB oqimi kutilmaydi)
     card_number = user_db.get_setting('card_number') or "8600 1234 5678 9012"
     card_holder = user_db.get_setting('card_holder') or "ALIYEV ALI"
 
@@ -508,11 +510,11 @@ async def receive_payment_receipt(message: types.Message, state: FSMContext):
     data = await state.get_data()
     course_id = data.get('course_id')
 
-    user = user_db.get_user(message.from_user.id)
-    course = user_db.get_course(course_id)
+    user = await async_user_db.get_user(message.from_user.id)
+    course = await async_user_db.get_course(course_id)
 
     # To'lov yaratish
-    payment_id = user_db.create_payment(
+    payment_id = await async_user_db.create_payment(
         telegram_id=message.from_user.id,
         course_id=course_id,
         amount=course['price'],
@@ -549,13 +551,13 @@ async def check_payment(call: types.CallbackQuery):
     """
     To'lov statusini tekshirish
     """
-    user = user_db.get_user(call.from_user.id)
+    user = await async_user_db.get_user(call.from_user.id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
         return
 
-    payment = user_db.execute(
+    payment = await async_user_db.execute(
         "SELECT status FROM Payments WHERE user_id = ? ORDER BY id DESC LIMIT 1",
         parameters=(user['id'],),
         fetchone=True
@@ -596,7 +598,7 @@ async def show_lessons_callback(call: types.CallbackQuery):
     """
     Darslar ro'yxatini ko'rsatish (callback)
     """
-    user = user_db.get_user(call.from_user.id)
+    user = await async_user_db.get_user(call.from_user.id)
 
     if not user:
         await call.answer("❌ Xatolik", show_alert=True)
@@ -611,7 +613,7 @@ async def show_lessons_list(message: types.Message, user_id: int):
     """
     from keyboards.default.user_keyboards import user_main_menu
 
-    lessons = get_all_lessons_with_status(user_id)
+    lessons = await get_all_lessons_with_status(user_id)
 
     if not lessons:
         await message.answer("📭 Darslar topilmadi")
@@ -634,7 +636,7 @@ async def show_lessons_list_callback(call: types.CallbackQuery, user_id: int):
     """
     Darslar ro'yxatini ko'rsatish (callback)
     """
-    lessons = get_all_lessons_with_status(user_id)
+    lessons = await get_all_lessons_with_status(user_id)
 
     if not lessons:
         await call.message.edit_text("📭 Darslar topilmadi")
@@ -703,11 +705,11 @@ async def cancel_message(message: types.Message, state: FSMContext):
 #                    YORDAMCHI FUNKSIYALAR
 # ============================================================
 
-def get_main_course():
+async def get_main_course():
     """
     Asosiy kursni olish
     """
-    result = user_db.execute(
+    result = await async_user_db.execute(
         """SELECT id, name, description, price
            FROM Courses WHERE is_active = TRUE
            ORDER BY order_num LIMIT 1""",
@@ -724,83 +726,19 @@ def get_main_course():
     return None
 
 
-def check_has_paid_course(user_id: int) -> bool:
+async def check_has_paid_course(user_id: int) -> bool:
     """
-    To'lov qilganmi?
+    To'lov qilganmi? (yoki faol qo'lda dostup - dostup keshidan)
     """
-    # Payments tekshirish
-    result = user_db.execute(
-        "SELECT 1 FROM Payments WHERE user_id = ? AND status = 'approved' LIMIT 1",
-        parameters=(user_id,),
-        fetchone=True
-    )
-    if result:
-        return True
+    return await async_user_db.has_any_access(user_id)
 
-    # ManualAccess tekshirish
-    result = user_db.execute(
-        """SELECT 1 FROM ManualAccess WHERE user_id = ? 
-           AND (expires_at IS NULL OR expires_at > datetime('now')) LIMIT 1""",
-        parameters=(user_id,),
-        fetchone=True
-    )
-    return bool(result)
 
-
-def get_all_lessons_with_status(user_id: int) -> list:
+async def get_all_lessons_with_status(user_id: int) -> list:
     """
     Barcha darslarni status bilan olish
-    Modul ko'rinmaydi - ketma-ket darslar
+    Modul ko'rinmaydi - ketma-ket darslar (katalog + progress keshidan)
     """
-    lessons = user_db.execute(
-        """SELECT l.id, l.name
-           FROM Lessons l
-           JOIN Modules m ON l.module_id = m.id
-           JOIN Courses c ON m.course_id = c.id
-           WHERE l.is_active = TRUE AND m.is_active = TRUE AND c.is_active = TRUE
-           ORDER BY c.order_num, m.order_num, l.order_num""",
-        fetchall=True
-    )
-
-    if not lessons:
-        return []
-
-    # User progress
-    progress = user_db.execute(
-        "SELECT lesson_id, status FROM UserProgress WHERE user_id = ?",
-        parameters=(user_id,),
-        fetchall=True
-    )
-    progress_dict = {p[0]: p[1] for p in progress} if progress else {}
-
-    result = []
-    order = 0
-    prev_completed = True
-
-    for lesson in lessons:
-        order += 1
-        lesson_id = lesson[0]
-        name = lesson[1]
-
-        user_status = progress_dict.get(lesson_id)
-
-        if user_status == 'completed':
-            status = 'completed'
-            prev_completed = True
-        elif prev_completed:
-            status = 'unlocked'
-            prev_completed = False
-        else:
-            status = 'locked'
-
-        result.append({
-            'id': lesson_id,
-            'order_num': order,
-            'name': name,
-            'status': status
-        })
-
-    return result
+    return await async_user_db.get_sequential_lessons_with_status(user_id)
 
 
 async def notify_admin_new_payment(user: dict, course_id: int, file_id: str, payment_id: int):
@@ -810,7 +748,7 @@ async def notify_admin_new_payment(user: dict, course_id: int, file_id: str, pay
     # Eski importni olib tashlaymiz: from data.config import ADMINS
     from loader import bot
 
-    course = user_db.execute(
+    course = await async_user_db.execute(
         "SELECT name, price FROM Courses WHERE id = ?",
         parameters=(course_id,),
         fetchone=True
@@ -845,7 +783,7 @@ async def notify_admin_new_payment(user: dict, course_id: int, file_id: str, pay
     # Configdagi adminlarni emas, barcha adminlarni olamiz (DB + Config)
     # Biz oldinroq db.py ga get_notification_admins funksiyasini qo'shgan edik
     try:
-        admin_ids = user_db.get_notification_admins()
+        admin_ids = await async_user_db.get_notification_admins()
     except AttributeError:
         # Ehtiyot shart: Agar db da funksiya bo'lmasa, eski usulda ishlaydi
         from data.config import ADMINS
@@ -870,12 +808,12 @@ async def notify_admin_new_payment(user: dict, course_id: int, file_id: str, pay
 
 
 
-def get_course_info() -> dict:
+async def get_course_info() -> dict:
     """
     Kurs haqida dinamik ma'lumotlar
     """
     # Darslar soni
-    lessons_count = user_db.execute(
+    lessons_count = await async_user_db.execute(
         """SELECT COUNT(*) FROM Lessons l
            JOIN Modules m ON l.module_id = m.id
            JOIN Courses c ON m.course_id = c.id
@@ -884,7 +822,7 @@ def get_course_info() -> dict:
     )
 
     # Umumiy va o'rtacha davomiylik
-    duration_stats = user_db.execute(
+    duration_stats = await async_user_db.execute(
         """SELECT SUM(video_duration), AVG(video_duration) FROM Lessons l
            JOIN Modules m ON l.module_id = m.id
            JOIN Courses c ON m.course_id = c.id
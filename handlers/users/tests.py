@@ -9,7 +9,7 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 from datetime import datetime
 
-from loader import dp, bot, user_db
+from loader import dp, bot, async_user_db
 from keyboards.inline.user_keyboards import (
     test_start,
     test_question,
@@ -37,24 +37,24 @@ async def start_test(call: types.CallbackQuery, state: FSMContext):
     # user:test:{lesson_id} bo'lsa -> Test infosini ko'rsatish
     lesson_id = int(parts[-1])
     telegram_id = call.from_user.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     if not user:
         await call.answer("❌ Xatolik: Foydalanuvchi topilmadi", show_alert=True)
         return
 
     # Dars va Testni tekshirish
-    lesson = user_db.get_lesson(lesson_id)
+    lesson = await async_user_db.get_lesson(lesson_id)
     if not lesson:
         await call.answer("❌ Dars topilmadi", show_alert=True)
         return
 
-    test = user_db.get_test_by_lesson(lesson_id)
+    test = await async_user_db.get_test_by_lesson(lesson_id)
     if not test:
         await call.answer("❌ Bu darsda test yo'q", show_alert=True)
         return
 
-    questions = user_db.get_test_questions(test['id'])
+    questions = await async_user_db.get_test_questions(test['id'])
     if not questions:
         await call.answer("📭 Testda savollar yo'q", show_alert=True)
         return
@@ -218,7 +218,7 @@ async def show_test_result(message: types.Message, state: FSMContext):
     test_id = data.get('test_id')
 
     # Passing score ni BAZADAN olish
-    test_info = user_db.get_test_by_lesson(lesson_id)
+    test_info = await async_user_db.get_test_by_lesson(lesson_id)
     passing_score = test_info.get('passing_score', 60) if test_info else 60
 
     # To'g'ri javoblarni sanash
@@ -236,7 +236,7 @@ async def show_test_result(message: types.Message, state: FSMContext):
     passed = percentage >= passing_score
 
     telegram_id = message.chat.id
-    user = user_db.get_user(telegram_id)
+    user = await async_user_db.get_user(telegram_id)
 
     has_passed_before = False
     first_score = 0
@@ -245,11 +245,11 @@ async def show_test_result(message: types.Message, state: FSMContext):
         user_id = user['id']
 
         # Bu testdan O'TGANMI? (o'tish balidan yuqori)
-        has_passed_before = user_db.has_completed_test(user_id, test_id)
+        has_passed_before = await async_user_db.has_completed_test(user_id, test_id)
 
         if passed and not has_passed_before:
             # BIRINCHI MARTA O'TDI - natijani saqlash
-            user_db.save_test_result(
+            await async_user_db.save_test_result(
                 telegram_id=telegram_id,
                 test_id=test_id,
                 score=int(percentage),
@@ -259,29 +259,29 @@ async def show_test_result(message: types.Message, state: FSMContext):
             )
 
             # Umumiy balni yangilash
-            user_db.update_user_total_score(telegram_id)
+            await async_user_db.update_user_total_score(telegram_id)
 
             # Darsni "Completed" qilish
-            current_status = get_lesson_status(user_id, lesson_id)
+            current_status = await get_lesson_status(user_id, lesson_id)
             if current_status != 'completed':
-                complete_lesson_db(user_id, lesson_id)
+                await complete_lesson_db(user_id, lesson_id)
 
         elif has_passed_before:
             # OLDIN O'TGAN - eski natijani olamiz
-            first_score = user_db.get_first_test_score(user_id, test_id)
+            first_score = await async_user_db.get_first_test_score(user_id, test_id)
 
     # Keyingi dars
-    next_lesson = get_next_lesson(lesson_id)
+    next_lesson = await get_next_lesson(lesson_id)
     is_last_lesson = next_lesson is None
 
     # Course ID
-    lesson_info = user_db.get_lesson(lesson_id)
+    lesson_info = await async_user_db.get_lesson(lesson_id)
     course_id = lesson_info['course_id'] if lesson_info else 1
 
     # Ball hisoblash
-    test_count = user_db.get_test_count()
+    test_count = await async_user_db.get_test_count()
     ball_per_test = round(100 / test_count, 2) if test_count > 0 else 0
-    user_total_score = user_db.calculate_total_score(telegram_id)
+    user_total_score = await async_user_db.calculate_total_score(telegram_id)
 
     # Xabar tayyorlash
     if passed and not has_passed_before:
@@ -359,60 +359,15 @@ async def show_test_result(message: types.Message, state: FSMContext):
 #                    YORDAMCHI FUNKSIYALAR
 # ============================================================
 
-def get_lesson_status(user_id: int, lesson_id: int) -> str:
-    result = user_db.execute(
-        "SELECT status FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
-        parameters=(user_id, lesson_id),
-        fetchone=True
-    )
-    return result[0] if result else 'unlocked'
-
-
-def complete_lesson_db(user_id: int, lesson_id: int):
-    # Agar bor bo'lsa update, yo'q bo'lsa insert
-    existing = user_db.execute(
-        "SELECT id FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
-        parameters=(user_id, lesson_id),
-        fetchone=True
-    )
-    if existing:
-        user_db.execute(
-            "UPDATE UserProgress SET status = 'completed', completed_at = datetime('now') WHERE user_id = ? AND lesson_id = ?",
-            parameters=(user_id, lesson_id), commit=True
-        )
-    else:
-        user_db.execute(
-            "INSERT INTO UserProgress (user_id, lesson_id, status, completed_at) VALUES (?, ?, 'completed', datetime('now'))",
-            parameters=(user_id, lesson_id), commit=True
-        )
+async def get_lesson_status(user_id: int, lesson_id: int) -> str:
+    status = await async_user_db.get_progress_status(user_id, lesson_id)
+    return status or 'unlocked'
 
 
-def get_next_lesson(current_lesson_id: int) -> dict | None:
-    """Keyingi darsni topish"""
-    current = user_db.get_lesson(current_lesson_id)
-    if not current: return None
+async def complete_lesson_db(user_id: int, lesson_id: int):
+    await async_user_db.mark_lesson_completed(user_id, lesson_id)
 
-    # 1. Shu modul ichidagi keyingi dars
-    next_in_module = user_db.execute(
-        "SELECT id, name FROM Lessons WHERE module_id = ? AND order_num > ? AND is_active = TRUE ORDER BY order_num LIMIT 1",
-        parameters=(current['module_id'], current['order_num']), fetchone=True
-    )
-    if next_in_module: return {'id': next_in_module[0], 'name': next_in_module[1]}
-
-    # 2. Keyingi modulning birinchi darsi
-    module = user_db.get_module(current['module_id'])
-    if not module: return None
-
-    next_module = user_db.execute(
-        "SELECT id FROM Modules WHERE course_id = ? AND order_num > ? AND is_active = TRUE ORDER BY order_num LIMIT 1",
-        parameters=(module['course_id'], module['order_num']), fetchone=True
-    )
-
-    if next_module:
-        first_lesson = user_db.execute(
-            "SELECT id, name FROM Lessons WHERE module_id = ? AND is_active = TRUE ORDER BY order_num LIMIT 1",
-            parameters=(next_module[0],), fetchone=True
-        )
-        if first_lesson: return {'id': first_lesson[0], 'name': first_lesson[1]}
 
-    return None
\ No newline at end of file
+async def get_next_lesson(current_lesson_id: int) -> dict | None:
+    """Keyingi darsni topish (darslar ketma-ketligi indeksidan)"""
+    return await async_user_db.get_next_lesson(current_lesson_id)
\ No newline at end of file
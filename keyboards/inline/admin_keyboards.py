@@ -626,6 +626,10 @@ def reports_menu() -> InlineKeyboardMarkup:
         InlineKeyboardButton("💰 Moliyaviy", callback_data="admin:report:finance"),
         InlineKeyboardButton("📚 Kurslar", callback_data="admin:report:courses")
     )
+    keyboard.add(
+        InlineKeyboardButton("📭 Xabar yetkazish", callback_data="admin:report:delivery"),
+        InlineKeyboardButton("📥 Excel eksport", callback_data="admin:export")
+    )
     keyboard.add(InlineKeyboardButton(
         "⬅️ Orqaga",
         callback_data="admin:main"
@@ -634,6 +638,29 @@ def reports_menu() -> InlineKeyboardMarkup:
     return keyboard
 
 
+def export_menu() -> InlineKeyboardMarkup:
+    """Excel eksport menyusi"""
+    keyboard = InlineKeyboardMarkup(row_width=2)
+
+    keyboard.add(
+        InlineKeyboardButton("👥 Foydalanuvchilar", callback_data="admin:export:users"),
+        InlineKeyboardButton("🚫 Sotib olmaganlar", callback_data="admin:export:not_paid")
+    )
+    keyboard.add(
+        InlineKeyboardButton("💰 To'lovlar", callback_data="admin:export:payments"),
+        InlineKeyboardButton("📝 Test natijalari", callback_data="admin:export:test_results")
+    )
+    keyboard.add(
+        InlineKeyboardButton("🎁 Referallar", callback_data="admin:export:referrals")
+    )
+    keyboard.add(InlineKeyboardButton(
+        "⬅️ Orqaga",
+        callback_data="admin:reports"
+    ))
+
+    return keyboard
+
+
 # ============================================================
 #                    FIKRLAR
 # ============================================================
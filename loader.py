@@ -3,6 +3,8 @@ from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from utils.db_api.users import UserDatabase
 from utils.db_api.groups import GroupDatabase
 from utils.db_api.channels import ChannelDatabase
+from utils.db_api.async_database import AsyncDatabase
+from utils.db_api.profiler import QueryProfiler
 
 
 from data import config
@@ -10,8 +12,16 @@ from data import config
 bot = Bot(token=config.BOT_TOKEN, parse_mode=types.ParseMode.HTML)
 storage = MemoryStorage()
 dp = Dispatcher(bot, storage=storage)
+# SQL profiler (.env da DB_PROFILE=true bo'lsagina ishlaydi)
+db_profiler = QueryProfiler(
+    sample_rate=config.DB_PROFILE_SAMPLE_RATE,
+    slow_query_ms=config.DB_SLOW_QUERY_MS,
+    dump_path="data/db_profile.json"
+) if config.DB_PROFILE else None
 #database obyektlarini  yaratamiz
-user_db=UserDatabase(path_to_db="data/user.db")
-group_db=GroupDatabase(path_to_db="data/group.db")
-channel_db=ChannelDatabase(path_to_db="data/channel.db")
+user_db=UserDatabase(path_to_db="data/user.db", profiler=db_profiler)
+group_db=GroupDatabase(path_to_db="data/group.db", profiler=db_profiler)
+channel_db=ChannelDatabase(path_to_db="data/channel.db", profiler=db_profiler)
+# handlerlar uchun event loop'ni bloklamaydigan variant
+async_user_db=AsyncDatabase(user_db)
 
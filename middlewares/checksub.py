@@ -66,27 +66,8 @@ class SubscriptionMiddleware(BaseMiddleware):
             return
 
         # ==================== OBUNA TEKSHIRISH ====================
-        not_subscribed_channels = []
-
-        for channel in channels:
-            try:
-                channel_id = channel[1]  # channel_id
-                title = channel[2]  # title
-                invite_link = channel[3]  # invite_link
-
-                # Obunani tekshirish
-                is_subscribed = await subscription.check(user_id=user_id, channel=channel_id)
-
-                if not is_subscribed:
-                    not_subscribed_channels.append({
-                        'id': channel_id,
-                        'title': title,
-                        'link': invite_link
-                    })
-
-            except Exception as e:
-                logger.error(f"❌ Kanal tekshirishda xato: {channel} - {e}")
-                continue  # Xato bo'lgan kanalni o'tkazib yuboramiz
+        # Keshdan, keshda yo'qlari esa parallel tekshiriladi
+        not_subscribed_channels = await subscription.get_not_subscribed(user_id, channels)
 
         # ==================== AGAR HAMMAGA OBUNA BO'LGAN BO'LSA ====================
         if not not_subscribed_channels:
@@ -161,26 +142,9 @@ async def check_subscriptions_callback(call: types.CallbackQuery):
         await call.message.delete()
         return
 
-    # Obuna bo'lmagan kanallar
-    not_subscribed = []
-
-    for channel in channels:
-        try:
-            channel_id = channel[1]
-            title = channel[2]
-            invite_link = channel[3]
-
-            is_subscribed = await subscription.check(user_id=user_id, channel=channel_id)
-
-            if not is_subscribed:
-                not_subscribed.append({
-                    'id': channel_id,
-                    'title': title,
-                    'link': invite_link
-                })
-        except Exception as e:
-            logger.error(f"❌ Tekshirishda xato: {e}")
-            continue
+    # Obuna bo'lmagan kanallar (user endigina obuna bo'lgan bo'lishi mumkin -
+    # "obuna emas" natijalari keshdan olinmaydi)
+    not_subscribed = await subscription.get_not_subscribed(user_id, channels, recheck_negative=True)
 
     # Agar hammaga obuna bo'lgan bo'lsa
     if not not_subscribed:
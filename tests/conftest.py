@@ -0,0 +1,46 @@
+# conftest.py: Testlar uchun umumiy sozlamalar va fixture lar
+import os
+import sys
+
+# data/config.py majburiy o'zgaruvchilarni talab qiladi (.env bo'lmasa)
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ADMINS", "1")
+os.environ.setdefault("ip", "localhost")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from utils.db_api.migrations import migrate
+from utils.db_api.profiler import QueryProfiler
+from utils.db_api.users import UserDatabase
+
+
+@pytest.fixture
+def profiler():
+    """Har bir so'rovni o'lchaydigan profiler"""
+    return QueryProfiler(sample_rate=1.0, slow_query_ms=0)
+
+
+@pytest.fixture
+def db(tmp_path, profiler):
+    """migrate() bilan qurilgan bo'sh baza"""
+    database = UserDatabase(path_to_db=str(tmp_path / "user.db"), profiler=profiler)
+    migrate(database)
+    yield database
+    database.close()
+
+
+def query_count(profiler: QueryProfiler) -> int:
+    """Profiler o'lchagan so'rovlar soni"""
+    return sum(q['count'] for q in profiler.top(limit=10 ** 6))
+
+
+def make_course(db: UserDatabase, lessons: int, modules: int = 1) -> int:
+    """Kurs, modullar va darslar yaratish, kurs ID sini qaytaradi"""
+    course_id = db.add_course("Python", price=100000)
+    for m in range(modules):
+        module_id = db.add_module(course_id, f"Modul {m + 1}")
+        for l in range(lessons):
+            db.add_lesson(module_id, f"Dars {m + 1}.{l + 1}", is_free=(m == 0 and l == 0))
+    return course_id
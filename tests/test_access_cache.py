@@ -0,0 +1,44 @@
+# Dostup keshi: o'qish paytidagi o'zgarish va o'qish xatosi keshlanmaydi
+from conftest import make_course
+
+
+def _write_during_read(db, monkeypatch, write):
+    """get_entitlements bazadan o'qigandan keyin, keshga yozishdan oldin `write` ni bajarish"""
+    original = db.execute
+
+    def execute(sql, *args, **kwargs):
+        result = original(sql, *args, **kwargs)
+        if sql.startswith("SELECT course_id, NULL, 1 FROM Payments"):
+            monkeypatch.setattr(db, "execute", original)
+            write()
+        return result
+
+    monkeypatch.setattr(db, "execute", execute)
+
+
+def test_revoke_during_cold_read_is_not_lost(db, monkeypatch):
+    course_id = make_course(db, lessons=2)
+    db.add_user(1001)
+    user_id = db.get_user_id(1001)
+    db.grant_access(user_id, course_id, admin_id=1, days=30)
+    db.invalidate_access_cache()
+
+    _write_during_read(db, monkeypatch, lambda: db.block_user(user_id, course_id))
+    assert db.has_access(user_id, course_id)  # Bloklashdan oldingi holat o'qilgan
+
+    assert not db.has_access(user_id, course_id)
+
+
+def test_failed_read_is_not_cached(db):
+    course_id = make_course(db, lessons=2)
+    db.add_user(1001)
+    user_id = db.get_user_id(1001)
+    db.grant_access(user_id, course_id, admin_id=1, days=30)
+    db.invalidate_access_cache()
+
+    db.execute("ALTER TABLE ManualAccess RENAME TO ManualAccess_old", commit=True)
+    assert not db.has_access(user_id, course_id)
+
+    # Jadval qaytgach keyingi tekshiruv bazadan qayta o'qiydi
+    db.execute("ALTER TABLE ManualAccess_old RENAME TO ManualAccess", commit=True)
+    assert db.has_access(user_id, course_id)
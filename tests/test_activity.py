@@ -0,0 +1,28 @@
+# Faollik buferi: yozish xatosida yo'qolmaydi, keyingi flush da saqlanadi
+import asyncio
+
+from utils.db_api.async_database import AsyncDatabase
+from utils.misc import activity
+
+
+def test_failed_flush_keeps_buffer(db, monkeypatch):
+    db.add_user(1001)
+    async_db = AsyncDatabase(db)
+    monkeypatch.setattr(activity, "async_user_db", async_db)
+    tracker = activity.ActivityTracker()
+
+    async def scenario():
+        tracker.touch(1001)
+        # Jadval vaqtincha yo'q - UPDATE xato beradi
+        db.execute("ALTER TABLE Users RENAME TO Users_tmp", commit=True)
+        assert await tracker.flush() == 0
+        db.execute("ALTER TABLE Users_tmp RENAME TO Users", commit=True)
+        return await tracker.flush()
+
+    try:
+        assert asyncio.run(scenario()) == 1
+    finally:
+        async_db.close()
+
+    last_active = db.execute("SELECT last_active FROM Users WHERE telegram_id = 1001", fetchone=True)[0]
+    assert last_active is not None
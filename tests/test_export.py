@@ -0,0 +1,47 @@
+# Eksport: o'qishdagi xato yarim faylni yubormaydi
+import os
+import sqlite3
+
+import pytest
+
+from utils.misc import export
+
+
+@pytest.fixture
+def export_db(db, monkeypatch):
+    monkeypatch.setattr(export, "user_db", db)
+    for i in range(30):
+        db.add_user(1000 + i, full_name=f"User {i}")
+    return db
+
+
+def test_export_writes_all_rows(export_db):
+    path, count = export.build_xlsx('users')
+    try:
+        assert count == 30
+        assert os.path.getsize(path) > 0
+    finally:
+        os.remove(path)
+
+
+def test_read_error_is_raised_and_partial_file_removed(export_db, monkeypatch, tmp_path):
+    def fail_after(user_id):
+        if user_id < 10:
+            raise ValueError("disk")
+        return user_id
+
+    # Xato bir necha bo'lak o'qilgandan keyin chiqadi
+    export_db.connection.create_function("fail_after", 1, fail_after)
+    sql = export_db.EXPORT_QUERIES['users'].replace("SELECT", "SELECT fail_after(u.id),", 1)
+    monkeypatch.setitem(export_db.EXPORT_QUERIES, 'users', sql)
+    monkeypatch.setattr(export, "CHUNK_SIZE", 5)
+    export_dir = tmp_path / "exports"
+    export_dir.mkdir()
+    monkeypatch.setattr(export.tempfile, "tempdir", str(export_dir))
+
+    with pytest.raises(sqlite3.OperationalError):
+        export.build_xlsx('users')
+
+    assert os.listdir(export_dir) == []
+    # Eksport oqimi ulanishini yopib ketadi
+    assert export_db._connections == []
@@ -0,0 +1,43 @@
+# Darslar ro'yxati ekranidagi SQL so'rovlar soni (N+2 -> 1)
+import pytest
+
+from conftest import make_course, query_count
+
+
+@pytest.mark.parametrize("lessons", [5, 40])
+def test_lesson_list_query_count_does_not_grow_with_lessons(db, profiler, lessons):
+    course_id = make_course(db, lessons=lessons, modules=2)
+    db.add_user(1001, full_name="Ali")
+    user_id = db.get_user_id(1001)
+    db.init_users_progress([user_id], course_id)
+    db.invalidate_user_id_cache()
+    db.invalidate_progress_cache()
+    db.catalog  # Katalog bot ishga tushganda bir marta yuklanadi
+
+    profiler.reset()
+    result = db.get_user_lessons_with_status(1001, course_id)
+
+    # Sovuq keshda: telegram_id -> user_id va progress xaritasi, darslar soniga bog'liq emas
+    assert len(result) == lessons * 2
+    assert query_count(profiler) <= 2
+
+    # Issiq keshda bazaga umuman murojaat yo'q
+    profiler.reset()
+    db.get_user_lessons_with_status(1001, course_id)
+    assert query_count(profiler) == 0
+
+
+def test_lesson_list_statuses(db):
+    course_id = make_course(db, lessons=3)
+    db.add_user(1001)
+    user_id = db.get_user_id(1001)
+    db.init_users_progress([user_id], course_id)
+    lessons = db.get_user_lessons_with_status(1001, course_id)
+
+    db.complete_lesson(1001, lessons[0]['id'])
+    statuses = [l['status'] for l in db.get_user_lessons_with_status(1001, course_id)]
+    assert statuses == ['completed', 'unlocked', 'locked']
+
+    # Ro'yxatdan o'tmagan user: faqat bepul dars ochiq
+    statuses = [l['status'] for l in db.get_user_lessons_with_status(2002, course_id)]
+    assert statuses == ['unlocked', 'locked', 'locked']
@@ -0,0 +1,21 @@
+# Migratsiyalar: xato bo'lsa baza o'zgarmaydi va xato ko'tariladi
+import pytest
+
+from utils.db_api.migrations import USER_DB_MIGRATIONS, get_schema_version, migrate
+from utils.db_api.users import UserDatabase
+
+
+def test_failed_migration_raises_and_keeps_version(tmp_path):
+    db = UserDatabase(path_to_db=str(tmp_path / "user.db"))
+    migrate(db, USER_DB_MIGRATIONS[:1])
+
+    def broken(database):
+        database.execute("CREATE TABLE Partial (id INTEGER)", commit=True)
+        database.execute("ALTER TABLE NoSuchTable ADD COLUMN x INTEGER", commit=True)
+
+    with pytest.raises(Exception):
+        migrate(db, USER_DB_MIGRATIONS[:1] + [(2, "broken", broken)])
+
+    assert get_schema_version(db) == 1
+    assert db.execute("SELECT name FROM sqlite_master WHERE name = 'Partial'", fetchone=True) is None
+    db.close()
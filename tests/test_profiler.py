@@ -0,0 +1,23 @@
+# Profiler: so'rov manbai to'g'ri metod nomi bilan yoziladi
+from conftest import make_course
+
+
+def callers(profiler):
+    return {caller for q in profiler.top(limit=10 ** 6) for caller in q['callers']}
+
+
+def test_classmethod_caller_has_class_name(db, profiler):
+    make_course(db, lessons=1)
+    profiler.reset()
+    db.catalog
+
+    assert "CourseCatalog.load" in callers(profiler)
+    assert "load" not in callers(profiler)
+
+
+def test_method_caller_has_class_name(db, profiler):
+    db.add_user(1001)
+    profiler.reset()
+    db.get_user_id(1001)
+
+    assert callers(profiler) == {"UserDatabase.get_user_id"}
@@ -0,0 +1,50 @@
+# Progress keshi: o'qish paytidagi yozuv eski natija bilan ustidan yozilmasligi
+from conftest import make_course
+
+
+def _write_during_read(db, monkeypatch, write):
+    """get_progress_map bazadan o'qigandan keyin, keshga yozishdan oldin `write` ni bajarish"""
+    original = db.execute
+
+    def execute(sql, *args, **kwargs):
+        result = original(sql, *args, **kwargs)
+        if sql.startswith("SELECT lesson_id, status FROM UserProgress"):
+            monkeypatch.setattr(db, "execute", original)
+            write()
+        return result
+
+    monkeypatch.setattr(db, "execute", execute)
+
+
+def test_write_during_cold_read_is_not_lost(db, monkeypatch):
+    course_id = make_course(db, lessons=3)
+    db.add_user(1001)
+    user_id = db.get_user_id(1001)
+    db.init_users_progress([user_id], course_id)
+    first, second, _ = db.catalog.course_lessons[course_id]
+    db.invalidate_progress_cache()
+
+    _write_during_read(db, monkeypatch, lambda: db.complete_lesson(1001, first))
+    db.get_progress_map(user_id)
+
+    progress = db.get_progress_map(user_id)
+    assert progress[first] == 'completed'
+    assert progress[second] == 'unlocked'
+
+
+def test_invalidate_during_cold_read_is_not_lost(db, monkeypatch):
+    course_id = make_course(db, lessons=2)
+    db.add_user(1001)
+    user_id = db.get_user_id(1001)
+    db.init_users_progress([user_id], course_id)
+    first = db.catalog.course_lessons[course_id][0]
+    db.invalidate_progress_cache()
+
+    def raw_write():
+        db.execute("UPDATE UserProgress SET status = 'completed' WHERE user_id = ?", (user_id,), commit=True)
+        db.invalidate_progress_cache(user_id)
+
+    _write_during_read(db, monkeypatch, raw_write)
+    db.get_progress_map(user_id)
+
+    assert db.get_progress_map(user_id)[first] == 'completed'
@@ -0,0 +1,93 @@
+# Issiq so'rovlar rejasi: kompozit indekslar ishlatiladi, jadval to'liq skanerlanmaydi
+import re
+
+import pytest
+
+from conftest import make_course
+
+
+def traced_statements(db, call):
+    """`call` bajargan SQL so'rovlar (parametrlar qo'yilgan holda)"""
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        db.connection.set_trace_callback(None)
+    return [s for s in statements if s.split()[0].upper() not in ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA')]
+
+
+def query_plan(db, sql, parameters=()):
+    return [row[3] for row in db.connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+
+
+def full_scans(plan):
+    """Indekssiz SCAN qilingan jadvallar (CTE natijalarini skanerlash hisobga olinmaydi)"""
+    materialized = {line.split()[1] for line in plan if line.startswith('MATERIALIZE ')}
+    scans = [re.fullmatch(r"SCAN (\w+)", line) for line in plan]
+    return {m.group(1) for m in scans if m and m.group(1) not in materialized}
+
+
+@pytest.fixture
+def seeded(db):
+    """Har bir so'rov o'z yo'lidan o'tishi uchun ozgina ma'lumot"""
+    course_id = make_course(db, lessons=3)
+    for i in range(5):
+        db.add_user(1000 + i)
+    db.catalog  # Katalog bot ishga tushganda bir marta yuklanadi
+    return course_id
+
+
+# (nomi, chaqiruv, kutilgan indekslar, ataylab to'liq o'qiladigan jadvallar)
+HOT_PATHS = [
+    ("access", lambda db, course_id: db.get_entitlements(1),
+     {"idx_payments_user_course_status", "sqlite_autoindex_ManualAccess_1"}, set()),
+    ("users_page_all", lambda db, course_id: db.get_users_page('all', after_id=3),
+     {"INTEGER PRIMARY KEY"}, set()),
+    ("users_page_not_paid", lambda db, course_id: db.get_users_page('not_paid', after_id=3),
+     {"INTEGER PRIMARY KEY", "idx_payments_user_course_status"}, set()),
+    # Test natijalari va fikrlar bo'yicha jami qiymatlar butun jadvaldan olinadi
+    ("stats_snapshot", lambda db, course_id: db.get_stats_snapshot(force=True),
+     {"idx_users_created", "idx_payments_status_updated"}, {"TestResults", "Feedbacks"}),
+    ("reminder_batch", lambda db, course_id: db.claim_reminder_batch(days=3, limit=10),
+     {"idx_users_last_active"}, set()),
+    ("audience_paid", lambda db, course_id: db.get_audience_page('paid'),
+     {"INTEGER PRIMARY KEY", "idx_payments_user_course_status"}, set()),
+    ("audience_course", lambda db, course_id: db.get_audience_page('course', target_id=course_id),
+     {"idx_payments_user_course_status (user_id=? AND course_id=? AND status=?)"}, set()),
+    ("broadcast_pending", lambda db, course_id: db.get_broadcast_pending(1),
+     {"idx_outbox_campaign_status (campaign_id=? AND status=? AND id>?)"}, set()),
+    ("first_test_score", lambda db, course_id: db.get_first_test_score(1, 1),
+     {"idx_test_results_user_test (user_id=? AND test_id=?)"}, set()),
+]
+
+
+@pytest.mark.parametrize("name, call, indexes, allowed_scans", HOT_PATHS, ids=[p[0] for p in HOT_PATHS])
+def test_hot_queries_use_indexes(db, seeded, name, call, indexes, allowed_scans):
+    statements = traced_statements(db, lambda: call(db, seeded))
+    assert statements
+
+    plans = [query_plan(db, sql) for sql in statements]
+    details = "\n".join(line for plan in plans for line in plan)
+    for index in indexes:
+        assert index in details
+    for sql, plan in zip(statements, plans):
+        assert full_scans(plan) <= allowed_scans, (sql, plan)
+
+
+# Handler lardagi to'g'ridan-to'g'ri so'rovlar
+HANDLER_QUERIES = [
+    # admin_users.show_all_users: oxirgi 20 ta user
+    ("""SELECT id, telegram_id, full_name, phone, created_at
+        FROM Users ORDER BY created_at DESC LIMIT 20""", (), "idx_users_created"),
+    # admin_reports: haftalik active userlar
+    ("SELECT COUNT(*) FROM Users WHERE last_active >= ? AND last_active < ?",
+     ("2026-01-01", "2026-01-08"), "idx_users_last_active (last_active>? AND last_active<?)"),
+]
+
+
+@pytest.mark.parametrize("sql, parameters, index", HANDLER_QUERIES, ids=["recent_users", "active_users"])
+def test_handler_queries_use_indexes(db, sql, parameters, index):
+    plan = query_plan(db, sql, parameters)
+    assert index in "\n".join(plan)
+    assert not full_scans(plan), plan
@@ -0,0 +1,34 @@
+# Eslatma guruhlarini band qilish: parallel chaqiruvlar bir userni ikki marta olmaydi
+import threading
+
+from conftest import make_course
+
+
+def test_concurrent_claims_do_not_overlap(db):
+    course_id = make_course(db, lessons=2)
+    for i in range(300):
+        db.add_user(9000 + i)
+    user_ids = [row[0] for row in db.execute("SELECT id FROM Users", fetchall=True)]
+    db.init_users_progress(user_ids, course_id)
+    db.execute("UPDATE Users SET last_active = '2000-01-01T00:00:00'", commit=True)
+
+    claimed = []
+    lock = threading.Lock()
+
+    def claimer():
+        while True:
+            batch = db.claim_reminder_batch(days=3, limit=20)
+            if not batch:
+                return
+            with lock:
+                claimed.extend(batch)
+
+    threads = [threading.Thread(target=claimer) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 300
+    assert len(set(claimed)) == 300
+    assert db.claim_reminder_batch(days=3, limit=20) == []
@@ -0,0 +1,34 @@
+# Ball qo'shish xatosi tashqi tranzaksiyani bekor qiladi (natija ballsiz saqlanmaydi)
+import pytest
+
+from conftest import make_course
+
+
+@pytest.fixture
+def failing_score(db):
+    """Users.total_score ni yangilash xato beradi"""
+    db.execute(
+        """CREATE TRIGGER fail_score BEFORE UPDATE OF total_score ON Users
+           BEGIN SELECT RAISE(ABORT, 'score locked'); END""",
+        commit=True
+    )
+
+
+def test_test_result_is_rolled_back_with_score(db, failing_score):
+    course_id = make_course(db, lessons=1)
+    lesson_id = db.catalog.course_lessons[course_id][0]
+    test_id = db.add_test(lesson_id)
+    db.add_user(1001)
+
+    assert db.save_test_result(1001, test_id, score=100, total_questions=10, correct_answers=10) is None
+    assert db.execute("SELECT COUNT(*) FROM TestResults", fetchone=True)[0] == 0
+
+
+def test_referral_is_rolled_back_with_bonus(db, failing_score):
+    db.add_user(1001)
+    db.add_user(1002)
+
+    assert db.register_referral(1001, 1002) is False
+    assert db.execute("SELECT COUNT(*) FROM Referrals", fetchone=True)[0] == 0
+    assert db.execute("SELECT referral_count FROM Users WHERE telegram_id = 1001", fetchone=True)[0] in (0, None)
+
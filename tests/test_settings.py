@@ -0,0 +1,22 @@
+# Sozlamalar keshi: o'qish xatosi bo'sh lug'at sifatida keshlanmaydi
+
+
+def test_failed_load_is_not_cached(db):
+    db.set_setting('card_number', '8600 0000 0000 0001')
+    db.invalidate_settings_cache()
+
+    db.execute("ALTER TABLE Settings RENAME TO Settings_old", commit=True)
+    assert db.get_setting('card_number') is None
+
+    # Jadval qaytgach keyingi o'qish bazadan qayta yuklaydi
+    db.execute("ALTER TABLE Settings_old RENAME TO Settings", commit=True)
+    assert db.get_setting('card_number') == '8600 0000 0000 0001'
+
+
+def test_failed_reload_keeps_previous_snapshot(db):
+    db.set_setting('card_number', '8600 0000 0000 0001')
+    db.load_settings()
+
+    db.execute("ALTER TABLE Settings RENAME TO Settings_old", commit=True)
+    assert db.load_settings()['card_number'] == '8600 0000 0000 0001'
+    assert db.get_setting('card_number') == '8600 0000 0000 0001'
@@ -0,0 +1,66 @@
+# Trigger bilan yuritiladigan agregatlar rebuild_stats() natijasiga teng bo'lishi
+import random
+
+from conftest import make_course
+
+
+def stats_user_course(db):
+    return db.execute(
+        "SELECT user_id, course_id, lessons, completed FROM StatsUserCourse ORDER BY user_id, course_id",
+        fetchall=True
+    )
+
+
+def test_user_course_stats_match_rebuild(db):
+    random.seed(7)
+    courses = [make_course(db, lessons=4, modules=2) for _ in range(3)]
+    lessons = [lesson_id for course_id in courses for lesson_id in db.catalog.course_lessons[course_id]]
+    for i in range(20):
+        db.add_user(1000 + i)
+    user_ids = [row[0] for row in db.execute("SELECT id FROM Users", fetchall=True)]
+
+    # Ommaviy INSERT OR IGNORE (mavjud yozuvlar o'zgarmaydi)
+    db.init_users_progress(user_ids[:15], courses[0])
+    db.init_users_progress(user_ids[10:], courses[1])
+
+    for _ in range(300):
+        user_id = random.choice(user_ids)
+        telegram_id = 1000 + user_ids.index(user_id)
+        lesson_id = random.choice(lessons)
+        action = random.random()
+        if action < 0.3:
+            db.complete_lesson(telegram_id, lesson_id)                 # UPDATE + REPLACE
+        elif action < 0.5:
+            db.unlock_lesson(telegram_id, lesson_id)                   # INSERT OR REPLACE
+        elif action < 0.65:
+            db.mark_lesson_completed(user_id, lesson_id)               # UPSERT
+        elif action < 0.8:
+            db.execute("DELETE FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
+                       (user_id, lesson_id), commit=True)
+        elif action < 0.9:
+            db.execute("UPDATE UserProgress SET status = 'locked' WHERE user_id = ? AND lesson_id = ?",
+                       (user_id, lesson_id), commit=True)
+        else:
+            # Yozuvni boshqa darsga ko'chirish (UPDATE OF lesson_id)
+            db.execute("UPDATE OR IGNORE UserProgress SET lesson_id = ? WHERE user_id = ? AND lesson_id = ?",
+                       (random.choice(lessons), user_id, lesson_id), commit=True)
+
+    # Bir nechta userni butunlay tozalash
+    db.execute("DELETE FROM UserProgress WHERE user_id IN (?, ?)", (user_ids[0], user_ids[1]), commit=True)
+
+    maintained = stats_user_course(db)
+    db.rebuild_stats()
+    assert maintained == stats_user_course(db)
+    assert maintained  # Bo'sh agregat bilan tasodifan teng bo'lmasin
+
+
+def test_reset_clears_user_course_stats(db):
+    course_id = make_course(db, lessons=5)
+    for i in range(10):
+        db.add_user(2000 + i)
+    user_ids = [row[0] for row in db.execute("SELECT id FROM Users", fetchall=True)]
+    db.init_users_progress(user_ids, course_id)
+    assert len(stats_user_course(db)) == 10
+
+    assert db.reset_all_user_data()['success']
+    assert stats_user_course(db) == []
@@ -0,0 +1,48 @@
+# Obuna keshi: faqat aniq javoblar keshlanadi
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from utils.misc import subscription
+
+
+class FakeBot:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return SimpleNamespace(status=answer)
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    subscription.invalidate()
+    yield
+    subscription.invalidate()
+
+
+def check_cached(bot):
+    return asyncio.run(subscription.check_cached(1001, "@kanal", bot=bot))
+
+
+def test_api_error_lets_user_through_but_is_not_cached():
+    bot = FakeBot(RuntimeError("timeout"), "left")
+
+    assert check_cached(bot) is True
+    # Keyingi so'rov qayta tekshiradi va haqiqiy javobni oladi
+    assert check_cached(bot) is False
+    assert bot.calls == 2
+
+
+def test_member_answer_is_cached():
+    bot = FakeBot("member")
+
+    assert check_cached(bot) is True
+    assert check_cached(bot) is True
+    assert bot.calls == 1
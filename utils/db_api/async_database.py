@@ -0,0 +1,60 @@
+# async_database.py: Database metodlarini event loop'ni bloklamasdan chaqirish
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDatabase:
+    """
+    Har qanday Database obyekti uchun asinxron o'ram (facade).
+
+    Barcha metodlar bitta alohida DB oqimida (worker thread) bajariladi,
+    shuning uchun SQLite so'rovlari aiogram event loop'ini to'xtatib qo'ymaydi.
+    Metodlar nomi va argumentlari asl klass bilan bir xil:
+
+        user = await async_user_db.get_user(telegram_id)
+    """
+
+    def __init__(self, db, max_workers: int = 1):
+        self.db = db
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+
+    async def run(self, func, *args, **kwargs):
+        """Istalgan sinxron funksiyani DB oqimida bajarish"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        # Keyingi chaqiruvlar uchun keshlaymiz
+        setattr(self, name, method)
+        return method
+
+    def close(self):
+        """
+        DB oqimini to'xtatish (navbatdagi so'rovlar tugashini kutadi)
+
+        Har bir worker o'z ulanishini o'zi yopadi: to'siq (Barrier) har bir
+        vazifani alohida oqimga tushishga majbur qiladi.
+        """
+        barrier = threading.Barrier(self._max_workers)
+
+        def close_thread():
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass  # Hamma worker ishga tushmagan - ochilmagan ulanish yo'q
+            self.db.close_thread()
+
+        for future in [self._executor.submit(close_thread) for _ in range(self._max_workers)]:
+            future.result()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,178 @@
+# catalog.py: Kurslar tuzilmasi (kurs/modul/dars/test) uchun xotiradagi nusxa
+from typing import Dict, List, Optional, Tuple
+
+
+def _order_key(item: Dict):
+    return item['order_num'] or 0, item['id']
+
+
+class CourseCatalog:
+    """
+    Kurslar katalogining o'zgarmas (immutable) nusxasi.
+
+    Bitta versiya uchun 4 ta SELECT bilan to'liq yuklanadi va shundan
+    keyin faqat o'qiladi. Admin kurs/modul/dars/testni o'zgartirganda
+    UserDatabase versiyani oshiradi va keyingi o'qishda yangi nusxa quriladi.
+    Metodlar ichki dict'larni qaytaradi - ularni o'zgartirmang.
+    """
+
+    def __init__(self, version: int, courses: List[Dict], modules: List[Dict],
+                 lessons: List[Dict], tests: List[Dict]):
+        self.version = version
+
+        self.courses: Dict[int, Dict] = {c['id']: c for c in courses}
+        self.modules: Dict[int, Dict] = {m['id']: m for m in modules}
+        self.tests: Dict[int, Dict] = {t['id']: t for t in tests}
+
+        # Faqat moduli mavjud darslar (get_lesson dagi JOIN kabi)
+        self.lessons: Dict[int, Dict] = {}
+        for lesson in lessons:
+            module = self.modules.get(lesson['module_id'])
+            if module:
+                lesson['module_name'] = module['name']
+                lesson['course_id'] = module['course_id']
+                self.lessons[lesson['id']] = lesson
+
+        # Kurs -> modullar, modul -> darslar (order_num bo'yicha, nofaollari ham)
+        self.course_modules: Dict[int, Tuple[int, ...]] = {}
+        for module in sorted(self.modules.values(), key=_order_key):
+            self.course_modules.setdefault(module['course_id'], ())
+            self.course_modules[module['course_id']] += (module['id'],)
+
+        self.module_lessons: Dict[int, Tuple[int, ...]] = {}
+        for lesson in sorted(self.lessons.values(), key=_order_key):
+            self.module_lessons.setdefault(lesson['module_id'], ())
+            self.module_lessons[lesson['module_id']] += (lesson['id'],)
+
+        # Kursning o'quvchiga ko'rinadigan darslari ketma-ketligi
+        # (faol modullardagi faol darslar, modul va dars tartibida)
+        self.course_lessons: Dict[int, Tuple[int, ...]] = {}
+        for course_id, module_ids in self.course_modules.items():
+            self.course_lessons[course_id] = tuple(
+                lesson_id
+                for module_id in module_ids if self.modules[module_id]['is_active']
+                for lesson_id in self.module_lessons.get(module_id, ())
+                if self.lessons[lesson_id]['is_active']
+            )
+
+        # Barcha faol kurslar darslari bitta ketma-ketlikda (kurs tartibida).
+        # Foydalanuvchi menyusidagi "ketma-ket darslar" ro'yxati shu.
+        self.sequence: Tuple[int, ...] = tuple(
+            lesson_id
+            for course in sorted(self.courses.values(), key=_order_key) if course['is_active']
+            for lesson_id in self.course_lessons.get(course['id'], ())
+        )
+        self.sequence_positions: Dict[int, int] = {
+            lesson_id: i for i, lesson_id in enumerate(self.sequence)
+        }
+
+        # Darslar ketma-ketligi indeksi: dars -> (kurs, kursdagi o'rni)
+        self.lesson_positions: Dict[int, Tuple[int, int]] = {
+            lesson_id: (course_id, i)
+            for course_id, lesson_ids in self.course_lessons.items()
+            for i, lesson_id in enumerate(lesson_ids)
+        }
+
+        # Dars -> faol test
+        self.lesson_tests: Dict[int, Dict] = {
+            t['lesson_id']: t for t in tests if t['is_active']
+        }
+
+    # ============================================================
+    #                    DARSLAR KETMA-KETLIGI (O(1))
+    # ============================================================
+
+    def _sibling_lesson_id(self, lesson_id: int, step: int) -> Optional[int]:
+        position = self.lesson_positions.get(lesson_id)
+        if position is None:
+            return None
+        course_id, i = position
+        lesson_ids = self.course_lessons[course_id]
+        if 0 <= i + step < len(lesson_ids):
+            return lesson_ids[i + step]
+        return None
+
+    def next_lesson_id(self, lesson_id: int) -> Optional[int]:
+        """Kursdagi keyingi dars (oxirgi bo'lsa None)"""
+        return self._sibling_lesson_id(lesson_id, 1)
+
+    def previous_lesson_id(self, lesson_id: int) -> Optional[int]:
+        """Kursdagi oldingi dars (birinchi bo'lsa None)"""
+        return self._sibling_lesson_id(lesson_id, -1)
+
+    def first_lesson_id(self, course_id: int) -> Optional[int]:
+        """Kursning birinchi darsi"""
+        lesson_ids = self.course_lessons.get(course_id)
+        return lesson_ids[0] if lesson_ids else None
+
+    def lesson_position(self, lesson_id: int) -> Optional[Tuple[int, int, int]]:
+        """(kurs ID, 1 dan boshlanuvchi o'rin, kursdagi darslar soni)"""
+        position = self.lesson_positions.get(lesson_id)
+        if position is None:
+            return None
+        course_id, i = position
+        return course_id, i + 1, len(self.course_lessons[course_id])
+
+    @classmethod
+    def load(cls, db, version: int) -> 'CourseCatalog':
+        """Katalogni bazadan yuklash"""
+        courses = db.execute(
+            """SELECT id, name, description, price, order_num, is_active, created_at
+               FROM Courses""",
+            fetchall=True
+        ) or []
+        modules = db.execute(
+            "SELECT id, course_id, name, description, order_num, is_active FROM Modules",
+            fetchall=True
+        ) or []
+        lessons = db.execute(
+            """SELECT id, module_id, name, description, video_file_id, video_duration,
+                      order_num, has_test, is_free, is_active
+               FROM Lessons""",
+            fetchall=True
+        ) or []
+        tests = db.execute(
+            "SELECT id, lesson_id, name, passing_score, time_limit, is_active FROM Tests",
+            fetchall=True
+        ) or []
+
+        return cls(
+            version,
+            courses=[{
+                'id': row[0],
+                'name': row[1],
+                'description': row[2],
+                'price': float(row[3] or 0),
+                'order_num': row[4],
+                'is_active': bool(row[5]),
+                'created_at': row[6]
+            } for row in courses],
+            modules=[{
+                'id': row[0],
+                'course_id': row[1],
+                'name': row[2],
+                'description': row[3],
+                'order_num': row[4],
+                'is_active': bool(row[5])
+            } for row in modules],
+            lessons=[{
+                'id': row[0],
+                'module_id': row[1],
+                'name': row[2],
+                'description': row[3],
+                'video_file_id': row[4],
+                'video_duration': row[5],
+                'order_num': row[6],
+                'has_test': bool(row[7]),
+                'is_free': bool(row[8]),
+                'is_active': bool(row[9])
+            } for row in lessons],
+            tests=[{
+                'id': row[0],
+                'lesson_id': row[1],
+                'name': row[2],
+                'passing_score': row[3],
+                'time_limit': row[4],
+                'is_active': bool(row[5])
+            } for row in tests]
+        )
@@ -9,6 +9,15 @@ logger = logging.getLogger(__name__)
 
 class ChannelDatabase(Database):
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Faol kanallar ro'yxati keshi (har bir xabarda o'qiladi, kamdan-kam o'zgaradi)
+        self._channels_cache = None
+
+    def invalidate_channels_cache(self):
+        """Kanallar keshini tozalash (kanal qo'shilganda/o'zgarganda)"""
+        self._channels_cache = None
+
     def create_table_channels(self):
         """Kanallar jadvalini yaratish"""
         sql_channels = """
@@ -43,6 +52,7 @@ class ChannelDatabase(Database):
             VALUES (?, ?, ?)
             """
             self.execute(sql, parameters=(channel_id, title, invite_link), commit=True)
+            self.invalidate_channels_cache()
             logger.info(f"✅ Kanal qo'shildi: {title} ({channel_id})")
             return True
 
@@ -70,6 +80,7 @@ class ChannelDatabase(Database):
             params.append(channel_id)
             sql = f"UPDATE Channels SET {', '.join(updates)} WHERE channel_id = ?"
             self.execute(sql, parameters=tuple(params), commit=True)
+            self.invalidate_channels_cache()
             logger.info(f"✅ Kanal yangilandi: {channel_id}")
             return True
 
@@ -82,6 +93,7 @@ class ChannelDatabase(Database):
         try:
             sql = "DELETE FROM Channels WHERE channel_id = ?"
             self.execute(sql, parameters=(channel_id,), commit=True)
+            self.invalidate_channels_cache()
             logger.info(f"✅ Kanal o'chirildi: {channel_id}")
             return True
         except Exception as e:
@@ -89,11 +101,18 @@ class ChannelDatabase(Database):
             return False
 
     def get_all_channels(self) -> list:
-        """Barcha faol kanallar"""
+        """Barcha faol kanallar (keshlangan)"""
+        channels = self._channels_cache
+        if channels is not None:
+            return list(channels)
         try:
             sql = "SELECT * FROM Channels WHERE is_active = TRUE OR is_active = 1"
             result = self.execute(sql, fetchall=True)
-            return result if result else []
+            if result is None:
+                # SQLite xatosi - keshlamaymiz
+                return []
+            self._channels_cache = tuple(result)
+            return list(result)
         except Exception as e:
             logger.error(f"❌ Kanallarni olishda xato: {e}")
             return []
@@ -145,6 +164,7 @@ class ChannelDatabase(Database):
         try:
             sql = "UPDATE Channels SET is_active = FALSE WHERE channel_id = ?"
             self.execute(sql, parameters=(channel_id,), commit=True)
+            self.invalidate_channels_cache()
             return True
         except Exception as e:
             logger.error(f"❌ Deaktiv qilishda xato: {e}")
@@ -155,6 +175,7 @@ class ChannelDatabase(Database):
         try:
             sql = "UPDATE Channels SET is_active = TRUE WHERE channel_id = ?"
             self.execute(sql, parameters=(channel_id,), commit=True)
+            self.invalidate_channels_cache()
             return True
         except Exception as e:
             logger.error(f"❌ Aktiv qilishda xato: {e}")
@@ -1,46 +1,218 @@
 # database.py: Umumiy ma'lumotlar bazasi bilan bog'lanish va "execute" funksiyasi
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-def logger(statement):
-    print(f"""
-_____________________________________________________        
-Executing: 
-{statement}
-_____________________________________________________
-""")
+# Ulanish sozlamalari (har bir yangi ulanishda bir marta qo'llanadi)
+CACHED_STATEMENTS = 256          # Tayyorlangan (prepared) so'rovlar keshi hajmi
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",     # O'qish va yozish bir-birini bloklamaydi
+    "PRAGMA synchronous = NORMAL",   # WAL rejimida xavfsiz va tezroq fsync
+    "PRAGMA cache_size = -16000",    # ~16 MB sahifa keshi
+    "PRAGMA mmap_size = 134217728",  # 128 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA recursive_triggers = ON",  # REPLACE o'chirgan qator DELETE triggerini chaqiradi
+)
+
 
 class Database:
-    def __init__(self, path_to_db="main.db"):
+    def __init__(self, path_to_db="main.db", profiler=None):
         self.path_to_db = path_to_db
+        # Ixtiyoriy QueryProfiler (utils/db_api/profiler.py), None - o'lchanmaydi
+        self.profiler = profiler
+        # Har bir oqim (thread) uchun bitta doimiy ulanish
+        self._local = threading.local()
+        # Ochiq ulanishlar reyestri: [(oqim nomi, ulanish)]. SQLite ulanishini
+        # faqat uni ochgan oqim yopa oladi - close_thread() shu oqimda chaqiriladi.
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Yangi ulanish ochish va sozlash"""
+        connection = sqlite3.connect(self.path_to_db, cached_statements=CACHED_STATEMENTS)
+        for pragma in CONNECTION_PRAGMAS:
+            connection.execute(pragma)
+        with self._connections_lock:
+            self._connections.append((threading.current_thread().name, connection))
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Joriy oqimning doimiy ulanishi (kerak bo'lsa ochiladi)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def close_thread(self):
+        """Joriy oqimning ulanishini yopish (ulanish ochgan oqimning o'zida chaqiriladi)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            return
+        self._local.connection = None
+        with self._connections_lock:
+            self._connections = [item for item in self._connections if item[1] is not connection]
+        try:
+            connection.close()
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+
+    def close(self):
+        """
+        Bot to'xtaganda: WAL ni asosiy faylga ko'chirish va joriy oqim ulanishini yopish
+
+        Boshqa oqimlarning ulanishlari oldinroq o'z oqimida close_thread()
+        bilan yopilishi kerak (AsyncDatabase.close() DB oqimi uchun shunday
+        qiladi). Ular ochiq qolsa checkpoint WAL ni to'liq tozalay olmaydi.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            try:
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                print(f"SQLite error: {e}")
+        self.close_thread()
+
+        with self._connections_lock:
+            leftover = [name for name, _ in self._connections]
+        if leftover:
+            print(f"⚠️ {self.path_to_db}: yopilmagan ulanishlar: {', '.join(leftover)}")
 
     @property
-    def connection(self):
-        return sqlite3.connect(self.path_to_db)
+    def in_transaction(self) -> bool:
+        """Joriy oqim transaction() bloki ichidami"""
+        return getattr(self._local, 'transaction_depth', 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Bir nechta so'rovni bitta tranzaksiyada bajarish (unit of work)
+
+            with db.transaction():
+                db.execute(..., commit=True)
+                db.execute(..., commit=True)
+
+        Blok ichidagi execute/executemany joriy oqim ulanishida ishlaydi,
+        commit=True e'tiborsiz qoldiriladi va blok oxirida bitta commit
+        (bitta fsync) bo'ladi. SQLite xatosi yoki istalgan istisno bo'lsa
+        hammasi bekor qilinadi va istisno qayta ko'tariladi.
+        BEGIN IMMEDIATE yozish qulfini darhol oladi, shuning uchun blok
+        ichida o'qilgan qiymatlar commit gacha boshqa yozuvchi tomonidan
+        o'zgartirilmaydi. Ichma-ich bloklar tashqi tranzaksiyaga qo'shiladi.
+        """
+        depth = getattr(self._local, 'transaction_depth', 0)
+        connection = self.connection
+        if depth:
+            self._local.transaction_depth = depth + 1
+            try:
+                yield connection
+            finally:
+                self._local.transaction_depth = depth
+            return
+
+        if connection.in_transaction:
+            connection.rollback()
+        connection.execute("BEGIN IMMEDIATE")
+        self._local.transaction_depth = 1
+        try:
+            yield connection
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            self._local.transaction_depth = 0
 
     def execute(self, sql: str, parameters: tuple = None, fetchone=False, fetchall=False, commit=False):
         if not parameters:
             parameters = ()
         connection = self.connection
-        connection.set_trace_callback(logger)
         cursor = connection.cursor()
         data = None
+        profiler = self.profiler
+        started = time.perf_counter() if profiler and profiler.should_sample() else None
+        in_transaction = self.in_transaction
         try:
             cursor.execute(sql, parameters)
-            if commit:
+            if commit and not in_transaction:
                 connection.commit()
             if fetchall:
                 data = cursor.fetchall()
             if fetchone:
                 data = cursor.fetchone()
+            if started is not None:
+                profiler.record(sql, (time.perf_counter() - started) * 1000)
         except sqlite3.Error as e:
             print(f"SQLite error: {e}")
+            if in_transaction:
+                raise  # Butun tranzaksiya transaction() da bekor qilinadi
             connection.rollback()
         finally:
-            connection.close()
+            cursor.close()
+            # commit=False bilan qilingan yozuvlar avvalgidek saqlanmaydi
+            if not commit and not in_transaction and connection.in_transaction:
+                connection.rollback()
         return data
 
+    def executemany(self, sql: str, parameters_list, commit=False) -> int:
+        """Bitta so'rovni ko'p parametrlar bilan bitta tranzaksiyada bajarish"""
+        connection = self.connection
+        cursor = connection.cursor()
+        rowcount = 0
+        profiler = self.profiler
+        started = time.perf_counter() if profiler and profiler.should_sample() else None
+        in_transaction = self.in_transaction
+        try:
+            cursor.executemany(sql, parameters_list)
+            rowcount = cursor.rowcount
+            if commit and not in_transaction:
+                connection.commit()
+            if started is not None:
+                profiler.record(sql, (time.perf_counter() - started) * 1000)
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+            if in_transaction:
+                raise
+            connection.rollback()
+            rowcount = 0
+        finally:
+            cursor.close()
+            if not commit and not in_transaction and connection.in_transaction:
+                connection.rollback()
+        return rowcount
+
+    def iterate(self, sql: str, parameters: tuple = None, chunk_size: int = 1000):
+        """
+        Katta natijani bo'laklab o'qish (fetchall siz)
+
+        Har safar `chunk_size` ta qator (list) qaytaradi. Joriy oqim
+        ulanishida bitta kursor ochiladi - WAL rejimida u boshlangan
+        paytdagi holatni ko'radi va yozuvchilarni bloklamaydi.
+
+        Xato qayta ko'tariladi - yarim o'qilgan natija to'liq deb qabul qilinmasin.
+        """
+        connection = self.connection
+        cursor = connection.cursor()
+        try:
+            cursor.execute(sql, parameters or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.Error as e:
+            print(f"SQLite error: {e}")
+            raise
+        finally:
+            cursor.close()
+            if not self.in_transaction and connection.in_transaction:
+                connection.rollback()
+
     @staticmethod
     def format_args(sql, parameters: dict):
         sql += " AND ".join([f"{item} = ?" for item in parameters])
-        return sql, tuple(parameters.values())
\ No newline at end of file
+        return sql, tuple(parameters.values())
@@ -0,0 +1,89 @@
+# migrations.py: Versiyali sxema migratsiyalari (PRAGMA user_version)
+import logging
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def add_column_if_missing(db, table: str, column: str, definition: str):
+    """Ustun yo'q bo'lsa qo'shish (versiyalashdan oldingi bazalar uchun)"""
+    columns = db.execute(f"PRAGMA table_info({table})", fetchall=True) or []
+    if column not in [col[1] for col in columns]:
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}", commit=True)
+
+
+def _baseline(db):
+    """Barcha jadvallar, indekslar, triggerlar va default sozlamalar"""
+    db.create_tables()
+
+
+def _users_delivery_columns(db):
+    # create_table_users da bor, lekin eski bazalardagi Users jadvalida yo'q
+    add_column_if_missing(db, 'Users', 'deliverable', 'BOOLEAN DEFAULT TRUE')
+    add_column_if_missing(db, 'Users', 'last_delivery_error_at', 'DATETIME NULL')
+    add_column_if_missing(db, 'Users', 'last_reminded_at', 'DATETIME NULL')
+
+
+def _composite_indexes(db):
+    # Yangi kompozit indekslar create_table_* da; eskilari ularning prefiksi
+    for index in ('idx_payments_user', 'idx_payments_status', 'idx_test_results_user', 'idx_lessons_module'):
+        db.execute(f"DROP INDEX IF EXISTS {index}", commit=True)
+    db.create_table_users()
+    db.create_table_lessons()
+    db.create_table_test_results()
+    db.create_table_payments()
+
+
+def _progress_stats_deltas(db):
+    # StatsUserCourse endi har bir qatorda qayta sanalmaydi - +/- delta triggerlari
+    for trigger in ('trg_stats_progress_insert', 'trg_stats_progress_update', 'trg_stats_progress_delete'):
+        db.execute(f"DROP TRIGGER IF EXISTS {trigger}", commit=True)
+    db.create_table_stats()
+
+
+# (versiya, nomi, funksiya). Faqat oxiriga qo'shiladi, mavjudlari o'zgartirilmaydi.
+# Funksiya db.execute orqali ishlaydi - hammasi bitta tranzaksiya ichida.
+USER_DB_MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "baseline", _baseline),
+    (2, "users_delivery_columns", _users_delivery_columns),
+    (3, "composite_indexes", _composite_indexes),
+    (4, "progress_stats_deltas", _progress_stats_deltas),
+]
+
+
+def get_schema_version(db) -> int:
+    result = db.execute("PRAGMA user_version", fetchone=True)
+    return result[0] if result else 0
+
+
+def migrate(db, migrations: List[Tuple[int, str, Callable]] = USER_DB_MIGRATIONS) -> int:
+    """
+    Bajarilmagan migratsiyalarni qo'llash
+
+    To'liq yangilangan bazada faqat bitta PRAGMA user_version o'qiladi.
+    Aks holda barcha navbatdagi migratsiyalar va yangi versiya raqami
+    bitta tranzaksiyada yoziladi: xato bo'lsa baza o'zgarmaydi va xato
+    qayta ko'tariladi - kod eski sxema bilan ishlamasligi kerak.
+
+    Returns:
+        Bazaning joriy sxema versiyasi
+    """
+    current = get_schema_version(db)
+    pending = [m for m in migrations if m[0] > current]
+    if not pending:
+        logger.info(f"ℹ️ Database sxemasi dolzarb (v{current})")
+        return current
+
+    latest = pending[-1][0]
+    try:
+        with db.transaction():
+            for version, name, apply in pending:
+                apply(db)
+                logger.info(f"✅ Migration v{version}: {name}")
+            db.execute(f"PRAGMA user_version = {int(latest)}", commit=True)
+    except Exception as e:
+        logger.error(f"❌ Migration xato (v{current} -> v{latest}): {e}")
+        raise
+
+    logger.info(f"✅ Database sxemasi yangilandi: v{current} -> v{latest}")
+    return latest
@@ -0,0 +1,155 @@
+# profiler.py: SQL so'rovlarini o'lchash (namuna olish, histogramma, sekin so'rovlar)
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Histogramma chegaralari (millisekund)
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+# So'rov manbai sifatida o'tkazib yuboriladigan fayllar (aniq yo'l bo'yicha:
+# async_database.py va boshqa *database.py fayllar manba hisoblanadi)
+_INTERNAL_FILES = frozenset(
+    os.path.join(os.path.dirname(__file__), name) for name in ("database.py", "profiler.py")
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """So'rovni kalit sifatida ishlatish uchun soddalashtirish (literallar -> ?)"""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (?, ...)", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+class QueryStats:
+    """Bitta normallashtirilgan so'rov statistikasi"""
+
+    __slots__ = ('sql', 'count', 'total_ms', 'max_ms', 'buckets', 'callers')
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.callers = {}
+
+    def add(self, elapsed_ms: float, caller: str):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.callers[caller] = self.callers.get(caller, 0) + 1
+
+    def to_dict(self) -> Dict:
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            'sql': self.sql,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 2),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 2),
+            'histogram': dict(zip(labels, self.buckets)),
+            'callers': dict(sorted(self.callers.items(), key=lambda x: -x[1])),
+        }
+
+
+class QueryProfiler:
+    """
+    Database.execute uchun ixtiyoriy profiler.
+
+    Args:
+        sample_rate: 0..1 - nechta so'rov o'lchanadi (1.0 = hammasi)
+        slow_query_ms: shundan sekin so'rovlar logga yoziladi (0 = o'chirilgan)
+        dump_path: statistikani JSON faylga yozish manzili
+    """
+
+    def __init__(self, sample_rate: float = 1.0, slow_query_ms: float = 100, dump_path: str = None):
+        self.sample_rate = sample_rate
+        self.slow_query_ms = slow_query_ms
+        self.dump_path = dump_path
+        self.started_at = time.time()
+        self._stats: Dict[str, QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @staticmethod
+    def _caller() -> str:
+        """So'rovni chaqirgan birinchi metod (db_api/database.py dan tashqarida)"""
+        frame = sys._getframe(2)
+        while frame is not None:
+            code = frame.f_code
+            if "concurrent" in code.co_filename or code.co_filename.endswith("threading.py"):
+                # AsyncDatabase.execute orqali to'g'ridan-to'g'ri chaqirilgan
+                return "execute"
+            if code.co_filename not in _INTERNAL_FILES:
+                owner = frame.f_locals.get('self')
+                if owner is not None:
+                    return f"{type(owner).__name__}.{code.co_name}"
+                owner = frame.f_locals.get('cls')
+                if isinstance(owner, type):
+                    # classmethod (masalan CourseCatalog.load)
+                    return f"{owner.__name__}.{code.co_name}"
+                return code.co_name
+            frame = frame.f_back
+        return "?"
+
+    def record(self, sql: str, elapsed_ms: float):
+        key = normalize_sql(sql)
+        caller = self._caller()
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(key)
+            stats.add(elapsed_ms, caller)
+
+        if self.slow_query_ms and elapsed_ms >= self.slow_query_ms:
+            logger.warning(f"🐢 Sekin so'rov ({elapsed_ms:.1f} ms) [{caller}]: {key[:300]}")
+
+    def top(self, limit: int = 10, order_by: str = 'total_ms') -> List[Dict]:
+        """Eng ko'p vaqt olgan so'rovlar"""
+        with self._lock:
+            items = [s.to_dict() for s in self._stats.values()]
+        items.sort(key=lambda x: x[order_by], reverse=True)
+        return items[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.started_at = time.time()
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """Barcha statistikani JSON faylga yozish"""
+        path = path or self.dump_path
+        if not path:
+            return None
+        data = {
+            'started_at': self.started_at,
+            'dumped_at': time.time(),
+            'sample_rate': self.sample_rate,
+            'queries': self.top(limit=len(self._stats) or 1),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
@@ -7,19 +7,84 @@ to'liq database logikasi.
 Muallif: Davronov G'olibjon
 Sana: 2025
 """
-from data.config import ADMINS
+from data.config import ADMINS, STATS_CACHE_TTL
 from .database import Database
+from .catalog import CourseCatalog
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
+from collections import OrderedDict
+import threading
+import time
 import json
 import pytz
 
 TASHKENT_TZ = pytz.timezone('Asia/Tashkent')
 
+USER_ID_CACHE_SIZE = 10000  # telegram_id -> user_id keshidagi maksimal yozuvlar
+PROGRESS_CACHE_SIZE = 5000  # Progressi xotirada saqlanadigan foydalanuvchilar soni
+ACCESS_CACHE_SIZE = 10000   # Dostuplari xotirada saqlanadigan foydalanuvchilar soni
+ACCESS_CACHE_TTL = 600      # Metodlardan tashqari (xom SQL) o'zgarishlar uchun zaxira muddat
+
 
 class UserDatabase(Database):
     """O'quv markaz bot uchun asosiy database class"""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # telegram_id -> Users.id (LRU). Bu bog'lanish faqat user qo'shilganda
+        # yoki o'chirilganda o'zgaradi, shuning uchun o'sha joylarda tozalanadi.
+        self._user_id_cache = OrderedDict()
+        self._user_id_cache_lock = threading.Lock()
+        # Kurslar katalogi nusxasi (utils/db_api/catalog.py). Admin kurs/modul/
+        # dars/testni o'zgartirganda versiya oshadi va nusxa qayta quriladi.
+        self._catalog = None
+        self._catalog_version = 0
+        self._catalog_lock = threading.Lock()
+        # Users.id -> {lesson_id: status} (LRU). UserProgress ga yozadigan
+        # metodlar keshni ham yangilaydi (write-through).
+        self._progress_cache = OrderedDict()
+        self._progress_cache_lock = threading.Lock()
+        # Users.id -> bazadan o'qilayotgan progress belgisi. Yozuv yoki tozalash
+        # belgini olib tashlaydi - o'qish tugagach eski natija keshga yozilmaydi.
+        self._progress_loading = {}
+        # Dashboard/hisobot statistikasi: (amal qilish muddati, dict) - TTL kesh
+        self._stats_cache = None
+        self._stats_lock = threading.Lock()
+        # Admin ro'yxatlari jami soni: segment -> (amal qilish muddati, son)
+        self._list_count_cache = {}
+        # Settings jadvali nusxasi {key: value}. Sozlamalar yiliga bir necha
+        # marta o'zgaradi - set_setting/set_default_duration keshni tozalaydi.
+        self._settings = None
+        self._settings_lock = threading.Lock()
+        # Users.id -> (yuklangan vaqt, {course_id: tugash vaqti (epoch) yoki None}).
+        # Dostupni o'zgartiradigan metodlar shu userni keshdan o'chiradi.
+        self._access_cache = OrderedDict()
+        self._access_cache_lock = threading.Lock()
+        # Users.id -> bazadan o'qilayotgan dostup belgisi (_progress_loading kabi)
+        self._access_loading = {}
+
+    # ============================================================
+    #                    KURSLAR KATALOGI (KESH)
+    # ============================================================
+
+    @property
+    def catalog(self) -> CourseCatalog:
+        """Joriy versiyadagi katalog nusxasi (kerak bo'lsa qayta yuklanadi)"""
+        catalog = self._catalog
+        if catalog is None or catalog.version != self._catalog_version:
+            with self._catalog_lock:
+                catalog = self._catalog
+                version = self._catalog_version
+                if catalog is None or catalog.version != version:
+                    catalog = CourseCatalog.load(self, version)
+                    self._catalog = catalog
+        return catalog
+
+    def bump_catalog_version(self):
+        """Kurs tuzilmasi o'zgardi - keyingi o'qishda katalog qayta quriladi"""
+        with self._catalog_lock:
+            self._catalog_version += 1
+
     # ============================================================
     #                    JADVALLARNI YARATISH
     # ============================================================
@@ -38,10 +103,12 @@ class UserDatabase(Database):
         self.create_table_feedbacks()
         self.create_table_payments()
         self.create_table_manual_access()
+        self.create_table_broadcasts()
         self.create_table_certificates()
         self.create_table_settings()
         self.create_table_lesson_materials()
         self.create_table_referrals()
+        self.create_table_stats()
         print("✅ Barcha jadvallar yaratildi")
 
     def create_table_users(self):
@@ -64,11 +131,17 @@ class UserDatabase(Database):
             is_active BOOLEAN DEFAULT TRUE,
             is_blocked BOOLEAN DEFAULT FALSE,
             last_active DATETIME NULL,
+            deliverable BOOLEAN DEFAULT TRUE,
+            last_delivery_error_at DATETIME NULL,
+            last_reminded_at DATETIME NULL,
             created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
         );
         """
         self.execute(sql, commit=True)
         self.execute("CREATE INDEX IF NOT EXISTS idx_users_telegram ON Users(telegram_id);", commit=True)
+        self.execute("CREATE INDEX IF NOT EXISTS idx_users_last_active ON Users(last_active);", commit=True)
+        # Ro'yxatlar: ORDER BY created_at DESC LIMIT ... (saralashsiz)
+        self.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON Users(created_at);", commit=True)
 
 
     def create_table_admins(self):
@@ -159,7 +232,11 @@ class UserDatabase(Database):
         );
         """
         self.execute(sql, commit=True)
-        self.execute("CREATE INDEX IF NOT EXISTS idx_lessons_module ON Lessons(module_id);", commit=True)
+        # Modul darslari: WHERE module_id = ? AND is_active ORDER BY order_num
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lessons_module_active ON Lessons(module_id, is_active, order_num);",
+            commit=True
+        )
 
     def create_table_tests(self):
         """Testlar jadvali"""
@@ -236,7 +313,12 @@ class UserDatabase(Database):
         );
         """
         self.execute(sql, commit=True)
-        self.execute("CREATE INDEX IF NOT EXISTS idx_test_results_user ON TestResults(user_id);", commit=True)
+        # (user_id, test_id) + ichki rowid (id): birinchi natija (MIN(id)) va
+        # GROUP BY test_id jadvalga tegmasdan indeksdan o'qiladi
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_test_results_user_test ON TestResults(user_id, test_id);",
+            commit=True
+        )
 
     def create_table_feedbacks(self):
         """Fikr-mulohazalar jadvali"""
@@ -277,8 +359,16 @@ class UserDatabase(Database):
         );
         """
         self.execute(sql, commit=True)
-        self.execute("CREATE INDEX IF NOT EXISTS idx_payments_user ON Payments(user_id);", commit=True)
-        self.execute("CREATE INDEX IF NOT EXISTS idx_payments_status ON Payments(status);", commit=True)
+        # Dostup tekshiruvi va auditoriyalar: user_id = ? AND course_id = ? AND status = ?
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_payments_user_course_status ON Payments(user_id, course_id, status);",
+            commit=True
+        )
+        # Kutilayotganlar soni va tasdiqlash sanasi bo'yicha diapazonlar
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_payments_status_updated ON Payments(status, updated_at);",
+            commit=True
+        )
 
     def create_table_manual_access(self):
         """Qo'lda berilgan dostuplar jadvali"""
@@ -342,6 +432,8 @@ class UserDatabase(Database):
             ('silver_threshold', '75', 'Kumush sertifikat chegarasi (%)'),
             ('gold_threshold', '90', 'Oltin sertifikat chegarasi (%)'),
             ('reminder_days', '3', 'Necha kundan keyin eslatma yuborish'),
+            ('reminder_hour', '10', 'Kunlik eslatma yuboriladigan soat (0-23)'),
+            ('reminder_enabled', 'true', 'Kunlik avtomatik eslatma yoqilganmi'),
             ('referral_cashback', '10', 'Referal cashback foizi (%)'),
         ]
 
@@ -351,6 +443,7 @@ class UserDatabase(Database):
                 parameters=(key, value, desc),
                 commit=True
             )
+        self.invalidate_settings_cache()
 
     def create_table_lesson_materials(self):
         sql = """
@@ -388,6 +481,265 @@ class UserDatabase(Database):
                 parameters=(key, value, desc),
                 commit=True
             )
+        self.invalidate_settings_cache()
+
+    def create_table_broadcasts(self):
+        """Reklama kampaniyalari va ularning yuborish navbati (outbox)"""
+        sql = """
+        CREATE TABLE IF NOT EXISTS BroadcastCampaigns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            creator_id BIGINT NOT NULL,
+            payload TEXT NOT NULL,
+            target VARCHAR(20) NOT NULL,
+            target_id INTEGER NULL,
+            status VARCHAR(20) DEFAULT 'scheduled',
+            scheduled_at DATETIME NULL,
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            cursor INTEGER DEFAULT 0,
+            audience_cursor INTEGER DEFAULT 0,
+            audience_done INTEGER DEFAULT 0,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME NULL
+        );
+        """
+        self.execute(sql, commit=True)
+
+        sql = """
+        CREATE TABLE IF NOT EXISTS BroadcastOutbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            campaign_id INTEGER NOT NULL,
+            telegram_id BIGINT NOT NULL,
+            status VARCHAR(20) DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            error TEXT NULL,
+            updated_at DATETIME NULL,
+            UNIQUE(campaign_id, telegram_id),
+            FOREIGN KEY (campaign_id) REFERENCES BroadcastCampaigns(id) ON DELETE CASCADE
+        );
+        """
+        self.execute(sql, commit=True)
+        self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_campaign_status ON BroadcastOutbox(campaign_id, status, id);",
+            commit=True
+        )
+
+    def create_table_stats(self):
+        """
+        Hisobotlar uchun tayyor agregatlar (materialized) va ularni yangilovchi triggerlar
+
+        Triggerlar har qanday yozuvda (metodlar, xom SQL, reset) o'sha
+        tranzaksiyada ishlaydi, shuning uchun agregatlar jadvallardan ajralmaydi:
+        - Users, Payments, UserProgress: har bir qator uchun +/- delta (O(1)),
+          ommaviy yozuvlar (init_users_progress, reset) qatorlar soniga chiziqli
+        - Feedbacks, Certificates: o'zgargan kalit (dars, kurs) indeks bo'yicha
+          qayta sanaladi (kam yoziladi)
+        INSERT OR REPLACE eski qatorni o'chirganda DELETE triggeri faqat
+        recursive_triggers yoqilgan bo'lsa ishlaydi - Database ulanishlarida
+        u doim yoqilgan (CONNECTION_PRAGMAS).
+        """
+        first_time = not self.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_stats_users_insert'",
+            fetchone=True
+        )
+
+        tables = [
+            # Kunlik: yangi userlar va tasdiqlangan to'lovlar (kun - Toshkent sanasi)
+            """CREATE TABLE IF NOT EXISTS StatsDaily (
+                day TEXT PRIMARY KEY,
+                new_users INTEGER DEFAULT 0,
+                approved_payments INTEGER DEFAULT 0,
+                approved_amount REAL DEFAULT 0
+            );""",
+            # Kurs bo'yicha: pullik o'quvchilar, daromad, sertifikatlar
+            """CREATE TABLE IF NOT EXISTS StatsCourse (
+                course_id INTEGER PRIMARY KEY,
+                students INTEGER DEFAULT 0,
+                approved_payments INTEGER DEFAULT 0,
+                approved_amount REAL DEFAULT 0,
+                completions INTEGER DEFAULT 0
+            );""",
+            # Dars bo'yicha baholar
+            """CREATE TABLE IF NOT EXISTS StatsLesson (
+                lesson_id INTEGER PRIMARY KEY,
+                rating_sum INTEGER DEFAULT 0,
+                rating_count INTEGER DEFAULT 0
+            );""",
+            # User + kurs: progress yozuvlari va tugatilgan darslar
+            """CREATE TABLE IF NOT EXISTS StatsUserCourse (
+                user_id INTEGER NOT NULL,
+                course_id INTEGER NOT NULL,
+                lessons INTEGER DEFAULT 0,
+                completed INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, course_id)
+            );""",
+            "CREATE INDEX IF NOT EXISTS idx_stats_user_course_course ON StatsUserCourse(course_id);",
+            "CREATE INDEX IF NOT EXISTS idx_certificates_course ON Certificates(course_id);",
+        ]
+        for sql in tables:
+            self.execute(sql, commit=True)
+
+        # Trigger ichidagi so'rovlar hech qachon UNIQUE ga urilmasligi kerak: tashqi
+        # INSERT OR IGNORE / OR REPLACE ularning ON CONFLICT qoidasini almashtiradi.
+        # Shuning uchun avval yo'q qatorni qo'shamiz, keyin UPDATE qilamiz.
+        def ensure_row(table, key, value):
+            return f"""
+            INSERT INTO {table} ({key}) SELECT {value}
+            WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {key} = {value});
+            """
+
+        # To'lov tasdiqlangan kun: updated_at (tasdiqlash vaqti), bo'lmasa created_at
+        payment_day = "substr(COALESCE({row}.updated_at, {row}.created_at), 1, 10)"
+        payment_add = ensure_row('StatsDaily', 'day', payment_day.format(row='NEW')) + f"""
+            UPDATE StatsDaily SET approved_payments = approved_payments + 1,
+                                  approved_amount = approved_amount + NEW.amount
+            WHERE day = {payment_day.format(row='NEW')};
+        """ + ensure_row('StatsCourse', 'course_id', 'NEW.course_id') + """
+            UPDATE StatsCourse SET approved_payments = approved_payments + 1,
+                                   approved_amount = approved_amount + NEW.amount,
+                                   students = students + ((SELECT COUNT(*) FROM Payments
+                                                           WHERE user_id = NEW.user_id
+                                                             AND course_id = NEW.course_id
+                                                             AND status = 'approved') = 1)
+            WHERE course_id = NEW.course_id;
+        """
+        payment_remove = f"""
+            UPDATE StatsDaily SET approved_payments = approved_payments - 1,
+                                  approved_amount = approved_amount - OLD.amount
+            WHERE day = {payment_day.format(row='OLD')};
+            UPDATE StatsCourse SET approved_payments = approved_payments - 1,
+                                   approved_amount = approved_amount - OLD.amount,
+                                   students = students - NOT EXISTS (SELECT 1 FROM Payments
+                                                                     WHERE user_id = OLD.user_id
+                                                                       AND course_id = OLD.course_id
+                                                                       AND status = 'approved')
+            WHERE course_id = OLD.course_id;
+        """
+
+        def user_course_course(row):
+            # O'zgargan UserProgress yozuvi darsining kursi
+            return f"""(SELECT m.course_id FROM Lessons l JOIN Modules m ON l.module_id = m.id
+                        WHERE l.id = {row}.lesson_id)"""
+
+        def progress_add(row):
+            course = user_course_course(row)
+            return f"""
+            INSERT INTO StatsUserCourse (user_id, course_id)
+            SELECT {row}.user_id, c.course_id FROM (SELECT {course} AS course_id) c
+            WHERE c.course_id IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM StatsUserCourse WHERE user_id = {row}.user_id AND course_id = c.course_id);
+            UPDATE StatsUserCourse SET lessons = lessons + 1,
+                                       completed = completed + ({row}.status IS 'completed')
+            WHERE user_id = {row}.user_id AND course_id = {course};
+            """
+
+        def progress_remove(row):
+            course = user_course_course(row)
+            return f"""
+            UPDATE StatsUserCourse SET lessons = lessons - 1,
+                                       completed = completed - ({row}.status IS 'completed')
+            WHERE user_id = {row}.user_id AND course_id = {course};
+            DELETE FROM StatsUserCourse
+            WHERE user_id = {row}.user_id AND course_id = {course} AND lessons <= 0;
+            """
+
+        def lesson_recount(row):
+            return f"""
+            DELETE FROM StatsLesson WHERE lesson_id = {row}.lesson_id;
+            INSERT INTO StatsLesson (lesson_id, rating_sum, rating_count)
+            SELECT lesson_id, SUM(rating), COUNT(*)
+            FROM Feedbacks WHERE lesson_id = {row}.lesson_id
+            GROUP BY lesson_id;
+            """
+
+        def completions_recount(row):
+            return ensure_row('StatsCourse', 'course_id', f'{row}.course_id') + f"""
+            UPDATE StatsCourse
+            SET completions = (SELECT COUNT(*) FROM Certificates WHERE course_id = {row}.course_id)
+            WHERE course_id = {row}.course_id;
+            """
+
+        triggers = {
+            'trg_stats_users_insert': f"""AFTER INSERT ON Users BEGIN
+                {ensure_row('StatsDaily', 'day', 'substr(NEW.created_at, 1, 10)')}
+                UPDATE StatsDaily SET new_users = new_users + 1 WHERE day = substr(NEW.created_at, 1, 10);
+            END""",
+            'trg_stats_users_delete': """AFTER DELETE ON Users BEGIN
+                UPDATE StatsDaily SET new_users = new_users - 1 WHERE day = substr(OLD.created_at, 1, 10);
+            END""",
+            'trg_stats_payments_insert': f"""AFTER INSERT ON Payments
+                WHEN NEW.status = 'approved' BEGIN {payment_add} END""",
+            'trg_stats_payments_approve': f"""AFTER UPDATE OF status ON Payments
+                WHEN NEW.status = 'approved' AND OLD.status IS NOT 'approved' BEGIN {payment_add} END""",
+            'trg_stats_payments_unapprove': f"""AFTER UPDATE OF status ON Payments
+                WHEN OLD.status = 'approved' AND NEW.status IS NOT 'approved' BEGIN {payment_remove} END""",
+            'trg_stats_payments_delete': f"""AFTER DELETE ON Payments
+                WHEN OLD.status = 'approved' BEGIN {payment_remove} END""",
+            'trg_stats_progress_insert': f"AFTER INSERT ON UserProgress BEGIN {progress_add('NEW')} END",
+            'trg_stats_progress_update': f"""AFTER UPDATE OF user_id, lesson_id, status ON UserProgress
+                WHEN OLD.status IS NOT NEW.status OR OLD.user_id != NEW.user_id OR OLD.lesson_id != NEW.lesson_id
+                BEGIN {progress_remove('OLD')} {progress_add('NEW')} END""",
+            'trg_stats_progress_delete': f"AFTER DELETE ON UserProgress BEGIN {progress_remove('OLD')} END",
+            'trg_stats_feedbacks_insert': f"AFTER INSERT ON Feedbacks BEGIN {lesson_recount('NEW')} END",
+            'trg_stats_feedbacks_update': f"AFTER UPDATE OF rating ON Feedbacks BEGIN {lesson_recount('NEW')} END",
+            'trg_stats_feedbacks_delete': f"AFTER DELETE ON Feedbacks BEGIN {lesson_recount('OLD')} END",
+            'trg_stats_certificates_insert': f"AFTER INSERT ON Certificates BEGIN {completions_recount('NEW')} END",
+            'trg_stats_certificates_delete': f"AFTER DELETE ON Certificates BEGIN {completions_recount('OLD')} END",
+        }
+        for name, body in triggers.items():
+            self.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body};", commit=True)
+
+        # Mavjud bazada birinchi marta - agregatlarni to'ldiramiz
+        if first_time:
+            self.rebuild_stats()
+
+    def rebuild_stats(self):
+        """Barcha agregatlarni asosiy jadvallardan qaytadan hisoblash"""
+        statements = (
+            "DELETE FROM StatsDaily",
+            "DELETE FROM StatsCourse",
+            "DELETE FROM StatsLesson",
+            "DELETE FROM StatsUserCourse",
+
+            """INSERT INTO StatsDaily (day, new_users)
+               SELECT substr(created_at, 1, 10), COUNT(*) FROM Users GROUP BY 1""",
+
+            """INSERT INTO StatsDaily (day, approved_payments, approved_amount)
+               SELECT substr(COALESCE(updated_at, created_at), 1, 10), COUNT(*), SUM(amount)
+               FROM Payments WHERE status = 'approved' GROUP BY 1 HAVING 1
+               ON CONFLICT(day) DO UPDATE SET approved_payments = excluded.approved_payments,
+                                              approved_amount = excluded.approved_amount""",
+
+            """INSERT INTO StatsCourse (course_id, students, approved_payments, approved_amount)
+               SELECT course_id, COUNT(DISTINCT user_id), COUNT(*), SUM(amount)
+               FROM Payments WHERE status = 'approved' GROUP BY course_id""",
+
+            """INSERT INTO StatsCourse (course_id, completions)
+               SELECT course_id, COUNT(*) FROM Certificates GROUP BY course_id HAVING 1
+               ON CONFLICT(course_id) DO UPDATE SET completions = excluded.completions""",
+
+            """INSERT INTO StatsLesson (lesson_id, rating_sum, rating_count)
+               SELECT lesson_id, SUM(rating), COUNT(*) FROM Feedbacks GROUP BY lesson_id""",
+
+            """INSERT INTO StatsUserCourse (user_id, course_id, lessons, completed)
+               SELECT up.user_id, m.course_id, COUNT(*), SUM(up.status = 'completed')
+               FROM UserProgress up
+               JOIN Lessons l ON up.lesson_id = l.id
+               JOIN Modules m ON l.module_id = m.id
+               GROUP BY up.user_id, m.course_id""",
+        )
+        try:
+            # Migratsiya ichida chaqirilsa uning tranzaksiyasiga qo'shiladi
+            with self.transaction():
+                for sql in statements:
+                    self.execute(sql, commit=True)
+            print("✅ Statistika agregatlari qayta hisoblandi")
+        except Exception as e:
+            print(f"❌ Statistikani qayta hisoblashda xato: {e}")
+            if self.in_transaction:
+                raise
 
     # ============================================================
     #                    USER METODLARI
@@ -413,6 +765,7 @@ class UserDatabase(Database):
             parameters=(telegram_id, username, full_name, datetime.now(TASHKENT_TZ).isoformat()),
             commit=True
         )
+        self.invalidate_user_id_cache(telegram_id)
 
         # Agar referal kod bilan kelgan bo'lsa
         if referral_code:
@@ -422,13 +775,35 @@ class UserDatabase(Database):
         return True
 
     def get_user_id(self, telegram_id: int) -> Optional[int]:
-        """Telegram ID bo'yicha ichki ID olish"""
+        """Telegram ID bo'yicha ichki ID olish (keshlangan)"""
+        with self._user_id_cache_lock:
+            user_id = self._user_id_cache.get(telegram_id)
+            if user_id is not None:
+                self._user_id_cache.move_to_end(telegram_id)
+                return user_id
+
         result = self.execute(
             "SELECT id FROM Users WHERE telegram_id = ?",
             parameters=(telegram_id,),
             fetchone=True
         )
-        return result[0] if result else None
+        if not result:
+            # Topilmagan userni keshlamaymiz - u keyinroq qo'shilishi mumkin
+            return None
+
+        with self._user_id_cache_lock:
+            self._user_id_cache[telegram_id] = result[0]
+            if len(self._user_id_cache) > USER_ID_CACHE_SIZE:
+                self._user_id_cache.popitem(last=False)
+        return result[0]
+
+    def invalidate_user_id_cache(self, telegram_id: int = None):
+        """telegram_id -> user_id keshini tozalash (None - hammasini)"""
+        with self._user_id_cache_lock:
+            if telegram_id is None:
+                self._user_id_cache.clear()
+            else:
+                self._user_id_cache.pop(telegram_id, None)
 
     def get_user(self, telegram_id: int) -> Optional[Dict]:
         """Foydalanuvchi ma'lumotlarini olish (BALANS BILAN)"""
@@ -494,13 +869,32 @@ class UserDatabase(Database):
 
 
     def update_last_active(self, telegram_id: int):
-        """Oxirgi faollik vaqtini yangilash"""
+        """Oxirgi faollik vaqtini yangilash (user yozdi - demak unga xabar yetadi)"""
         self.execute(
-            "UPDATE Users SET last_active = ? WHERE telegram_id = ?",
+            "UPDATE Users SET last_active = ?, deliverable = TRUE WHERE telegram_id = ?",
             parameters=(datetime.now(TASHKENT_TZ).isoformat(), telegram_id),
             commit=True
         )
 
+    def update_last_active_many(self, activity: Dict[int, str]) -> int:
+        """
+        Ko'p userning oxirgi faolligini bitta tranzaksiyada yozish
+
+        Args:
+            activity: {telegram_id: ISO vaqt} (ActivityTracker buferi)
+
+        Xato bo'lsa istisno ko'tariladi (executemany tranzaksiya ichida
+        xatoni yutmaydi) - ActivityTracker buferni keyingi flush ga qoldiradi.
+        """
+        if not activity:
+            return 0
+        with self.transaction():
+            return self.executemany(
+                "UPDATE Users SET last_active = ?, deliverable = TRUE WHERE telegram_id = ?",
+                [(last_seen, telegram_id) for telegram_id, last_seen in activity.items()],
+                commit=True
+            )
+
     def add_score(self, telegram_id: int, score: int) -> bool:
         """Foydalanuvchiga ball qo'shish"""
         try:
@@ -512,6 +906,8 @@ class UserDatabase(Database):
             return True
         except Exception as e:
             print(f"❌ Ball qo'shishda xato: {e}")
+            if self.in_transaction:
+                raise  # Tashqi tranzaksiya (test natijasi, referal) bekor qilinadi
             return False
 
     def get_user_score(self, telegram_id: int) -> int:
@@ -523,26 +919,14 @@ class UserDatabase(Database):
         )
         return result[0] if result else 0
 
-    def get_all_users(self, limit: int = 100, offset: int = 0) -> List[Dict]:
-        """Barcha foydalanuvchilar ro'yxati"""
-        results = self.execute(
-            """SELECT id, telegram_id, username, full_name, total_score, is_active, created_at
-               FROM Users ORDER BY created_at DESC LIMIT ? OFFSET ?""",
-            parameters=(limit, offset),
-            fetchall=True
-        )
-        users = []
-        for row in results:
-            users.append({
-                'id': row[0],
-                'telegram_id': row[1],
-                'username': row[2],
-                'full_name': row[3],
-                'total_score': row[4],
-                'is_active': bool(row[5]),
-                'created_at': row[6]
-            })
-        return users
+    def get_all_users(self, limit: int = 100, after_id: int = None) -> List[Dict]:
+        """
+        Barcha foydalanuvchilar ro'yxati (yangilari birinchi)
+
+        Args:
+            after_id: Oldingi sahifaning oxirgi Users.id si (keyset, OFFSET siz)
+        """
+        return self.get_users_page('all', after_id=after_id, limit=limit)['users']
 
     def count_users(self) -> int:
         """Jami foydalanuvchilar soni"""
@@ -703,6 +1087,7 @@ class UserDatabase(Database):
                 parameters=(name, description, price, order_num),
                 commit=True
             )
+            self.bump_catalog_version()
 
             result = self.execute(
                 "SELECT id FROM Courses WHERE name = ? ORDER BY id DESC LIMIT 1",
@@ -717,43 +1102,24 @@ class UserDatabase(Database):
 
     def get_course(self, course_id: int) -> Optional[Dict]:
         """Kurs ma'lumotlarini olish"""
-        result = self.execute(
-            """SELECT id, name, description, price, order_num, is_active, created_at
-               FROM Courses WHERE id = ?""",
-            parameters=(course_id,),
-            fetchone=True
-        )
-        if result:
-            return {
-                'id': result[0],
-                'name': result[1],
-                'description': result[2],
-                'price': float(result[3]),
-                'order_num': result[4],
-                'is_active': bool(result[5]),
-                'created_at': result[6]
-            }
-        return None
+        course = self.catalog.courses.get(course_id)
+        return dict(course) if course else None
 
     def get_all_courses(self, active_only: bool = True) -> List[Dict]:
         """Barcha kurslar ro'yxati"""
-        if active_only:
-            sql = "SELECT id, name, description, price, order_num FROM Courses WHERE is_active = TRUE ORDER BY order_num"
-        else:
-            sql = "SELECT id, name, description, price, order_num, is_active FROM Courses ORDER BY order_num"
-
-        results = self.execute(sql, fetchall=True)
         courses = []
-        for row in results:
+        for c in sorted(self.catalog.courses.values(), key=lambda x: (x['order_num'] or 0, x['id'])):
+            if active_only and not c['is_active']:
+                continue
             course = {
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'price': float(row[3]),
-                'order_num': row[4]
+                'id': c['id'],
+                'name': c['name'],
+                'description': c['description'],
+                'price': c['price'],
+                'order_num': c['order_num']
             }
             if not active_only:
-                course['is_active'] = bool(row[5])
+                course['is_active'] = c['is_active']
             courses.append(course)
         return courses
 
@@ -777,6 +1143,7 @@ class UserDatabase(Database):
 
         sql = f"UPDATE Courses SET {', '.join(updates)} WHERE id = ?"
         self.execute(sql, parameters=tuple(params), commit=True)
+        self.bump_catalog_version()
         return True
 
     def delete_course(self, course_id: int) -> bool:
@@ -802,6 +1169,7 @@ class UserDatabase(Database):
                 parameters=(course_id, name, description, order_num),
                 commit=True
             )
+            self.bump_catalog_version()
 
             result = self.execute(
                 "SELECT id FROM Modules WHERE course_id = ? AND name = ? ORDER BY id DESC LIMIT 1",
@@ -816,46 +1184,29 @@ class UserDatabase(Database):
 
     def get_module(self, module_id: int) -> Optional[Dict]:
         """Modul ma'lumotlarini olish"""
-        result = self.execute(
-            """SELECT m.id, m.course_id, m.name, m.description, m.order_num, m.is_active, c.name
-               FROM Modules m
-               JOIN Courses c ON m.course_id = c.id
-               WHERE m.id = ?""",
-            parameters=(module_id,),
-            fetchone=True
-        )
-        if result:
-            return {
-                'id': result[0],
-                'course_id': result[1],
-                'name': result[2],
-                'description': result[3],
-                'order_num': result[4],
-                'is_active': bool(result[5]),
-                'course_name': result[6]
-            }
+        catalog = self.catalog
+        module = catalog.modules.get(module_id)
+        course = catalog.courses.get(module['course_id']) if module else None
+        if course:
+            return dict(module, course_name=course['name'])
         return None
 
     def get_course_modules(self, course_id: int, active_only: bool = True) -> List[Dict]:
         """Kurs modullari ro'yxati"""
-        if active_only:
-            sql = """SELECT id, name, description, order_num 
-                     FROM Modules WHERE course_id = ? AND is_active = TRUE ORDER BY order_num"""
-        else:
-            sql = """SELECT id, name, description, order_num, is_active 
-                     FROM Modules WHERE course_id = ? ORDER BY order_num"""
-
-        results = self.execute(sql, parameters=(course_id,), fetchall=True)
+        catalog = self.catalog
         modules = []
-        for row in results:
+        for module_id in catalog.course_modules.get(course_id, ()):
+            m = catalog.modules[module_id]
+            if active_only and not m['is_active']:
+                continue
             module = {
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'order_num': row[3]
+                'id': m['id'],
+                'name': m['name'],
+                'description': m['description'],
+                'order_num': m['order_num']
             }
             if not active_only:
-                module['is_active'] = bool(row[4])
+                module['is_active'] = m['is_active']
             modules.append(module)
         return modules
 
@@ -876,6 +1227,7 @@ class UserDatabase(Database):
         params.append(module_id)
         sql = f"UPDATE Modules SET {', '.join(updates)} WHERE id = ?"
         self.execute(sql, parameters=tuple(params), commit=True)
+        self.bump_catalog_version()
         return True
 
     def delete_module(self, module_id: int) -> bool:
@@ -910,6 +1262,7 @@ class UserDatabase(Database):
                 parameters=(module_id, name, description, video_file_id, video_duration, order_num, is_free),
                 commit=True
             )
+            self.bump_catalog_version()
 
             result = self.execute(
                 "SELECT id FROM Lessons WHERE module_id = ? ORDER BY id DESC LIMIT 1",
@@ -924,81 +1277,47 @@ class UserDatabase(Database):
 
     def get_lesson(self, lesson_id: int) -> Optional[Dict]:
         """Dars ma'lumotlarini olish"""
-        result = self.execute(
-            """SELECT l.id, l.module_id, l.name, l.description, l.video_file_id, 
-                      l.video_duration, l.order_num, l.has_test, l.is_free, l.is_active,
-                      m.name, m.course_id
-               FROM Lessons l
-               JOIN Modules m ON l.module_id = m.id
-               WHERE l.id = ?""",
-            parameters=(lesson_id,),
-            fetchone=True
-        )
-        if result:
-            return {
-                'id': result[0],
-                'module_id': result[1],
-                'name': result[2],
-                'description': result[3],
-                'video_file_id': result[4],
-                'video_duration': result[5],
-                'order_num': result[6],
-                'has_test': bool(result[7]),
-                'is_free': bool(result[8]),
-                'is_active': bool(result[9]),
-                'module_name': result[10],
-                'course_id': result[11]
-            }
-        return None
+        lesson = self.catalog.lessons.get(lesson_id)
+        return dict(lesson) if lesson else None
 
     def get_module_lessons(self, module_id: int, active_only: bool = True) -> List[Dict]:
         """Modul darslari ro'yxati"""
-        if active_only:
-            sql = """SELECT id, name, description, video_file_id, has_test, is_free, order_num
-                     FROM Lessons WHERE module_id = ? AND is_active = TRUE ORDER BY order_num"""
-        else:
-            sql = """SELECT id, name, description, video_file_id, has_test, is_free, order_num, is_active
-                     FROM Lessons WHERE module_id = ? ORDER BY order_num"""
-
-        results = self.execute(sql, parameters=(module_id,), fetchall=True)
+        catalog = self.catalog
         lessons = []
-        for row in results:
+        for lesson_id in catalog.module_lessons.get(module_id, ()):
+            l = catalog.lessons[lesson_id]
+            if active_only and not l['is_active']:
+                continue
             lesson = {
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'video_file_id': row[3],
-                'has_test': bool(row[4]),
-                'is_free': bool(row[5]),
-                'order_num': row[6]
+                'id': l['id'],
+                'name': l['name'],
+                'description': l['description'],
+                'video_file_id': l['video_file_id'],
+                'has_test': l['has_test'],
+                'is_free': l['is_free'],
+                'order_num': l['order_num']
             }
             if not active_only:
-                lesson['is_active'] = bool(row[7])
+                lesson['is_active'] = l['is_active']
             lessons.append(lesson)
         return lessons
 
     def get_course_lessons(self, course_id: int) -> List[Dict]:
         """Kursdagi barcha darslar"""
-        results = self.execute(
-            """SELECT l.id, l.name, l.order_num, l.has_test, l.is_free, m.id, m.name, m.order_num
-               FROM Lessons l
-               JOIN Modules m ON l.module_id = m.id
-               WHERE m.course_id = ? AND l.is_active = TRUE AND m.is_active = TRUE
-               ORDER BY m.order_num, l.order_num""",
-            parameters=(course_id,),
-            fetchall=True
-        )
+        catalog = self.catalog
         lessons = []
-        for row in results:
+        for lesson_id in catalog.course_lessons.get(course_id, ()):
+            l = catalog.lessons[lesson_id]
+            m = catalog.modules[l['module_id']]
             lessons.append({
-                'id': row[0],
-                'name': row[1],
-                'order_num': row[2],
-                'has_test': bool(row[3]),
-                'is_free': bool(row[4]),
-                'module_id': row[5],
-                'module_name': row[6],
-                'module_order': row[7]
+                'id': l['id'],
+                'name': l['name'],
+                'order_num': l['order_num'],
+                'has_test': l['has_test'],
+                'is_free': l['is_free'],
+                'module_id': m['id'],
+                'module_name': m['name'],
+                'module_order': m['order_num']
             })
         return lessons
 
@@ -1020,6 +1339,7 @@ class UserDatabase(Database):
         params.append(lesson_id)
         sql = f"UPDATE Lessons SET {', '.join(updates)} WHERE id = ?"
         self.execute(sql, parameters=tuple(params), commit=True)
+        self.bump_catalog_version()
         return True
 
     def delete_lesson(self, lesson_id: int) -> bool:
@@ -1028,14 +1348,33 @@ class UserDatabase(Database):
 
     def count_course_lessons(self, course_id: int) -> int:
         """Kursdagi darslar soni"""
-        result = self.execute(
-            """SELECT COUNT(*) FROM Lessons l
-               JOIN Modules m ON l.module_id = m.id
-               WHERE m.course_id = ? AND l.is_active = TRUE AND m.is_active = TRUE""",
-            parameters=(course_id,),
-            fetchone=True
-        )
-        return result[0] if result else 0
+        return len(self.catalog.course_lessons.get(course_id, ()))
+
+    def _lesson_brief(self, lesson_id: Optional[int]) -> Optional[Dict]:
+        if lesson_id is None:
+            return None
+        lesson = self.catalog.lessons[lesson_id]
+        return {'id': lesson['id'], 'name': lesson['name']}
+
+    def get_next_lesson(self, lesson_id: int) -> Optional[Dict]:
+        """Kursdagi keyingi dars ({'id', 'name'} yoki None)"""
+        return self._lesson_brief(self.catalog.next_lesson_id(lesson_id))
+
+    def get_previous_lesson(self, lesson_id: int) -> Optional[Dict]:
+        """Kursdagi oldingi dars ({'id', 'name'} yoki None)"""
+        return self._lesson_brief(self.catalog.previous_lesson_id(lesson_id))
+
+    def get_first_lesson(self, course_id: int) -> Optional[Dict]:
+        """Kursning birinchi darsi ({'id', 'name'} yoki None)"""
+        return self._lesson_brief(self.catalog.first_lesson_id(course_id))
+
+    def get_lesson_position(self, lesson_id: int) -> Optional[Dict]:
+        """Darsning kursdagi o'rni: {'course_id', 'position', 'total'}"""
+        position = self.catalog.lesson_position(lesson_id)
+        if position is None:
+            return None
+        course_id, index, total = position
+        return {'course_id': course_id, 'position': index, 'total': total}
 
     def add_test(self, lesson_id: int, name: str = None, passing_score: int = 60) -> Optional[int]:
         """Darsga test qo'shish (yoki mavjudini qayta faollashtirish)"""
@@ -1083,6 +1422,7 @@ class UserDatabase(Database):
                 parameters=(lesson_id,),
                 commit=True
             )
+            self.bump_catalog_version()
 
             return test_id
 
@@ -1092,42 +1432,45 @@ class UserDatabase(Database):
 
     def get_test(self, test_id: int) -> Optional[Dict]:
         """Test ma'lumotlarini olish"""
-        result = self.execute(
-            """SELECT t.id, t.lesson_id, t.name, t.passing_score, t.time_limit, t.is_active, l.name
-               FROM Tests t
-               JOIN Lessons l ON t.lesson_id = l.id
-               WHERE t.id = ?""",
-            parameters=(test_id,),
-            fetchone=True
-        )
-        if result:
-            return {
-                'id': result[0],
-                'lesson_id': result[1],
-                'name': result[2],
-                'passing_score': result[3],
-                'time_limit': result[4],
-                'is_active': bool(result[5]),
-                'lesson_name': result[6]
-            }
+        catalog = self.catalog
+        test = catalog.tests.get(test_id)
+        lesson = catalog.lessons.get(test['lesson_id']) if test else None
+        if lesson:
+            return dict(test, lesson_name=lesson['name'])
         return None
 
     def get_test_by_lesson(self, lesson_id: int) -> Optional[Dict]:
         """Dars bo'yicha testni olish"""
-        result = self.execute(
-            "SELECT id, name, passing_score, time_limit FROM Tests WHERE lesson_id = ? AND is_active = TRUE",
-            parameters=(lesson_id,),
-            fetchone=True
-        )
-        if result:
+        test = self.catalog.lesson_tests.get(lesson_id)
+        if test:
             return {
-                'id': result[0],
-                'name': result[1],
-                'passing_score': result[2],
-                'time_limit': result[3]
+                'id': test['id'],
+                'name': test['name'],
+                'passing_score': test['passing_score'],
+                'time_limit': test['time_limit']
             }
         return None
 
+    def update_test(self, test_id: int, **kwargs) -> bool:
+        """Test sozlamalarini yangilash"""
+        allowed_fields = ['name', 'passing_score', 'time_limit']
+        updates = []
+        params = []
+
+        for key, value in kwargs.items():
+            if key in allowed_fields:
+                updates.append(f"{key} = ?")
+                params.append(value)
+
+        if not updates:
+            return False
+
+        params.append(test_id)
+        sql = f"UPDATE Tests SET {', '.join(updates)} WHERE id = ?"
+        self.execute(sql, parameters=tuple(params), commit=True)
+        self.bump_catalog_version()
+        return True
+
     def delete_test(self, test_id: int) -> bool:
         """Testni o'chirish"""
         test = self.get_test(test_id)
@@ -1144,6 +1487,7 @@ class UserDatabase(Database):
             parameters=(test['lesson_id'],),
             commit=True
         )
+        self.bump_catalog_version()
         return True
 
     # ============================================================
@@ -1266,36 +1610,175 @@ class UserDatabase(Database):
         if not user_id:
             return False
 
-        lessons = self.get_course_lessons(course_id)
-        if not lessons:
+        if not self.catalog.course_lessons.get(course_id):
             return False
 
-        # Birinchi darsni ochiq qilish
-        first_lesson = lessons[0] if lessons else None
+        self.init_users_progress([user_id], course_id)
+        return True
 
-        for i, lesson in enumerate(lessons):
-            status = 'unlocked' if i == 0 else 'locked'
-            self.execute(
-                """INSERT OR IGNORE INTO UserProgress (user_id, lesson_id, status) 
-                   VALUES (?, ?, ?)""",
-                parameters=(user_id, lesson['id'], status),
-                commit=True
+    def init_users_progress(self, user_ids: List[int], course_id: int) -> int:
+        """
+        Bir nechta foydalanuvchi progressini bitta tranzaksiyada boshlash
+
+        Args:
+            user_ids: Ichki (Users.id) ID lar
+            course_id: Kurs ID
+
+        Returns:
+            Yangi qo'shilgan progress yozuvlari soni
+        """
+        lesson_ids = self.catalog.course_lessons.get(course_id)
+        if not lesson_ids or not user_ids:
+            return 0
+
+        # Birinchi dars ochiq, qolganlari yopiq. Mavjud yozuvlarga tegilmaydi.
+        rows = (
+            (user_id, lesson_id, 'unlocked' if i == 0 else 'locked')
+            for user_id in user_ids
+            for i, lesson_id in enumerate(lesson_ids)
+        )
+        count = self.executemany(
+            """INSERT OR IGNORE INTO UserProgress (user_id, lesson_id, status) 
+               VALUES (?, ?, ?)""",
+            rows,
+            commit=True
+        )
+        for user_id in user_ids:
+            self._update_progress_cache(
+                user_id,
+                {lesson_id: 'unlocked' if i == 0 else 'locked' for i, lesson_id in enumerate(lesson_ids)},
+                overwrite=False
             )
+        return count
+
+    # ============================================================
+    #                    PROGRESS KESHI
+    # ============================================================
+
+    def get_progress_map(self, user_id: int) -> Dict[int, str]:
+        """
+        Foydalanuvchining barcha dars statuslari: {lesson_id: status}
+
+        Args:
+            user_id: Ichki (Users.id) ID
+
+        Natija keshdan qaytadi - uni o'zgartirmang.
+        """
+        with self._progress_cache_lock:
+            progress = self._progress_cache.get(user_id)
+            if progress is not None:
+                self._progress_cache.move_to_end(user_id)
+                return progress
+            token = self._progress_loading[user_id] = object()
+
+        rows = self.execute(
+            "SELECT lesson_id, status FROM UserProgress WHERE user_id = ?",
+            parameters=(user_id,),
+            fetchall=True
+        )
+        progress = dict(rows or [])
+
+        with self._progress_cache_lock:
+            # O'qish paytida shu user progressi o'zgargan bo'lsa - keshlamaymiz
+            if self._progress_loading.get(user_id) is token:
+                del self._progress_loading[user_id]
+                self._progress_cache[user_id] = progress
+                if len(self._progress_cache) > PROGRESS_CACHE_SIZE:
+                    self._progress_cache.popitem(last=False)
+        return progress
+
+    def get_progress_status(self, user_id: int, lesson_id: int) -> Optional[str]:
+        """Bitta dars statusi (ichki user ID bo'yicha), yozuv bo'lmasa None"""
+        return self.get_progress_map(user_id).get(lesson_id)
+
+    def get_sequential_lesson_status(self, user_id: int, lesson_id: int) -> str:
+        """
+        Ketma-ket darslar rejimidagi status (ichki user ID bo'yicha):
+        tugatilgan - completed, oldingisi tugatilgan (yoki birinchi) - unlocked,
+        qolganlari - locked
+        """
+        catalog = self.catalog
+        position = catalog.sequence_positions.get(lesson_id)
+        if position is None:
+            return 'locked'
+
+        progress = self.get_progress_map(user_id)
+        if progress.get(lesson_id) == 'completed':
+            return 'completed'
+        if position == 0 or progress.get(catalog.sequence[position - 1]) == 'completed':
+            return 'unlocked'
+        return 'locked'
+
+    def get_sequential_lessons_with_status(self, user_id: int) -> List[Dict]:
+        """Barcha faol darslar ketma-ket, statuslari bilan (ichki user ID bo'yicha)"""
+        catalog = self.catalog
+        progress = self.get_progress_map(user_id)
+
+        result = []
+        prev_completed = True  # Birinchi dars ochiq
+        for order, lesson_id in enumerate(catalog.sequence, 1):
+            if progress.get(lesson_id) == 'completed':
+                status = 'completed'
+                prev_completed = True
+            elif prev_completed:
+                status = 'unlocked'
+                prev_completed = False
+            else:
+                status = 'locked'
+
+            result.append({
+                'id': lesson_id,
+                'order_num': order,
+                'name': catalog.lessons[lesson_id]['name'],
+                'status': status
+            })
+        return result
 
+    def mark_lesson_completed(self, user_id: int, lesson_id: int) -> bool:
+        """Darsni tugatilgan deb belgilash (ichki user ID, yozuv bo'lmasa yaratiladi)"""
+        self.execute(
+            """INSERT INTO UserProgress (user_id, lesson_id, status, completed_at)
+               VALUES (?, ?, 'completed', datetime('now'))
+               ON CONFLICT(user_id, lesson_id) DO UPDATE
+               SET status = 'completed', completed_at = excluded.completed_at
+               WHERE status != 'completed'""",
+            parameters=(user_id, lesson_id),
+            commit=True
+        )
+        self._update_progress_cache(user_id, {lesson_id: 'completed'})
         return True
 
+    def _update_progress_cache(self, user_id: int, statuses: Dict[int, str], overwrite: bool = True):
+        """Keshdagi foydalanuvchi progressini yangilash (keshda bo'lsa)"""
+        with self._progress_cache_lock:
+            self._progress_loading.pop(user_id, None)
+            progress = self._progress_cache.get(user_id)
+            if progress is None:
+                return
+            # Kesh o'quvchilari eski dict bilan ishlayotgan bo'lishi mumkin - nusxa
+            progress = dict(progress)
+            for lesson_id, status in statuses.items():
+                if overwrite or lesson_id not in progress:
+                    progress[lesson_id] = status
+            self._progress_cache[user_id] = progress
+
+    def invalidate_progress_cache(self, user_id: int = None):
+        """Progress keshini tozalash (None - hammasini)"""
+        with self._progress_cache_lock:
+            if user_id is None:
+                self._progress_cache.clear()
+                self._progress_loading.clear()
+            else:
+                self._progress_cache.pop(user_id, None)
+                self._progress_loading.pop(user_id, None)
+
     def get_lesson_status(self, telegram_id: int, lesson_id: int) -> str:
         """Dars statusini olish: locked, unlocked, completed"""
         user_id = self.get_user_id(telegram_id)
         if not user_id:
             return 'locked'
 
-        result = self.execute(
-            "SELECT status FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
-            parameters=(user_id, lesson_id),
-            fetchone=True
-        )
-        return result[0] if result else 'locked'
+        return self.get_progress_status(user_id, lesson_id) or 'locked'
 
     def unlock_lesson(self, telegram_id: int, lesson_id: int) -> bool:
         """Darsni ochish"""
@@ -1309,6 +1792,7 @@ class UserDatabase(Database):
             parameters=(user_id, lesson_id, datetime.now(TASHKENT_TZ).isoformat()),
             commit=True
         )
+        self._update_progress_cache(user_id, {lesson_id: 'unlocked'})
         return True
 
     def complete_lesson(self, telegram_id: int, lesson_id: int) -> bool:
@@ -1324,25 +1808,14 @@ class UserDatabase(Database):
             parameters=(datetime.now(TASHKENT_TZ).isoformat(), user_id, lesson_id),
             commit=True
         )
+        # UPDATE faqat mavjud yozuvga ta'sir qiladi - keshda ham shunday
+        if self.get_progress_status(user_id, lesson_id) is not None:
+            self._update_progress_cache(user_id, {lesson_id: 'completed'})
 
         # Keyingi darsni ochish
-        lesson = self.get_lesson(lesson_id)
-        if lesson:
-            next_lesson = self.execute(
-                """SELECT l.id FROM Lessons l
-                   JOIN Modules m ON l.module_id = m.id
-                   WHERE m.course_id = ? AND l.is_active = TRUE AND m.is_active = TRUE
-                   AND (m.order_num > (SELECT order_num FROM Modules WHERE id = ?)
-                        OR (m.order_num = (SELECT order_num FROM Modules WHERE id = ?) 
-                            AND l.order_num > ?))
-                   ORDER BY m.order_num, l.order_num LIMIT 1""",
-                parameters=(lesson['course_id'], lesson['module_id'],
-                            lesson['module_id'], lesson['order_num']),
-                fetchone=True
-            )
-
-            if next_lesson:
-                self.unlock_lesson(telegram_id, next_lesson[0])
+        next_lesson_id = self.catalog.next_lesson_id(lesson_id)
+        if next_lesson_id:
+            self.unlock_lesson(telegram_id, next_lesson_id)
 
         return True
 
@@ -1378,16 +1851,13 @@ class UserDatabase(Database):
 
         lessons = self.get_course_lessons(course_id)
 
+        # Barcha statuslar bitta so'rovda yoki progress keshidan
+        statuses = {}
+        if user_id and lessons:
+            statuses = self.get_progress_map(user_id)
+
         for lesson in lessons:
-            if user_id:
-                result = self.execute(
-                    "SELECT status FROM UserProgress WHERE user_id = ? AND lesson_id = ?",
-                    parameters=(user_id, lesson['id']),
-                    fetchone=True
-                )
-                lesson['status'] = result[0] if result else 'locked'
-            else:
-                lesson['status'] = 'locked'
+            lesson['status'] = statuses.get(lesson['id'], 'locked')
 
             # Bepul darslar har doim ochiq
             if lesson['is_free']:
@@ -1420,26 +1890,22 @@ class UserDatabase(Database):
         passed = score >= test['passing_score']
 
         try:
-            self.execute(
-                """INSERT INTO TestResults (user_id, test_id, score, total_questions, 
-                   correct_answers, passed, answers_json)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                parameters=(user_id, test_id, score, total_questions, correct_answers,
-                            passed, json.dumps(answers) if answers else None),
-                commit=True
-            )
+            # Natija va ball bitta tranzaksiyada (bitta commit)
+            with self.transaction():
+                self.execute(
+                    """INSERT INTO TestResults (user_id, test_id, score, total_questions, 
+                       correct_answers, passed, answers_json)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    parameters=(user_id, test_id, score, total_questions, correct_answers,
+                                passed, json.dumps(answers) if answers else None),
+                    commit=True
+                )
+                result = self.execute("SELECT last_insert_rowid()", fetchone=True)
 
-            # Ball qo'shish
-            if passed:
-                self.add_score(telegram_id, 10)  # Test uchun 10 ball
-                if score == 100:
-                    self.add_score(telegram_id, 5)  # Bonus 100% uchun
+                # Ball qo'shish: test uchun 10 ball, 100% uchun +5 bonus
+                if passed:
+                    self.add_score(telegram_id, 15 if score == 100 else 10)
 
-            result = self.execute(
-                "SELECT id FROM TestResults WHERE user_id = ? ORDER BY id DESC LIMIT 1",
-                parameters=(user_id,),
-                fetchone=True
-            )
             return result[0] if result else None
 
         except Exception as e:
@@ -1704,24 +2170,38 @@ class UserDatabase(Database):
             Faqat statusni o'zgartiradi va darsni ochadi.
             Referalga TEGMAYDI (buni admin_payments.py qiladi).
             """
-            payment = self.get_payment(payment_id)
-            if not payment or payment['status'] != 'pending':
-                return False
-
             admin_id = self.get_user_id(admin_telegram_id)
+            payment = None
 
-            # 1. To'lovni tasdiqlash
-            self.execute(
-                """UPDATE Payments SET status = 'approved', admin_id = ?, updated_at = ?
-                   WHERE id = ?""",
-                parameters=(admin_id, datetime.now(TASHKENT_TZ).isoformat(), payment_id),
-                commit=True
-            )
-
-            # 2. Kursga dostup berish
-            self.init_user_progress(payment['telegram_id'], payment['course_id'])
+            try:
+                # Status tekshiruvi, tasdiqlash va dostup - bitta tranzaksiyada.
+                # Ikki admin bir vaqtda bossa, ikkinchisi 'approved' ni ko'radi.
+                with self.transaction():
+                    payment = self.get_payment(payment_id)
+                    if not payment or payment['status'] != 'pending':
+                        return False
+
+                    # 1. To'lovni tasdiqlash
+                    self.execute(
+                        """UPDATE Payments SET status = 'approved', admin_id = ?, updated_at = ?
+                           WHERE id = ?""",
+                        parameters=(admin_id, datetime.now(TASHKENT_TZ).isoformat(), payment_id),
+                        commit=True
+                    )
+
+                    # 2. Kursga dostup berish
+                    self.init_user_progress(payment['telegram_id'], payment['course_id'])
+
+                self.invalidate_access_cache(payment['user_id'])
+                return True
 
-            return True
+            except Exception as e:
+                # Bekor qilingan progress keshda qolmasin
+                user_id = self.get_user_id(payment['telegram_id']) if payment else None
+                if user_id:
+                    self.invalidate_progress_cache(user_id)
+                print(f"❌ To'lovni tasdiqlashda xato: {e}")
+                return False
 
     def reject_payment(self, payment_id: int, admin_telegram_id: int, note: str = None) -> bool:
         """To'lovni rad etish"""
@@ -1775,6 +2255,8 @@ class UserDatabase(Database):
                 commit=True
             )
 
+            self.invalidate_access_cache(user_id)
+
             # Progress boshlash
             self.init_user_progress(telegram_id, course_id)
 
@@ -1794,6 +2276,7 @@ class UserDatabase(Database):
             parameters=(user_id, course_id),
             commit=True
         )
+        self.invalidate_access_cache(user_id)
         return True
 
     def has_course_access(self, telegram_id: int, course_id: int) -> bool:
@@ -1801,26 +2284,106 @@ class UserDatabase(Database):
         user_id = self.get_user_id(telegram_id)
         if not user_id:
             return False
+        return self.has_access(user_id, course_id)
 
-        # To'lov orqali
-        result = self.execute(
-            """SELECT 1 FROM Payments 
-               WHERE user_id = ? AND course_id = ? AND status = 'approved'""",
-            parameters=(user_id, course_id),
-            fetchone=True
-        )
-        if result:
-            return True
+    # ============================================================
+    #                    DOSTUP (ENTITLEMENT) KESHI
+    # ============================================================
 
-        # Manual access orqali
-        result = self.execute(
-            """SELECT 1 FROM ManualAccess 
-               WHERE user_id = ? AND course_id = ? AND is_active = TRUE
-               AND (expires_at IS NULL OR expires_at > ?)""",
-            parameters=(user_id, course_id, datetime.now(TASHKENT_TZ).isoformat()),
-            fetchone=True
+    @staticmethod
+    def _parse_expires_at(value) -> float:
+        """
+        ManualAccess.expires_at -> epoch soniya
+
+        Bazada bir nechta format bor: ISO (+05:00 bilan), grant_access dagi
+        naive datetime va mass_add_time dagi datetime() natijasi. Naive
+        qiymatlar server vaqti deb olinadi (check_access dagi kabi).
+        O'qib bo'lmasa 0 - muddati o'tgan.
+        """
+        try:
+            return datetime.fromisoformat(str(value)).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+    def get_entitlements(self, user_id: int) -> Dict[int, Optional[float]]:
+        """
+        Foydalanuvchining dostuplari: {course_id: tugash vaqti (epoch) yoki None - cheksiz}
+
+        Tasdiqlangan to'lov - cheksiz, faol ManualAccess - expires_at gacha.
+        Bitta so'rov bilan yuklanadi va keshlanadi; muddat tekshiruvi har
+        safar xotirada qilinadi, shuning uchun muddati o'tgan dostup keshni
+        tozalamasdan yopiladi. Natija keshdan qaytadi - uni o'zgartirmang.
+
+        Args:
+            user_id: Ichki (Users.id) ID
+        """
+        now = time.monotonic()
+        with self._access_cache_lock:
+            cached = self._access_cache.get(user_id)
+            if cached is not None and now - cached[0] < ACCESS_CACHE_TTL:
+                self._access_cache.move_to_end(user_id)
+                return cached[1]
+            token = self._access_loading[user_id] = object()
+
+        rows = self.execute(
+            """SELECT course_id, NULL, 1 FROM Payments
+               WHERE user_id = ? AND status = 'approved'
+               UNION ALL
+               SELECT course_id, expires_at, 0 FROM ManualAccess
+               WHERE user_id = ? AND is_active = TRUE""",
+            parameters=(user_id, user_id),
+            fetchall=True
         )
-        return result is not None
+        if rows is None:
+            # O'qish xatosi: bo'sh dostup keshlanmaydi, keyingi so'rov qayta urinadi
+            with self._access_cache_lock:
+                if self._access_loading.get(user_id) is token:
+                    del self._access_loading[user_id]
+            return {}
+
+        entitlements = {}
+        for course_id, expires_at, paid in rows:
+            expires = None if paid or expires_at is None else self._parse_expires_at(expires_at)
+            if course_id in entitlements:
+                current = entitlements[course_id]
+                # Eng uzoq muddat qoladi (None - cheksiz)
+                expires = None if current is None or expires is None else max(current, expires)
+            entitlements[course_id] = expires
+
+        with self._access_cache_lock:
+            # O'qish paytida dostup o'zgargan bo'lsa - keshlamaymiz
+            if self._access_loading.get(user_id) is token:
+                del self._access_loading[user_id]
+                self._access_cache[user_id] = (now, entitlements)
+                if len(self._access_cache) > ACCESS_CACHE_SIZE:
+                    self._access_cache.popitem(last=False)
+        return entitlements
+
+    def has_access(self, user_id: int, course_id: int) -> bool:
+        """Kursga dostup bormi (ichki user ID bo'yicha, keshdan)"""
+        entitlements = self.get_entitlements(user_id)
+        if course_id not in entitlements:
+            return False
+        expires = entitlements[course_id]
+        return expires is None or expires > time.time()
+
+    def has_any_access(self, user_id: int) -> bool:
+        """Birorta kursga dostup bormi (ichki user ID bo'yicha, keshdan)"""
+        now = time.time()
+        return any(
+            expires is None or expires > now
+            for expires in self.get_entitlements(user_id).values()
+        )
+
+    def invalidate_access_cache(self, user_id: int = None):
+        """Dostup keshini tozalash (None - hammasini)"""
+        with self._access_cache_lock:
+            if user_id is None:
+                self._access_cache.clear()
+                self._access_loading.clear()
+            else:
+                self._access_cache.pop(user_id, None)
+                self._access_loading.pop(user_id, None)
 
     # ============================================================
     #                    SERTIFIKAT METODLARI
@@ -1925,14 +2488,50 @@ class UserDatabase(Database):
     #                    SOZLAMALAR METODLARI
     # ============================================================
 
+    def load_settings(self) -> Dict[str, str]:
+        """Barcha sozlamalarni bitta so'rov bilan keshga yuklash (bot ishga tushganda)"""
+        with self._settings_lock:
+            rows = self.execute("SELECT key, value FROM Settings", fetchall=True)
+            if rows is None:
+                # O'qish xatosi: bo'sh natija keshlanmaydi, keyingi o'qish qayta urinadi
+                return self._settings or {}
+            settings = dict(rows)
+            self._settings = settings
+        return settings
+
+    def invalidate_settings_cache(self):
+        """Sozlamalar keshini tozalash - keyingi o'qishda qayta yuklanadi"""
+        with self._settings_lock:
+            self._settings = None
+
     def get_setting(self, key: str, default: str = None) -> Optional[str]:
-        """Sozlama qiymatini olish"""
-        result = self.execute(
-            "SELECT value FROM Settings WHERE key = ?",
-            parameters=(key,),
-            fetchone=True
-        )
-        return result[0] if result else default
+        """Sozlama qiymatini olish (keshdan, bazaga murojaat qilinmaydi)"""
+        settings = self._settings
+        if settings is None:
+            settings = self.load_settings()
+        value = settings.get(key)
+        return value if value is not None else default
+
+    def get_setting_int(self, key: str, default: int = 0) -> int:
+        """Butun son sozlama (yo'q yoki noto'g'ri bo'lsa default)"""
+        try:
+            return int(self.get_setting(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_setting_float(self, key: str, default: float = 0.0) -> float:
+        """Kasr son sozlama (yo'q yoki noto'g'ri bo'lsa default)"""
+        try:
+            return float(self.get_setting(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_setting_bool(self, key: str, default: bool = False) -> bool:
+        """'true'/'false' sozlama (yo'q bo'lsa default)"""
+        value = self.get_setting(key)
+        if value is None:
+            return default
+        return value.strip().lower() == 'true'
 
     def set_setting(self, key: str, value: str) -> bool:
         """Sozlamani o'zgartirish"""
@@ -1947,6 +2546,8 @@ class UserDatabase(Database):
         except Exception as e:
             print(f"❌ Sozlama o'zgartirishda xato: {e}")
             return False
+        finally:
+            self.invalidate_settings_cache()
 
     def get_all_settings(self) -> Dict:
         """Barcha sozlamalar"""
@@ -1966,113 +2567,181 @@ class UserDatabase(Database):
     #                    STATISTIKA METODLARI
     # ============================================================
 
-    def get_dashboard_stats(self) -> Dict:
-        """Admin dashboard statistikasi"""
+    def get_stats_snapshot(self, force: bool = False) -> Dict:
+        """
+        Dashboard va hisobotlar uchun umumiy statistika (STATS_CACHE_TTL soniya keshlanadi)
+
+        Ikki so'rov: Users sonlari va qolgan jadvallar (Payments, TestResults,
+        Feedbacks, Certificates). Sanalar DATE() siz, indeksdagi diapazon
+        (COUNT(*) ... WHERE created_at >= ?) bilan sanaladi.
+        Kurs va darslar soni CourseCatalog dan olinadi.
+        """
+        now_ts = time.monotonic()
+        with self._stats_lock:
+            if not force and self._stats_cache and self._stats_cache[0] > now_ts:
+                return self._stats_cache[1]
+
         now = datetime.now(TASHKENT_TZ)
+        # Dashboard: kalendar bo'yicha (bugun / shu hafta / shu oy boshidan)
         today_start = now.replace(hour=0, minute=0, second=0).isoformat()
         week_start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0).isoformat()
         month_start = now.replace(day=1, hour=0, minute=0, second=0).isoformat()
-
-        stats = {}
-
-        # Foydalanuvchilar
-        stats['total_users'] = self.execute(
-            "SELECT COUNT(*) FROM Users", fetchone=True
-        )[0]
-
-        stats['new_users_today'] = self.execute(
-            "SELECT COUNT(*) FROM Users WHERE created_at >= ?",
-            parameters=(today_start,), fetchone=True
-        )[0]
-
-        stats['new_users_week'] = self.execute(
-            "SELECT COUNT(*) FROM Users WHERE created_at >= ?",
-            parameters=(week_start,), fetchone=True
-        )[0]
-
-        stats['new_users_month'] = self.execute(
-            "SELECT COUNT(*) FROM Users WHERE created_at >= ?",
-            parameters=(month_start,), fetchone=True
-        )[0]
-
-        # To'lovlar
-        stats['pending_payments'] = self.count_pending_payments()
-
-        stats['approved_payments_month'] = self.execute(
-            """SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM Payments 
-               WHERE status = 'approved' AND updated_at >= ?""",
-            parameters=(month_start,), fetchone=True
-        )
-
-        # Kurslar
-        stats['total_courses'] = self.execute(
-            "SELECT COUNT(*) FROM Courses WHERE is_active = TRUE", fetchone=True
-        )[0]
-
-        stats['total_lessons'] = self.execute(
-            """SELECT COUNT(*) FROM Lessons l
-               JOIN Modules m ON l.module_id = m.id
-               WHERE l.is_active = TRUE AND m.is_active = TRUE""",
+        # Hisobot: sana bo'yicha (bugun / oxirgi 7 va 30 kun)
+        today = now.strftime('%Y-%m-%d')
+        week_ago = (now - timedelta(days=7)).strftime('%Y-%m-%d')
+        month_ago = (now - timedelta(days=30)).strftime('%Y-%m-%d')
+
+        # Har bir son - alohida diapazon so'rovi: SUM(created_at >= ?) butun jadvalni
+        # o'qiydi, COUNT(*) ... WHERE created_at >= ? esa indeksning bir qismini
+        users = self.execute(
+            """SELECT (SELECT COUNT(*) FROM Users),
+                      (SELECT COUNT(*) FROM Users WHERE created_at >= :today_start),
+                      (SELECT COUNT(*) FROM Users WHERE created_at >= :week_start),
+                      (SELECT COUNT(*) FROM Users WHERE created_at >= :month_start),
+                      (SELECT COUNT(*) FROM Users WHERE created_at >= :today),
+                      (SELECT COUNT(*) FROM Users WHERE created_at >= :week_ago),
+                      (SELECT COUNT(*) FROM Users WHERE created_at >= :month_ago)""",
+            parameters={
+                'today_start': today_start, 'week_start': week_start, 'month_start': month_start,
+                'today': today, 'week_ago': week_ago, 'month_ago': month_ago
+            },
+            fetchone=True
+        ) or (0,) * 7
+
+        # To'lovlar: idx_payments_status_updated (status, updated_at) bo'yicha
+        other = self.execute(
+            """WITH
+                   pa AS (SELECT COUNT(*) AS n, COALESCE(SUM(amount), 0) AS total
+                          FROM Payments WHERE status = 'approved'),
+                   pp AS (SELECT COUNT(*) AS n FROM Payments WHERE status = 'pending'),
+                   pm AS (SELECT COUNT(*) AS n, COALESCE(SUM(amount), 0) AS total
+                          FROM Payments WHERE status = 'approved' AND updated_at >= :month_start),
+                   t AS (SELECT COUNT(*) AS total, COALESCE(SUM(passed = TRUE), 0) AS passed FROM TestResults),
+                   f AS (SELECT COUNT(*) AS total, AVG(rating) AS avg_rating FROM Feedbacks),
+                   c AS (SELECT COUNT(*) AS total FROM Certificates)
+               SELECT pa.n, pa.total, pp.n, pm.n, pm.total,
+                      t.total, t.passed, f.total, f.avg_rating, c.total
+               FROM pa, pp, pm, t, f, c""",
+            parameters={'month_start': month_start},
             fetchone=True
-        )[0]
+        ) or (0, 0, 0, 0, 0, 0, 0, 0, None, 0)
+
+        catalog = self.catalog
+        active_modules = {m_id for m_id, m in catalog.modules.items() if m['is_active']}
+        active_lessons = [l for l in catalog.lessons.values() if l['is_active']]
+
+        stats = {
+            # Foydalanuvchilar
+            'total_users': users[0],
+            'new_users_today': users[1],
+            'new_users_week': users[2],
+            'new_users_month': users[3],
+            'users_since_today': users[4],
+            'users_last_7_days': users[5],
+            'users_last_30_days': users[6],
+            # To'lovlar
+            'approved_payments': other[0],
+            'approved_payments_sum': other[1] or 0,
+            'pending_payments': other[2],
+            'approved_payments_month': (other[3], other[4] or 0),
+            # Kontent
+            'total_courses': sum(1 for c in catalog.courses.values() if c['is_active']),
+            'total_lessons': sum(1 for l in active_lessons if l['module_id'] in active_modules),
+            'active_lessons': len(active_lessons),
+            # Testlar
+            'total_tests': other[5],
+            'passed_tests': other[6],
+            # Fikrlar
+            'total_feedbacks': other[7],
+            'avg_rating': round(other[8], 1) if other[8] else 0,
+            # Sertifikatlar
+            'certificates_issued': other[9],
+        }
 
-        # Fikrlar
-        result = self.execute(
-            "SELECT AVG(rating) FROM Feedbacks", fetchone=True
-        )
-        stats['avg_rating'] = round(result[0], 1) if result and result[0] else 0
+        with self._stats_lock:
+            self._stats_cache = (time.monotonic() + STATS_CACHE_TTL, stats)
+        return stats
 
-        # Sertifikatlar
-        stats['certificates_issued'] = self.execute(
-            "SELECT COUNT(*) FROM Certificates", fetchone=True
-        )[0]
+    def invalidate_stats_cache(self):
+        """Statistika keshini tozalash"""
+        with self._stats_lock:
+            self._stats_cache = None
 
-        return stats
+    def get_dashboard_stats(self) -> Dict:
+        """Admin dashboard statistikasi"""
+        return self.get_stats_snapshot()
 
     def get_course_stats(self, course_id: int) -> Dict:
-        """Kurs statistikasi"""
+        """Kurs statistikasi (StatsUserCourse / StatsCourse agregatlaridan)"""
+        catalog = self.catalog
         stats = {}
 
         # Modullar va darslar soni
-        stats['modules'] = self.execute(
-            "SELECT COUNT(*) FROM Modules WHERE course_id = ? AND is_active = TRUE",
-            parameters=(course_id,), fetchone=True
-        )[0]
-
+        stats['modules'] = sum(
+            1 for module_id in catalog.course_modules.get(course_id, ())
+            if catalog.modules[module_id]['is_active']
+        )
         stats['lessons'] = self.count_course_lessons(course_id)
 
-        # O'quvchilar soni
-        stats['students'] = self.execute(
-            """SELECT COUNT(DISTINCT user_id) FROM UserProgress up
-               JOIN Lessons l ON up.lesson_id = l.id
-               JOIN Modules m ON l.module_id = m.id
-               WHERE m.course_id = ?""",
+        # O'quvchilar soni va o'rtacha progress (user bo'yicha bitta qator)
+        result = self.execute(
+            """SELECT COUNT(*), AVG(completed * 100.0 / lessons)
+               FROM StatsUserCourse WHERE course_id = ?""",
             parameters=(course_id,), fetchone=True
-        )[0]
+        )
+        stats['students'] = result[0] if result else 0
+        stats['avg_progress'] = round(result[1], 1) if result and result[1] else 0
 
         # Tugatganlar
-        stats['completed'] = self.execute(
-            "SELECT COUNT(*) FROM Certificates WHERE course_id = ?",
-            parameters=(course_id,), fetchone=True
-        )[0]
-
-        # O'rtacha progress
         result = self.execute(
-            """SELECT AVG(progress) FROM (
-                   SELECT (COUNT(CASE WHEN up.status = 'completed' THEN 1 END) * 100.0 / 
-                           COUNT(*)) as progress
-                   FROM UserProgress up
-                   JOIN Lessons l ON up.lesson_id = l.id
-                   JOIN Modules m ON l.module_id = m.id
-                   WHERE m.course_id = ?
-                   GROUP BY up.user_id
-               )""",
+            "SELECT completions FROM StatsCourse WHERE course_id = ?",
             parameters=(course_id,), fetchone=True
         )
-        stats['avg_progress'] = round(result[0], 1) if result and result[0] else 0
+        stats['completed'] = result[0] if result else 0
 
         return stats
 
+    def get_daily_stats(self, since_day: str) -> Dict[str, Dict]:
+        """
+        Kunlik agregatlar (StatsDaily)
+
+        Args:
+            since_day: 'YYYY-MM-DD' - shu kundan boshlab
+
+        Returns:
+            {'YYYY-MM-DD': {'new_users', 'approved_payments', 'approved_amount'}}
+        """
+        rows = self.execute(
+            """SELECT day, new_users, approved_payments, approved_amount
+               FROM StatsDaily WHERE day >= ? ORDER BY day""",
+            parameters=(since_day,),
+            fetchall=True
+        )
+        return {
+            row[0]: {
+                'new_users': row[1],
+                'approved_payments': row[2],
+                'approved_amount': row[3] or 0
+            }
+            for row in rows or []
+        }
+
+    def get_course_aggregates(self) -> Dict[int, Dict]:
+        """Kurs bo'yicha agregatlar (StatsCourse): {course_id: {...}}"""
+        rows = self.execute(
+            "SELECT course_id, students, approved_payments, approved_amount, completions FROM StatsCourse",
+            fetchall=True
+        )
+        return {
+            row[0]: {
+                'students': row[1],
+                'approved_payments': row[2],
+                'approved_amount': row[3] or 0,
+                'completions': row[4]
+            }
+            for row in rows or []
+        }
+
     def get_inactive_users(self, days: int = 3) -> List[Dict]:
         """Faol bo'lmagan foydalanuvchilar (eslatma uchun)"""
         threshold = (datetime.now(TASHKENT_TZ) - timedelta(days=days)).isoformat()
@@ -2080,7 +2749,7 @@ class UserDatabase(Database):
         results = self.execute(
             """SELECT u.telegram_id, u.username, u.full_name, u.last_active
                FROM Users u
-               WHERE u.last_active < ? AND u.is_active = TRUE
+               WHERE u.last_active < ? AND u.is_active = TRUE AND u.deliverable = TRUE
                AND EXISTS (
                    SELECT 1 FROM UserProgress up WHERE up.user_id = u.id
                )""",
@@ -2098,6 +2767,51 @@ class UserDatabase(Database):
             })
         return users
 
+    def claim_reminder_batch(self, days: int = 3, limit: int = 500) -> List[int]:
+        """
+        Eslatma yuboriladigan keyingi userlar guruhini band qilish
+
+        `days` kundan beri faol bo'lmagan va shu davrda eslatma olmagan userlar
+        (idx_users_last_active bo'yicha) tanlanadi va darhol last_reminded_at
+        belgilanadi. Shu sababli bir user bir davrda ikki marta eslatma olmaydi,
+        hatto yuborish to'xtab qolib qayta boshlansa ham.
+
+        Returns:
+            telegram_id lar ro'yxati (bo'sh - hammasi yuborilgan)
+        """
+        now = datetime.now(TASHKENT_TZ)
+        threshold = (now - timedelta(days=days)).isoformat()
+
+        try:
+            # Tanlash va belgilash bitta BEGIN IMMEDIATE tranzaksiyada: yozish qulfi
+            # SELECT dan oldin olinadi, ikkinchi chaqiruvchi shu userlarni ko'rmaydi
+            with self.transaction():
+                rows = self.execute(
+                    """SELECT u.id, u.telegram_id
+                       FROM Users u
+                       WHERE u.last_active < ? AND u.is_active = TRUE AND u.deliverable = TRUE
+                       AND (u.last_reminded_at IS NULL OR u.last_reminded_at < ?)
+                       AND EXISTS (
+                           SELECT 1 FROM UserProgress up WHERE up.user_id = u.id
+                       )
+                       ORDER BY u.last_active
+                       LIMIT ?""",
+                    parameters=(threshold, threshold, limit),
+                    fetchall=True
+                ) or []
+
+                if rows:
+                    self.executemany(
+                        "UPDATE Users SET last_reminded_at = ? WHERE id = ?",
+                        [(now.isoformat(), row[0]) for row in rows],
+                        commit=True
+                    )
+            return [row[1] for row in rows]
+
+        except Exception as e:
+            print(f"❌ Eslatma ro'yxatini olishda xato: {e}")
+            return []
+
     def get_top_students(self, limit: int = 10) -> List[Dict]:
         """Eng yaxshi o'quvchilar"""
         results = self.execute(
@@ -2131,6 +2845,8 @@ class UserDatabase(Database):
             parameters=(user_id,),
             commit=True
         )
+        self.invalidate_user_id_cache(telegram_id)
+        self.invalidate_progress_cache(user_id)
         return True
 
     def get_admin(self, telegram_id: int) -> Optional[Dict]:
@@ -2171,6 +2887,8 @@ class UserDatabase(Database):
             "DELETE FROM Users WHERE id NOT IN (SELECT user_id FROM Admins)",
             commit=True
         )
+        self.invalidate_user_id_cache()
+        self.invalidate_progress_cache()
         return count
 
 
@@ -2445,50 +3163,52 @@ class UserDatabase(Database):
         if not referrer_id or not referred_id:
             return False
 
-        # Allaqachon taklif qilinganmi tekshirish
-        existing = self.execute(
-            "SELECT 1 FROM Referrals WHERE referred_id = ?",
-            parameters=(referred_id,),
-            fetchone=True
-        )
-        if existing:
-            return False
-
         try:
-            # Referrals jadvaliga qo'shish
-            self.execute(
-                """INSERT INTO Referrals (referrer_id, referred_id, status)
-                   VALUES (?, ?, 'registered')""",
-                parameters=(referrer_id, referred_id),
-                commit=True
-            )
-
-            # Users jadvalida referred_by ni yangilash
-            self.execute(
-                "UPDATE Users SET referred_by = ? WHERE id = ?",
-                parameters=(referrer_id, referred_id),
-                commit=True
-            )
+            # Tekshirish, yozuvlar va bonus - bitta tranzaksiyada (bitta commit)
+            with self.transaction():
+                # Allaqachon taklif qilinganmi tekshirish
+                existing = self.execute(
+                    "SELECT 1 FROM Referrals WHERE referred_id = ?",
+                    parameters=(referred_id,),
+                    fetchone=True
+                )
+                if existing:
+                    return False
 
-            # Taklif qiluvchining referral_count ni oshirish
-            self.execute(
-                "UPDATE Users SET referral_count = COALESCE(referral_count, 0) + 1 WHERE id = ?",
-                parameters=(referrer_id,),
-                commit=True
-            )
+                # Referrals jadvaliga qo'shish
+                self.execute(
+                    """INSERT INTO Referrals (referrer_id, referred_id, status)
+                       VALUES (?, ?, 'registered')""",
+                    parameters=(referrer_id, referred_id),
+                    commit=True
+                )
 
-            # Ro'yxatdan o'tish bonusini berish
-            register_bonus = int(self.get_setting('referral_bonus_register', '5'))
-            if register_bonus > 0:
-                self.add_score(referrer_telegram_id, register_bonus)
+                # Users jadvalida referred_by ni yangilash
+                self.execute(
+                    "UPDATE Users SET referred_by = ? WHERE id = ?",
+                    parameters=(referrer_id, referred_id),
+                    commit=True
+                )
 
-                # Bonus berilganini saqlash
+                # Taklif qiluvchining referral_count ni oshirish
                 self.execute(
-                    "UPDATE Referrals SET bonus_given = ? WHERE referrer_id = ? AND referred_id = ?",
-                    parameters=(register_bonus, referrer_id, referred_id),
+                    "UPDATE Users SET referral_count = COALESCE(referral_count, 0) + 1 WHERE id = ?",
+                    parameters=(referrer_id,),
                     commit=True
                 )
 
+                # Ro'yxatdan o'tish bonusini berish
+                register_bonus = self.get_setting_int('referral_bonus_register', 5)
+                if register_bonus > 0:
+                    self.add_score(referrer_telegram_id, register_bonus)
+
+                    # Bonus berilganini saqlash
+                    self.execute(
+                        "UPDATE Referrals SET bonus_given = ? WHERE referrer_id = ? AND referred_id = ?",
+                        parameters=(register_bonus, referrer_id, referred_id),
+                        commit=True
+                    )
+
             return True
 
         except Exception as e:
@@ -2502,38 +3222,40 @@ class UserDatabase(Database):
         """
         print(f"🔍 REFERAL DEBUG: User ID {referred_internal_id} uchun tekshirilmoqda...")
 
-        # 1. Refererni qidiramiz
-        # Diqqat: r.status = 'registered' bo'lishi shart. Agar 'paid' bo'lsa, ikkinchi marta to'lamaydi.
-        res = self.execute(
-            """SELECT r.id, r.referrer_id, u.telegram_id, u.full_name, u.phone 
-               FROM Referrals r 
-               JOIN Users u ON r.referrer_id = u.id 
-               WHERE r.referred_id = ?""",
-            (referred_internal_id,), fetchone=True
-        )
+        try:
+            # Tekshirish va to'lash bitta tranzaksiyada: ikki admin bir vaqtda
+            # tasdiqlasa ham cashback faqat bir marta yoziladi
+            with self.transaction():
+                # 1. Refererni qidiramiz
+                # Diqqat: r.status = 'registered' bo'lishi shart. Agar 'paid' bo'lsa, ikkinchi marta to'lamaydi.
+                res = self.execute(
+                    """SELECT r.id, r.referrer_id, u.telegram_id, u.full_name, u.phone, r.status
+                       FROM Referrals r 
+                       JOIN Users u ON r.referrer_id = u.id 
+                       WHERE r.referred_id = ?""",
+                    (referred_internal_id,), fetchone=True
+                )
 
-        if not res:
-            print(f"❌ REFERAL DEBUG: Bu foydalanuvchini (ID: {referred_internal_id}) hech kim taklif qilmagan.")
-            return {'success': False}
+                if not res:
+                    print(f"❌ REFERAL DEBUG: Bu foydalanuvchini (ID: {referred_internal_id}) hech kim taklif qilmagan.")
+                    return {'success': False}
 
-        ref_id, referrer_id, referrer_tg_id, referrer_name, referrer_phone = res
+                ref_id, referrer_id, referrer_tg_id, referrer_name, referrer_phone, status = res
 
-        # 2. Allaqachon to'langanmi tekshirish
-        check_status = self.execute("SELECT status FROM Referrals WHERE id=?", (ref_id,), fetchone=True)
-        if check_status and check_status[0] == 'paid':
-            print(f"⚠️ REFERAL DEBUG: Bu user uchun allaqachon bonus to'langan!")
-            return {'success': False}
+                # 2. Allaqachon to'langanmi tekshirish
+                if status == 'paid':
+                    print(f"⚠️ REFERAL DEBUG: Bu user uchun allaqachon bonus to'langan!")
+                    return {'success': False}
 
-        # 3. Cashback hisoblash
-        percent = int(self.get_setting('referral_cashback', '10'))
-        cashback = amount_paid * percent / 100
+                # 3. Cashback hisoblash
+                percent = self.get_setting_int('referral_cashback', 10)
+                cashback = amount_paid * percent / 100
 
-        try:
-            # Statusni yangilaymiz
-            self.execute(
-                "UPDATE Referrals SET status='paid', bonus_given=?, converted_at=? WHERE id=?",
-                (cashback, datetime.now(TASHKENT_TZ).isoformat(), ref_id), commit=True
-            )
+                # Statusni yangilaymiz
+                self.execute(
+                    "UPDATE Referrals SET status='paid', bonus_given=?, converted_at=? WHERE id=?",
+                    (cashback, datetime.now(TASHKENT_TZ).isoformat(), ref_id), commit=True
+                )
 
             print(f"✅ REFERAL DEBUG: Muvaffaqiyatli! {referrer_name} ga {cashback} so'm yozildi.")
 
@@ -2668,7 +3390,7 @@ class UserDatabase(Database):
 
     def check_referral_enabled(self) -> bool:
         """Referal tizimi yoqilganmi"""
-        return self.get_setting('referral_enabled', 'true').lower() == 'true'
+        return self.get_setting_bool('referral_enabled', True)
 
         # =============================================================
         #           YANGI: ADMIN, RUXSAT VA VAQT METHODLARI
@@ -2679,11 +3401,7 @@ class UserDatabase(Database):
             Sozlamalardan standart kurs muddatini oladi (kun).
             Agar belgilanmagan bo'lsa, avtomat 90 kun qaytaradi.
             """
-            try:
-                res = self.execute("SELECT value FROM Settings WHERE key = 'default_duration'", fetchone=True)
-                return int(res[0]) if res else 90
-            except:
-                return 90
+            return self.get_setting_int('default_duration', 90)
 
     def set_default_duration(self, days):
             """Admin panel orqali standart muddatni o'zgartirish"""
@@ -2691,6 +3409,7 @@ class UserDatabase(Database):
                 "INSERT OR REPLACE INTO Settings (key, value, description) VALUES ('default_duration', ?, 'Standart kurs muddati')",
                 (str(days),), commit=True
             )
+            self.invalidate_settings_cache()
 
     def check_access(self, user_id, course_id):
             """
@@ -2698,31 +3417,7 @@ class UserDatabase(Database):
             True = Kirishi mumkin
             False = Kirishi mumkin emas
             """
-            import datetime
-            row = self.execute(
-                "SELECT expires_at, is_active FROM ManualAccess WHERE user_id=? AND course_id=?",
-                (user_id, course_id), fetchone=True
-            )
-
-            if not row: return False  # Umuman sotib olmagan
-
-            expires_at_str, is_active = row
-
-            # 1. Bloklangan bo'lsa (is_active=0)
-            if not is_active: return False
-
-            # 2. Agar vaqt cheksiz bo'lsa (NULL)
-            if not expires_at_str: return True
-
-            # 3. Vaqtni tekshiramiz
-            try:
-                exp_date = datetime.datetime.strptime(str(expires_at_str)[:19], "%Y-%m-%d %H:%M:%S")
-                if datetime.datetime.now() > exp_date:
-                    return False  # Vaqt tugagan
-            except:
-                return False
-
-            return True
+            return self.has_access(int(user_id), int(course_id))
 
     def grant_access(self, user_id, course_id, admin_id, days):
             """
@@ -2739,6 +3434,8 @@ class UserDatabase(Database):
                    VALUES (?, ?, ?, ?, 1)""",
                 (user_id, course_id, admin_id, expires_at), commit=True
             )
+            self.invalidate_access_cache(int(user_id))
+            self.init_users_progress([int(user_id)], int(course_id))
             return expires_at
 
     def block_user(self, user_id, course_id):
@@ -2747,6 +3444,7 @@ class UserDatabase(Database):
                 "UPDATE ManualAccess SET is_active=0 WHERE user_id=? AND course_id=?",
                 (user_id, course_id), commit=True
             )
+            self.invalidate_access_cache(int(user_id))
 
     def unblock_user(self, user_id, course_id):
             """Userni blokdan chiqarish (is_active = 1)"""
@@ -2754,6 +3452,7 @@ class UserDatabase(Database):
                 "UPDATE ManualAccess SET is_active=1 WHERE user_id=? AND course_id=?",
                 (user_id, course_id), commit=True
             )
+            self.invalidate_access_cache(int(user_id))
 
     def add_days_to_user(self, user_id, course_id, days):
             """
@@ -2770,7 +3469,8 @@ class UserDatabase(Database):
             now = datetime.datetime.now()
 
             if row and row[0]:
-                current_exp = datetime.datetime.strptime(str(row[0])[:19], "%Y-%m-%d %H:%M:%S")
+                # expires_at turli formatda bo'lishi mumkin (ISO, naive) - bitta parser
+                current_exp = datetime.datetime.fromtimestamp(self._parse_expires_at(row[0]))
                 # Qaysi biri katta bo'lsa o'shandan boshlaymiz (Hozir yoki Tugash vaqti)
                 start_time = max(now, current_exp)
             else:
@@ -2782,6 +3482,7 @@ class UserDatabase(Database):
                 "UPDATE ManualAccess SET expires_at=?, is_active=1 WHERE user_id=? AND course_id=?",
                 (new_expire, user_id, course_id), commit=True
             )
+            self.invalidate_access_cache(int(user_id))
             return new_expire
 
     def delete_access(self, user_id, course_id):
@@ -2790,6 +3491,7 @@ class UserDatabase(Database):
                 "DELETE FROM ManualAccess WHERE user_id=? AND course_id=?",
                 (user_id, course_id), commit=True
             )
+            self.invalidate_access_cache(int(user_id))
 
         # --- OMMAVIY (MASS) ACTIONLAR ---
 
@@ -2805,6 +3507,18 @@ class UserDatabase(Database):
             """
             sql = f"UPDATE ManualAccess SET expires_at = datetime(expires_at, '+{days} days') WHERE is_active = 1 AND expires_at IS NOT NULL"
             self.execute(sql, commit=True)
+            self.invalidate_access_cache()
+
+            # Vaqti uzaytirilganlarning progressi yo'q bo'lsa - kurs bo'yicha bittada ochamiz
+            rows = self.execute(
+                "SELECT course_id, user_id FROM ManualAccess WHERE is_active = 1 AND expires_at IS NOT NULL",
+                fetchall=True
+            ) or []
+            by_course = {}
+            for course_id, user_id in rows:
+                by_course.setdefault(course_id, []).append(user_id)
+            for course_id, user_ids in by_course.items():
+                self.init_users_progress(user_ids, course_id)
 
 
 
@@ -2815,58 +3529,36 @@ class UserDatabase(Database):
         """
         stats = {}
 
-        try:
-            # 1. Test natijalari
-            result = self.execute("SELECT COUNT(*) FROM TestResults", fetchone=True)
-            stats['test_results'] = result[0] if result else 0
-            self.execute("DELETE FROM TestResults", commit=True)
-
-            # 2. User progress
-            result = self.execute("SELECT COUNT(*) FROM UserProgress", fetchone=True)
-            stats['progress'] = result[0] if result else 0
-            self.execute("DELETE FROM UserProgress", commit=True)
-
-            # 3. Sertifikatlar
-            result = self.execute("SELECT COUNT(*) FROM Certificates", fetchone=True)
-            stats['certificates'] = result[0] if result else 0
-            self.execute("DELETE FROM Certificates", commit=True)
-
-            # 4. Fikrlar
-            result = self.execute("SELECT COUNT(*) FROM Feedbacks", fetchone=True)
-            stats['feedbacks'] = result[0] if result else 0
-            self.execute("DELETE FROM Feedbacks", commit=True)
-
-            # 5. To'lovlar
-            result = self.execute("SELECT COUNT(*) FROM Payments", fetchone=True)
-            stats['payments'] = result[0] if result else 0
-            self.execute("DELETE FROM Payments", commit=True)
-
-            # 6. Qo'lda dostuplar
-            result = self.execute("SELECT COUNT(*) FROM ManualAccess", fetchone=True)
-            stats['manual_access'] = result[0] if result else 0
-            self.execute("DELETE FROM ManualAccess", commit=True)
-
-            # 7. Referallar
-            result = self.execute("SELECT COUNT(*) FROM Referrals", fetchone=True)
-            stats['referrals'] = result[0] if result else 0
-            self.execute("DELETE FROM Referrals", commit=True)
-
+        # (jadval, statistika kaliti, qo'shimcha shart) - shu tartibda tozalanadi
+        tables = (
+            ('TestResults', 'test_results', ''),               # 1. Test natijalari
+            ('UserProgress', 'progress', ''),                  # 2. User progress
+            ('Certificates', 'certificates', ''),              # 3. Sertifikatlar
+            ('Feedbacks', 'feedbacks', ''),                    # 4. Fikrlar
+            ('Payments', 'payments', ''),                      # 5. To'lovlar
+            ('ManualAccess', 'manual_access', ''),             # 6. Qo'lda dostuplar
+            ('Referrals', 'referrals', ''),                    # 7. Referallar
             # 8. Userlar (adminlardan tashqari)
-            result = self.execute(
-                "SELECT COUNT(*) FROM Users WHERE id NOT IN (SELECT user_id FROM Admins)",
-                fetchone=True
-            )
-            stats['users'] = result[0] if result else 0
-            self.execute(
-                "DELETE FROM Users WHERE id NOT IN (SELECT user_id FROM Admins)",
-                commit=True
-            )
+            ('Users', 'users', ' WHERE id NOT IN (SELECT user_id FROM Admins)'),
+        )
 
-            # 9. Admin userlarning ballarini 0 ga tushirish
-            self.execute(
-                "UPDATE Users SET total_score = 0, balance = 0, referral_count = 0",
-                commit=True
-            )
+        try:
+            # Hammasi bitta tranzaksiyada: yarmida xato bo'lsa hech narsa o'chmaydi
+            with self.transaction():
+                for table, key, where in tables:
+                    result = self.execute(f"SELECT COUNT(*) FROM {table}{where}", fetchone=True)
+                    stats[key] = result[0] if result else 0
+                    self.execute(f"DELETE FROM {table}{where}", commit=True)
+
+                # 9. Admin userlarning ballarini 0 ga tushirish
+                self.execute(
+                    "UPDATE Users SET total_score = 0, balance = 0, referral_count = 0",
+                    commit=True
+                )
+
+            self.invalidate_progress_cache()
+            self.invalidate_user_id_cache()
+            self.invalidate_access_cache()
 
             stats['success'] = True
             return stats
@@ -3005,9 +3697,487 @@ class UserDatabase(Database):
                 parameters=(user_id, course_id),
                 commit=True
             )
+            self.invalidate_progress_cache(user_id)
+            self.invalidate_access_cache(user_id)
 
             return True
 
         except Exception as e:
             print(f"❌ Dostup yopishda xato: {e}")
             return False
+
+    # ============================================================
+    #                    REKLAMA NAVBATI (OUTBOX)
+    # ============================================================
+
+    # Kampaniya auditoriyalari: target -> Users ustidagi shart (target_id - kurs ID).
+    # EXISTS/NOT EXISTS har bir userni bir marta qaytaradi (DISTINCT kerak emas)
+    # va Users.id bo'yicha keyset sahifalashni buzmaydi.
+    BROADCAST_AUDIENCES = {
+        'all': "",
+        'paid': """AND EXISTS (SELECT 1 FROM Payments p
+                               WHERE p.user_id = u.id AND p.status = 'approved')""",
+        'free': """AND NOT EXISTS (SELECT 1 FROM Payments p
+                                   WHERE p.user_id = u.id AND p.status = 'approved')""",
+        'course': """AND EXISTS (SELECT 1 FROM Payments p
+                                 WHERE p.user_id = u.id AND p.course_id = :target_id
+                                   AND p.status = 'approved')""",
+    }
+
+    def _audience_filter(self, target: str, include_undeliverable: bool = False) -> Optional[str]:
+        audience_filter = self.BROADCAST_AUDIENCES.get(target)
+        if audience_filter is None:
+            return None
+        if not include_undeliverable:
+            # Botni bloklagan / o'chirilgan akkauntlarga yubormaymiz
+            audience_filter = "AND u.deliverable = TRUE " + audience_filter
+        return audience_filter
+
+    def count_audience(self, target: str, target_id: int = None, include_undeliverable: bool = False) -> int:
+        """Auditoriyadagi userlar soni"""
+        audience_filter = self._audience_filter(target, include_undeliverable)
+        if audience_filter is None:
+            return 0
+        result = self.execute(
+            f"SELECT COUNT(*) FROM Users u WHERE 1 = 1 {audience_filter}",
+            parameters={'target_id': target_id},
+            fetchone=True
+        )
+        return result[0] if result else 0
+
+    def get_audience_page(self, target: str, target_id: int = None, after_id: int = 0,
+                          limit: int = 1000, include_undeliverable: bool = False) -> List[tuple]:
+        """
+        Auditoriyaning bitta sahifasi (keyset: Users.id > after_id)
+
+        Standart bo'yicha xabar yetmaydigan (deliverable = FALSE) userlar tashlab ketiladi.
+
+        Returns:
+            [(user_id, telegram_id), ...] - Users.id bo'yicha tartiblangan
+        """
+        audience_filter = self._audience_filter(target, include_undeliverable)
+        if audience_filter is None:
+            return []
+        return self.execute(
+            f"""SELECT u.id, u.telegram_id FROM Users u
+                WHERE u.id > :after_id {audience_filter}
+                ORDER BY u.id LIMIT :limit""",
+            parameters={'target_id': target_id, 'after_id': after_id, 'limit': limit},
+            fetchall=True
+        ) or []
+
+    def iter_audience(self, target: str, target_id: int = None, batch_size: int = 1000):
+        """
+        Auditoriyani qismlab o'qish (generator)
+
+        Butun ro'yxat xotiraga yuklanmaydi - har safar `batch_size` ta
+        (user_id, telegram_id) qatori qaytariladi.
+        """
+        after_id = 0
+        while True:
+            rows = self.get_audience_page(target, target_id, after_id, batch_size)
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1][0]
+
+    def create_broadcast(
+            self,
+            creator_id: int,
+            payload: Dict,
+            target: str,
+            target_id: int = None,
+            scheduled_at: datetime = None
+    ) -> Optional[int]:
+        """
+        Kampaniya yaratish
+
+        Qabul qiluvchilar shu yerda ko'chirilmaydi - navbat yuborish paytida
+        fill_broadcast_outbox orqali qismlab to'ldiriladi. `total` - taxminiy
+        son, auditoriya to'liq o'qilgach aniqlashtiriladi.
+
+        Returns:
+            Kampaniya ID yoki None (auditoriya bo'sh bo'lsa)
+        """
+        total = self.count_audience(target, target_id)
+        if not total:
+            return None
+
+        try:
+            with self.transaction():
+                self.execute(
+                    """INSERT INTO BroadcastCampaigns
+                       (creator_id, payload, target, target_id, status, scheduled_at, total)
+                       VALUES (?, ?, ?, ?, 'scheduled', ?, ?)""",
+                    parameters=(creator_id, json.dumps(payload, ensure_ascii=False), target, target_id,
+                                scheduled_at.isoformat() if scheduled_at else None, total),
+                    commit=True
+                )
+                result = self.execute("SELECT last_insert_rowid()", fetchone=True)
+            return result[0] if result else None
+
+        except Exception as e:
+            print(f"❌ Kampaniya yaratishda xato: {e}")
+            return None
+
+    def fill_broadcast_outbox(self, campaign_id: int, limit: int = 1000) -> int:
+        """
+        Auditoriyaning keyingi sahifasini navbatga qo'shish
+
+        Oxirgi qo'shilgan Users.id (audience_cursor) kampaniyada saqlanadi,
+        shuning uchun bot qayta ishga tushsa ham to'ldirish davom etadi.
+
+        Returns:
+            Ko'rib chiqilgan userlar soni (`limit` dan kam - auditoriya tugadi)
+        """
+        try:
+            # Kursorni o'qish, sahifani navbatga qo'shish va kursorni surish - bitta
+            # BEGIN IMMEDIATE tranzaksiyada: ikki to'ldiruvchi bir sahifani olmaydi
+            with self.transaction():
+                row = self.execute(
+                    "SELECT target, target_id, audience_cursor, audience_done FROM BroadcastCampaigns WHERE id = ?",
+                    parameters=(campaign_id,),
+                    fetchone=True
+                )
+                if not row or row[3]:
+                    return 0
+
+                target, target_id, audience_cursor = row[0], row[1], row[2]
+                rows = self.get_audience_page(target, target_id, audience_cursor, limit)
+
+                self.executemany(
+                    "INSERT OR IGNORE INTO BroadcastOutbox (campaign_id, telegram_id) VALUES (?, ?)",
+                    [(campaign_id, telegram_id) for _, telegram_id in rows],
+                    commit=True
+                )
+                if len(rows) < limit:
+                    # Auditoriya tugadi - aniq sonni yozamiz
+                    self.execute(
+                        """UPDATE BroadcastCampaigns
+                           SET audience_done = 1,
+                               audience_cursor = ?,
+                               total = (SELECT COUNT(*) FROM BroadcastOutbox WHERE campaign_id = ?)
+                           WHERE id = ?""",
+                        parameters=(rows[-1][0] if rows else audience_cursor, campaign_id, campaign_id),
+                        commit=True
+                    )
+                else:
+                    self.execute(
+                        "UPDATE BroadcastCampaigns SET audience_cursor = ? WHERE id = ?",
+                        parameters=(rows[-1][0], campaign_id),
+                        commit=True
+                    )
+            return len(rows)
+
+        except Exception as e:
+            print(f"❌ Reklama navbatini to'ldirishda xato: {e}")
+            return 0
+
+    def _broadcast_row_to_dict(self, row) -> Dict:
+        return {
+            'id': row[0],
+            'creator_id': row[1],
+            'payload': json.loads(row[2]),
+            'target': row[3],
+            'target_id': row[4],
+            'status': row[5],
+            'scheduled_at': datetime.fromisoformat(row[6]) if row[6] else None,
+            'total': row[7],
+            'sent': row[8],
+            'blocked': row[9],
+            'failed': row[10],
+            'cursor': row[11],
+            'created_at': row[12],
+            'finished_at': row[13],
+            'audience_done': bool(row[14])
+        }
+
+    def get_broadcast(self, campaign_id: int) -> Optional[Dict]:
+        """Kampaniya ma'lumotlari"""
+        row = self.execute(
+            """SELECT id, creator_id, payload, target, target_id, status, scheduled_at,
+                      total, sent, blocked, failed, cursor, created_at, finished_at, audience_done
+               FROM BroadcastCampaigns WHERE id = ?""",
+            parameters=(campaign_id,),
+            fetchone=True
+        )
+        return self._broadcast_row_to_dict(row) if row else None
+
+    def get_unfinished_broadcasts(self) -> List[Dict]:
+        """Tugallanmagan kampaniyalar (bot qayta ishga tushganda davom ettirish uchun)"""
+        rows = self.execute(
+            """SELECT id, creator_id, payload, target, target_id, status, scheduled_at,
+                      total, sent, blocked, failed, cursor, created_at, finished_at, audience_done
+               FROM BroadcastCampaigns
+               WHERE status IN ('scheduled', 'running', 'paused')
+               ORDER BY id""",
+            fetchall=True
+        )
+        return [self._broadcast_row_to_dict(row) for row in rows or []]
+
+    def get_broadcast_pending(self, campaign_id: int, after_id: int = 0, limit: int = 500) -> List[tuple]:
+        """Navbatdagi yuborilmagan qabul qiluvchilar: [(outbox_id, telegram_id), ...]"""
+        return self.execute(
+            """SELECT id, telegram_id FROM BroadcastOutbox
+               WHERE campaign_id = ? AND status = 'pending' AND id > ?
+               ORDER BY id LIMIT ?""",
+            parameters=(campaign_id, after_id, limit),
+            fetchall=True
+        ) or []
+
+    def count_broadcast_pending(self, campaign_id: int) -> Optional[int]:
+        """Navbatda yuborilmagan yozuvlar soni (xato bo'lsa None)"""
+        result = self.execute(
+            "SELECT COUNT(*) FROM BroadcastOutbox WHERE campaign_id = ? AND status = 'pending'",
+            parameters=(campaign_id,),
+            fetchone=True
+        )
+        return result[0] if result else None
+
+    def save_broadcast_results(self, results: List[tuple]) -> int:
+        """
+        Yuborish natijalarini saqlash: [(status, error, outbox_id), ...]
+
+        Faqat 'pending' yozuvlar yangilanadi - qayta saqlash natijani o'zgartirmaydi.
+        """
+        if not results:
+            return 0
+        now = datetime.now(TASHKENT_TZ).isoformat()
+        return self.executemany(
+            """UPDATE BroadcastOutbox
+               SET status = ?, error = ?, attempts = attempts + 1, updated_at = ?
+               WHERE id = ? AND status = 'pending'""",
+            [(status, error, now, outbox_id) for status, error, outbox_id in results],
+            commit=True
+        )
+
+    def update_broadcast(self, campaign_id: int, **kwargs) -> bool:
+        """Kampaniya holati/hisoblagichlarini yangilash"""
+        allowed_fields = ['status', 'cursor', 'sent', 'blocked', 'failed', 'finished_at']
+        updates = []
+        params = []
+
+        for key, value in kwargs.items():
+            if key in allowed_fields:
+                updates.append(f"{key} = ?")
+                params.append(value)
+
+        if not updates:
+            return False
+
+        params.append(campaign_id)
+        sql = f"UPDATE BroadcastCampaigns SET {', '.join(updates)} WHERE id = ?"
+        self.execute(sql, parameters=tuple(params), commit=True)
+        return True
+
+    def retry_failed_broadcast(self, campaign_id: int) -> int:
+        """
+        Xato bilan tugagan qabul qiluvchilarni qayta navbatga qo'yish
+
+        Yetkazilgan ('sent') va bloklaganlarga qayta yuborilmaydi.
+        """
+        result = self.execute(
+            "SELECT COUNT(*) FROM BroadcastOutbox WHERE campaign_id = ? AND status = 'failed'",
+            parameters=(campaign_id,),
+            fetchone=True
+        )
+        count = result[0] if result else 0
+        if not count:
+            return 0
+
+        self.execute(
+            "UPDATE BroadcastOutbox SET status = 'pending' WHERE campaign_id = ? AND status = 'failed'",
+            parameters=(campaign_id,),
+            commit=True
+        )
+        self.execute(
+            """UPDATE BroadcastCampaigns
+               SET status = 'scheduled', failed = MAX(failed - ?, 0), cursor = 0, finished_at = NULL
+               WHERE id = ?""",
+            parameters=(count, campaign_id),
+            commit=True
+        )
+        return count
+
+    # ============================================================
+    #                    XABAR YETKAZISH HOLATI
+    # ============================================================
+
+    def mark_undeliverable(self, telegram_ids: List[int]) -> int:
+        """
+        Botni bloklagan / akkaunti o'chirilgan userlarni belgilash
+
+        Keyingi reklama va eslatmalar ularni o'tkazib yuboradi. User botga
+        qayta yozsa update_last_active belgini olib tashlaydi.
+        """
+        if not telegram_ids:
+            return 0
+        now = datetime.now(TASHKENT_TZ).isoformat()
+        return self.executemany(
+            "UPDATE Users SET deliverable = FALSE, last_delivery_error_at = ? WHERE telegram_id = ?",
+            [(now, telegram_id) for telegram_id in telegram_ids],
+            commit=True
+        )
+
+    def get_delivery_stats(self) -> Dict:
+        """Xabar yetmaydigan userlar statistikasi (bitta so'rov)"""
+        week_ago = (datetime.now(TASHKENT_TZ) - timedelta(days=7)).isoformat()
+        month_ago = (datetime.now(TASHKENT_TZ) - timedelta(days=30)).isoformat()
+
+        row = self.execute(
+            """SELECT COUNT(*),
+                      COALESCE(SUM(deliverable = FALSE), 0),
+                      COALESCE(SUM(deliverable = FALSE AND last_delivery_error_at >= ?), 0),
+                      COALESCE(SUM(deliverable = FALSE AND last_delivery_error_at >= ?), 0)
+               FROM Users""",
+            parameters=(week_ago, month_ago),
+            fetchone=True
+        )
+        total, undeliverable, week, month = row if row else (0, 0, 0, 0)
+        return {
+            'total': total,
+            'deliverable': total - undeliverable,
+            'undeliverable': undeliverable,
+            'undeliverable_week': week,
+            'undeliverable_month': month
+        }
+
+    # ============================================================
+    #                    ADMIN RO'YXATLARI (KEYSET SAHIFALASH)
+    # ============================================================
+
+    # Ro'yxat segmentlari: segment -> Users ustidagi shart. NOT EXISTS
+    # idx_payments_user_course_status va ManualAccess(user_id, course_id)
+    # indekslari bo'yicha har bir user uchun bitta qidiruv.
+    USER_LIST_SEGMENTS = {
+        'all': "",
+        'not_paid': """AND u.phone IS NOT NULL
+                       AND NOT EXISTS (SELECT 1 FROM Payments p
+                                       WHERE p.user_id = u.id AND p.status = 'approved')
+                       AND NOT EXISTS (SELECT 1 FROM ManualAccess ma
+                                       WHERE ma.user_id = u.id AND ma.is_active = 1)""",
+    }
+
+    def get_users_page(self, segment: str = 'all', after_id: int = None,
+                       before_id: int = None, limit: int = 10) -> Dict:
+        """
+        Foydalanuvchilar sahifasi (yangilari birinchi, Users.id bo'yicha keyset)
+
+        OFFSET ishlatilmaydi: keyingi sahifa `id < after_id`, oldingisi
+        `id > before_id` - istalgan sahifa birinchisi kabi tez.
+
+        Args:
+            segment: USER_LIST_SEGMENTS kaliti
+            after_id: Joriy sahifaning oxirgi id si (keyingi sahifa uchun)
+            before_id: Joriy sahifaning birinchi id si (oldingi sahifa uchun)
+
+        Returns:
+            {'users': [...], 'has_next': bool, 'has_prev': bool}
+        """
+        segment_filter = self.USER_LIST_SEGMENTS.get(segment)
+        if segment_filter is None:
+            return {'users': [], 'has_next': False, 'has_prev': False}
+
+        if before_id is not None:
+            bound, order, cursor = "u.id > ?", "ASC", before_id
+        elif after_id is not None:
+            bound, order, cursor = "u.id < ?", "DESC", after_id
+        else:
+            bound, order, cursor = "u.id > ?", "DESC", 0  # Birinchi sahifa
+
+        rows = self.execute(
+            f"""SELECT u.id, u.telegram_id, u.username, u.full_name, u.phone,
+                       u.total_score, u.is_active, u.created_at
+                FROM Users u
+                WHERE {bound} {segment_filter}
+                ORDER BY u.id {order}
+                LIMIT ?""",
+            parameters=(cursor, limit + 1),
+            fetchall=True
+        ) or []
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if before_id is not None:
+            rows.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, after_id is not None
+
+        users = [{
+            'id': row[0],
+            'telegram_id': row[1],
+            'username': row[2],
+            'full_name': row[3],
+            'phone': row[4],
+            'total_score': row[5],
+            'is_active': bool(row[6]),
+            'created_at': row[7]
+        } for row in rows]
+        return {'users': users, 'has_next': has_next, 'has_prev': has_prev}
+
+    def count_users_segment(self, segment: str = 'all', force: bool = False) -> int:
+        """Segmentdagi userlar soni (STATS_CACHE_TTL soniya keshlanadi)"""
+        segment_filter = self.USER_LIST_SEGMENTS.get(segment)
+        if segment_filter is None:
+            return 0
+
+        now_ts = time.monotonic()
+        with self._stats_lock:
+            cached = self._list_count_cache.get(segment)
+            if not force and cached and cached[0] > now_ts:
+                return cached[1]
+
+        result = self.execute(
+            f"SELECT COUNT(*) FROM Users u WHERE 1 {segment_filter}",
+            fetchone=True
+        )
+        count = result[0] if result else 0
+
+        with self._stats_lock:
+            self._list_count_cache[segment] = (time.monotonic() + STATS_CACHE_TTL, count)
+        return count
+
+    # ============================================================
+    #                    EXCEL EKSPORT SO'ROVLARI
+    # ============================================================
+
+    # Eksport turi -> so'rov (ustunlar tartibi utils/misc/export.py dagi bilan bir xil)
+    EXPORT_QUERIES = {
+        'not_paid': f"""SELECT u.full_name, u.phone, u.username, u.telegram_id, u.created_at
+                        FROM Users u
+                        WHERE 1 {USER_LIST_SEGMENTS['not_paid']}
+                        ORDER BY u.id DESC""",
+        'users': """SELECT u.full_name, u.phone, u.username, u.telegram_id, u.total_score,
+                           u.referral_count, u.is_active, u.created_at, u.last_active
+                    FROM Users u
+                    ORDER BY u.id DESC""",
+        'payments': """SELECT p.id, u.full_name, u.phone, u.telegram_id, c.name, p.amount,
+                              p.status, p.created_at, p.updated_at
+                       FROM Payments p
+                       LEFT JOIN Users u ON p.user_id = u.id
+                       LEFT JOIN Courses c ON p.course_id = c.id
+                       ORDER BY p.id DESC""",
+        'test_results': """SELECT tr.id, u.full_name, u.telegram_id, l.name, tr.score,
+                                  tr.correct_answers, tr.total_questions, tr.passed, tr.completed_at
+                           FROM TestResults tr
+                           LEFT JOIN Users u ON tr.user_id = u.id
+                           LEFT JOIN Tests t ON tr.test_id = t.id
+                           LEFT JOIN Lessons l ON t.lesson_id = l.id
+                           ORDER BY tr.id DESC""",
+        'referrals': """SELECT r.id, ru.full_name, ru.telegram_id, nu.full_name, nu.telegram_id,
+                               r.status, r.bonus_given, r.created_at, r.converted_at
+                        FROM Referrals r
+                        LEFT JOIN Users ru ON r.referrer_id = ru.id
+                        LEFT JOIN Users nu ON r.referred_id = nu.id
+                        ORDER BY r.id DESC""",
+    }
+
+    def iter_export_rows(self, kind: str, chunk_size: int = 1000):
+        """Eksport qatorlari bo'laklab (har biri `chunk_size` ta qatorli list)"""
+        sql = self.EXPORT_QUERIES.get(kind)
+        if sql is None:
+            return
+        yield from self.iterate(sql, chunk_size=chunk_size)
@@ -0,0 +1,80 @@
+# utils/misc/activity.py
+# Foydalanuvchi faolligini (last_active) xotirada yig'ib, bazaga guruhlab yozish
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict
+
+import pytz
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from data.config import ACTIVITY_FLUSH_INTERVAL
+from loader import async_user_db
+
+logger = logging.getLogger(__name__)
+
+TASHKENT_TZ = pytz.timezone('Asia/Tashkent')
+
+
+class ActivityTracker:
+    """
+    Write-behind last_active buferi.
+
+    touch() faqat dict'ga yozadi (disk yo'q). flush() har `flush_interval`
+    soniyada va bot to'xtaganda barcha yozuvlarni bitta executemany bilan
+    saqlaydi - har bir update uchun alohida UPDATE + commit qilinmaydi.
+    Bot kutilmaganda o'chsa oxirgi interval ichidagi faollik yo'qoladi.
+    """
+
+    def __init__(self, flush_interval: int = ACTIVITY_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, str] = {}
+
+    def touch(self, telegram_id: int):
+        """User botdan foydalandi"""
+        self._pending[telegram_id] = datetime.now(TASHKENT_TZ).isoformat()
+
+    async def flush(self) -> int:
+        """Buferdagi faollikni bazaga yozish"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            return await async_user_db.update_last_active_many(pending)
+        except Exception as e:
+            # Keyingi flush da qayta urinamiz (yangiroq vaqtlar ustun)
+            pending.update(self._pending)
+            self._pending = pending
+            logger.error(f"❌ Faollikni saqlashda xato: {e}")
+            return 0
+
+    async def run(self):
+        """Davriy flush (bot ishga tushganda orqa fonda)"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+activity_tracker = ActivityTracker()
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """
+    Har bir update da faollikni belgilash (ActivityTracker buferiga yozadi)
+
+    app.py da alohida ulanadi: middlewares paketini import qilish throttling
+    va majburiy obuna middleware larini ham yoqib yuboradi.
+    """
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        # my_chat_member hisobga olinmaydi - bu bloklash ham bo'lishi mumkin
+        event = (
+            update.message
+            or update.edited_message
+            or update.callback_query
+            or update.inline_query
+        )
+        if event and event.from_user:
+            activity_tracker.touch(event.from_user.id)
@@ -0,0 +1,207 @@
+# utils/misc/broadcast.py
+# Ko'p foydalanuvchiga xabar tarqatish dvigateli (token bucket + parallel yuboruvchilar)
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterable, Awaitable, Callable, Iterable, Optional, Union
+
+from aiogram.utils import exceptions
+
+logger = logging.getLogger(__name__)
+
+# Telegram cheklovlari: botdan umumiy ~30 xabar/soniya, bitta chatga ~1 xabar/soniya.
+# Bitta tarqatishda har bir chatga bitta xabar ketadi, shuning uchun chat limiti
+# faqat qayta urinishlarda ahamiyatli - ular flood-wait pauzasidan keyin yuboriladi.
+GLOBAL_RATE = 25          # Xabar/soniya (zaxira bilan)
+CONCURRENCY = 10          # Bir vaqtda ishlaydigan yuboruvchilar
+MAX_RETRIES = 3           # RetryAfter dan keyin qayta urinishlar
+
+# Yuborish natijalari
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+BLOCKED_ERRORS = (
+    exceptions.BotBlocked,
+    exceptions.UserDeactivated,
+    exceptions.ChatNotFound,
+)
+
+
+class TokenBucket:
+    """Oddiy token bucket: soniyasiga `rate` ta token, maksimal `capacity` ta"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastEngine:
+    """
+    Xabar tarqatish dvigateli.
+
+    Args:
+        send: `await send(chat_id)` - bitta chatga xabar yuboradigan funksiya
+        rate: Umumiy tezlik (xabar/soniya)
+        concurrency: Parallel yuboruvchilar soni
+        on_result: `await on_result(chat_id, status, error)` - har bir natijadan keyin (ixtiyoriy)
+
+    RetryAfter kelganda faqat bitta coroutine emas, butun pul to'xtaydi.
+    """
+
+    def __init__(
+            self,
+            send: Callable[[int], Awaitable],
+            rate: float = GLOBAL_RATE,
+            concurrency: int = CONCURRENCY,
+            on_result: Callable[[int, str, Optional[str]], Awaitable] = None
+    ):
+        self.send = send
+        self.concurrency = concurrency
+        self.on_result = on_result
+        self.bucket = TokenBucket(rate)
+
+        # Statistika
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.started_at = None
+        self.finished_at = None
+
+        # Boshqaruv
+        self.stopped = False
+        self._running = asyncio.Event()
+        self._running.set()
+        self._resume_at = 0.0  # Flood-wait tugaydigan vaqt (monotonic)
+
+    # ==================== BOSHQARUV ====================
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        self.stopped = True
+        self._running.set()  # Kutayotganlar chiqib ketishi uchun
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    # ==================== STATISTIKA ====================
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+    @property
+    def speed(self) -> float:
+        """O'rtacha tezlik (xabar/soniya)"""
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self, total: int) -> Optional[float]:
+        """Qolgan taxminiy vaqt (soniya)"""
+        speed = self.speed
+        if not speed:
+            return None
+        return max(0, total - self.processed) / speed
+
+    # ==================== ISHGA TUSHIRISH ====================
+
+    async def run(self, recipients: Union[Iterable[int], AsyncIterable[int]]):
+        """Barcha qabul qiluvchilarga yuborish (tugaguncha yoki stop() gacha)"""
+        self.started_at = time.monotonic()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            if hasattr(recipients, '__aiter__'):
+                async for chat_id in recipients:
+                    if self.stopped:
+                        break
+                    await queue.put(chat_id)
+            else:
+                for chat_id in recipients:
+                    if self.stopped:
+                        break
+                    await queue.put(chat_id)
+        finally:
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.finished_at = time.monotonic()
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            chat_id = await queue.get()
+            if chat_id is None:
+                return
+            if self.stopped:
+                continue
+
+            status, error = await self._deliver(chat_id)
+            if status is None:
+                continue  # To'xtatildi - natija hisoblanmaydi
+            if status == SENT:
+                self.sent += 1
+            elif status == BLOCKED:
+                self.blocked += 1
+            else:
+                self.failed += 1
+
+            if self.on_result:
+                try:
+                    await self.on_result(chat_id, status, error)
+                except Exception as e:
+                    logger.error(f"❌ Broadcast natijasini saqlashda xato: {e}")
+
+    async def _wait_turn(self):
+        """Pauza, flood-wait va token bucket ni kutish"""
+        await self._running.wait()
+        while True:
+            # Kutish paytida boshqa yuboruvchi pauzani uzaytirgan bo'lishi mumkin
+            delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        await self.bucket.acquire()
+
+    async def _deliver(self, chat_id: int):
+        for _ in range(MAX_RETRIES + 1):
+            await self._wait_turn()
+            if self.stopped:
+                return None, None
+            try:
+                await self.send(chat_id)
+                return SENT, None
+            except BLOCKED_ERRORS as e:
+                return BLOCKED, str(e)
+            except exceptions.RetryAfter as e:
+                # Butun pulni to'xtatamiz
+                self.flood_waits += 1
+                self._resume_at = max(self._resume_at, time.monotonic() + e.timeout)
+                logger.warning(f"⏳ Flood wait: {e.timeout} s")
+            except Exception as e:
+                return FAILED, str(e)
+        return FAILED, "RetryAfter"
@@ -0,0 +1,216 @@
+# utils/misc/export.py
+# Excel (XLSX) eksport: bazadan bo'laklab o'qish va constant_memory rejimida yozish
+
+import asyncio
+import logging
+import os
+import tempfile
+from contextlib import closing
+from datetime import datetime
+from typing import Optional, Tuple
+
+import pytz
+import xlsxwriter
+from aiogram import types
+
+from loader import user_db
+
+logger = logging.getLogger(__name__)
+
+TASHKENT_TZ = pytz.timezone('Asia/Tashkent')
+
+CHUNK_SIZE = 1000  # Bazadan bir marta o'qiladigan qatorlar
+
+
+def _date(value) -> str:
+    return str(value)[:10] if value else ""
+
+
+def _datetime(value) -> str:
+    return str(value)[:16].replace('T', ' ') if value else ""
+
+
+def _username(value) -> str:
+    return f"@{value}" if value else ""
+
+
+def _text(value) -> str:
+    return value or ""
+
+
+def _yes_no(value) -> str:
+    return "Ha" if value else "Yo'q"
+
+
+# Eksport turi -> sarlavha, fayl nomi va ustunlar (sarlavha, kenglik, formatlovchi).
+# Ustunlar UserDatabase.EXPORT_QUERIES dagi SELECT tartibida.
+EXPORTS = {
+    'not_paid': {
+        'title': "Sotib olmaganlar",
+        'filename': "sotib_olmaganlar",
+        'columns': [
+            ("Ism Familya", 25, lambda v: v or "Noma'lum"),
+            ("Telefon", 18, _text),
+            ("Username", 18, _username),
+            ("Telegram ID", 15, None),
+            ("Ro'yxatdan o'tgan", 15, _date),
+        ],
+    },
+    'users': {
+        'title': "Foydalanuvchilar",
+        'filename': "foydalanuvchilar",
+        'columns': [
+            ("Ism Familya", 25, lambda v: v or "Noma'lum"),
+            ("Telefon", 18, _text),
+            ("Username", 18, _username),
+            ("Telegram ID", 15, None),
+            ("Ball", 8, None),
+            ("Taklif qilgan", 12, None),
+            ("Faol", 8, _yes_no),
+            ("Ro'yxatdan o'tgan", 15, _date),
+            ("Oxirgi faollik", 17, _datetime),
+        ],
+    },
+    'payments': {
+        'title': "To'lovlar",
+        'filename': "tolovlar",
+        'columns': [
+            ("ID", 8, None),
+            ("Ism Familya", 25, _text),
+            ("Telefon", 18, _text),
+            ("Telegram ID", 15, None),
+            ("Kurs", 25, _text),
+            ("Summa", 12, lambda v: float(v or 0)),
+            ("Holat", 12, None),
+            ("Yuborilgan", 17, _datetime),
+            ("Ko'rib chiqilgan", 17, _datetime),
+        ],
+    },
+    'test_results': {
+        'title': "Test natijalari",
+        'filename': "test_natijalari",
+        'columns': [
+            ("ID", 8, None),
+            ("Ism Familya", 25, _text),
+            ("Telegram ID", 15, None),
+            ("Dars", 30, _text),
+            ("Ball (%)", 10, None),
+            ("To'g'ri", 8, None),
+            ("Jami", 8, None),
+            ("O'tdi", 8, _yes_no),
+            ("Sana", 17, _datetime),
+        ],
+    },
+    'referrals': {
+        'title': "Referallar",
+        'filename': "referallar",
+        'columns': [
+            ("ID", 8, None),
+            ("Taklif qiluvchi", 25, _text),
+            ("Taklif qiluvchi ID", 15, None),
+            ("Taklif qilingan", 25, _text),
+            ("Taklif qilingan ID", 15, None),
+            ("Holat", 12, None),
+            ("Bonus", 10, None),
+            ("Sana", 17, _datetime),
+            ("To'lov sanasi", 17, _datetime),
+        ],
+    },
+}
+
+
+def build_xlsx(kind: str) -> Tuple[str, int]:
+    """
+    Eksport faylini vaqtinchalik papkaga yozish (sinxron - alohida oqimda chaqiring)
+
+    xlsxwriter constant_memory rejimida har bir qator yozilishi bilan
+    diskka tushadi, bazadan esa CHUNK_SIZE talab o'qiladi - xotira
+    qatorlar soniga bog'liq emas.
+
+    Xato bo'lsa yarim yozilgan fayl o'chiriladi va xato chaqiruvchiga
+    ko'tariladi. Oqim ulanishi oxirida yopiladi - default executor
+    oqimlari ochiq ulanish qoldirmaydi.
+
+    Returns:
+        (fayl yo'li, qatorlar soni). Faylni chaqiruvchi o'chiradi.
+    """
+    spec = EXPORTS[kind]
+    columns = spec['columns']
+
+    fd, path = tempfile.mkstemp(prefix=f"{spec['filename']}_", suffix=".xlsx")
+    os.close(fd)
+
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        try:
+            worksheet = workbook.add_worksheet(spec['title'][:31])
+            header_format = workbook.add_format({'bold': True, 'align': 'center'})
+
+            # Sarlavhalar va ustun kengliklari
+            worksheet.set_column(0, 0, 6)
+            for col, (header, width, _) in enumerate(columns, 1):
+                worksheet.set_column(col, col, width)
+            worksheet.write_row(0, 0, ["№"] + [header for header, _, _ in columns], header_format)
+
+            count = 0
+            # closing(): yozishda xato bo'lsa kursor ulanish yopilishidan oldin yopiladi
+            with closing(user_db.iter_export_rows(kind, chunk_size=CHUNK_SIZE)) as chunks:
+                for rows in chunks:
+                    for row in rows:
+                        count += 1
+                        values = [count] + [
+                            formatter(value) if formatter else value
+                            for (_, _, formatter), value in zip(columns, row)
+                        ]
+                        worksheet.write_row(count, 0, values)
+        finally:
+            workbook.close()
+    except Exception:
+        # To'liq bo'lmagan fayl adminga yuborilmaydi
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        user_db.close_thread()
+
+    return path, count
+
+
+async def send_export(message: types.Message, kind: str) -> Optional[int]:
+    """
+    Eksportni tayyorlab adminga yuborish
+
+    Fayl event loop dan tashqarida (default executor oqimida) quriladi.
+    DB oqimi (async_user_db) band qilinmaydi - aks holda uzun eksport
+    paytida botning boshqa so'rovlari navbatda kutib qoladi.
+
+    Returns:
+        Qatorlar soni yoki None (xato)
+    """
+    spec = EXPORTS.get(kind)
+    if not spec:
+        return None
+
+    loop = asyncio.get_running_loop()
+    path = None
+    try:
+        path, count = await loop.run_in_executor(None, build_xlsx, kind)
+        if not count:
+            await message.answer("📭 Ma'lumot yo'q")
+            return 0
+
+        filename = f"{spec['filename']}_{datetime.now(TASHKENT_TZ).strftime('%Y%m%d_%H%M')}.xlsx"
+        await message.answer_document(
+            types.InputFile(path, filename=filename),
+            caption=f"📥 <b>{spec['title']}</b>\n\nJami: {count} ta"
+        )
+        return count
+
+    except Exception as e:
+        logger.error(f"❌ Eksport xatosi ({kind}): {e}")
+        await message.answer(f"❌ Xatolik: {e}")
+        return None
+
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,101 @@
+# utils/misc/reminders.py
+# Faol bo'lmagan o'quvchilarga kunlik eslatma (orqa fon vazifasi)
+
+import asyncio
+import logging
+from datetime import datetime
+
+import pytz
+
+from loader import bot, async_user_db, user_db
+from utils.misc.broadcast import BroadcastEngine, BLOCKED
+
+logger = logging.getLogger(__name__)
+
+TASHKENT_TZ = pytz.timezone('Asia/Tashkent')
+
+BATCH_SIZE = 500      # Bir marta band qilinadigan userlar soni
+CHECK_INTERVAL = 60   # Jadvalni tekshirish oralig'i (soniya)
+
+REMINDER_TEXT = (
+    "👋 <b>Salom!</b>\n\n"
+    "Sizni sog'indik! Darslaringizni davom ettiring va yangi bilimlar oling. 📚\n\n"
+    "Davom etish uchun /start buyrug'ini yuboring."
+)
+
+_lock = asyncio.Lock()  # Qo'lda va avtomatik yuborish bir vaqtda ishlamasin
+
+
+def is_running() -> bool:
+    return _lock.locked()
+
+
+async def _recipients(days: int):
+    """Eslatma oluvchilarni guruhlab band qilish (har bir guruh bitta tranzaksiya)"""
+    while True:
+        telegram_ids = await async_user_db.claim_reminder_batch(days=days, limit=BATCH_SIZE)
+        if not telegram_ids:
+            return
+        for telegram_id in telegram_ids:
+            yield telegram_id
+
+
+async def send_reminders() -> dict:
+    """
+    Eslatmalarni yuborish (tezlik limiti va flood-wait BroadcastEngine da)
+
+    Returns:
+        {'sent', 'blocked', 'failed'} yoki None (allaqachon ishlayapti)
+    """
+    if _lock.locked():
+        return None
+
+    async with _lock:
+        days = user_db.get_setting_int('reminder_days', 3)
+        dead = []
+
+        async def on_result(telegram_id, status, error):
+            if status == BLOCKED:
+                dead.append(telegram_id)
+
+        engine = BroadcastEngine(
+            lambda telegram_id: bot.send_message(telegram_id, REMINDER_TEXT),
+            on_result=on_result
+        )
+        await engine.run(_recipients(days))
+
+        # Botni bloklaganlarga keyingi safar yuborilmaydi
+        await async_user_db.mark_undeliverable(dead)
+
+        stats = {'sent': engine.sent, 'blocked': engine.blocked, 'failed': engine.failed}
+        logger.info(f"⏰ Eslatmalar: {stats}")
+        return stats
+
+
+async def reminder_scheduler():
+    """
+    Har kuni `reminder_hour` da eslatmalarni yuborish (bot ishga tushganda boshlanadi)
+
+    Sozlamalar har daqiqada (keshdan) o'qiladi, set_setting keshni tozalaydi,
+    shuning uchun admin soatni o'zgartirsa bot qayta ishga tushirilmasdan
+    kuchga kiradi.
+    """
+    last_run_date = None
+    while True:
+        await asyncio.sleep(CHECK_INTERVAL)
+        try:
+            now = datetime.now(TASHKENT_TZ)
+            if last_run_date == now.date():
+                continue
+            # Sozlamalar keshdan o'qiladi - har daqiqadagi tekshiruv bazaga tegmaydi
+            if not user_db.get_setting_bool('reminder_enabled', True):
+                continue
+            if now.hour != user_db.get_setting_int('reminder_hour', 10):
+                continue
+
+            last_run_date = now.date()
+            await send_reminders()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Kunlik eslatmada xato: {e}")
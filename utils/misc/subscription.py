@@ -1,15 +1,25 @@
 # utils/misc/subscription.py
 # Kanal obunasini tekshirish
 
-from typing import Union
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
 from aiogram import Bot
 from aiogram.utils.exceptions import ChatNotFound, Unauthorized, BotKicked, BadRequest
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Obuna holati keshi: (user_id, kanal) -> (tugash vaqti, obuna bo'lganmi)
+SUBSCRIBED_TTL = 300       # Obuna bo'lganlar 5 daqiqa qayta tekshirilmaydi
+NOT_SUBSCRIBED_TTL = 30    # Obuna bo'lmaganlar tezroq qayta tekshiriladi
+CACHE_SIZE = 50000         # Maksimal yozuvlar soni (LRU)
 
-async def check(user_id: int, channel: Union[int, str], bot: Bot = None) -> bool:
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+async def check(user_id: int, channel: Union[int, str], bot: Bot = None) -> Optional[bool]:
     """
     Foydalanuvchi kanalga obuna bo'lganligini tekshirish
 
@@ -19,7 +29,8 @@ async def check(user_id: int, channel: Union[int, str], bot: Bot = None) -> bool
         bot: Bot instance (optional, agar berilmasa loader'dan oladi)
 
     Returns:
-        bool: True - obuna bo'lgan, False - obuna bo'lmagan
+        True - obuna bo'lgan, False - obuna bo'lmagan,
+        None - tekshirib bo'lmadi (API xatosi, kanal/bot muammosi)
     """
     try:
         # Bot instance olish
@@ -38,24 +49,106 @@ async def check(user_id: int, channel: Union[int, str], bot: Bot = None) -> bool
     except ChatNotFound:
         # Kanal topilmadi - botni kanaldan olib tashlashgan
         logger.warning(f"⚠️ Kanal topilmadi: {channel}")
-        return True  # Xato bo'lsa, user'ni o'tkazamiz
+        return None
 
     except Unauthorized:
         # Bot kanalda yo'q yoki ban qilingan
         logger.warning(f"⚠️ Bot kanalda yo'q: {channel}")
-        return True  # Xato bo'lsa, user'ni o'tkazamiz
+        return None
 
     except BotKicked:
         # Bot kanaldan chiqarilgan
         logger.warning(f"⚠️ Bot kanaldan chiqarilgan: {channel}")
-        return True
+        return None
 
     except BadRequest as e:
         # Noto'g'ri so'rov
         logger.warning(f"⚠️ BadRequest: {channel} - {e}")
-        return True
+        return None
 
     except Exception as e:
         # Boshqa xatolar
         logger.error(f"❌ Obuna tekshirishda xato: {channel} - {e}")
-        return True  # Xato bo'lsa, user'ni o'tkazamiz (UX uchun yaxshi)
\ No newline at end of file
+        return None
+
+
+def _get_cached(user_id: int, channel: Union[int, str]):
+    """Keshdagi holat (muddati o'tgan bo'lsa None)"""
+    key = (user_id, channel)
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    expires_at, is_subscribed = entry
+    if expires_at < time.monotonic():
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return is_subscribed
+
+
+def _set_cached(user_id: int, channel: Union[int, str], is_subscribed: bool):
+    ttl = SUBSCRIBED_TTL if is_subscribed else NOT_SUBSCRIBED_TTL
+    _cache[(user_id, channel)] = (time.monotonic() + ttl, is_subscribed)
+    _cache.move_to_end((user_id, channel))
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def invalidate(user_id: int = None):
+    """Obuna keshini tozalash (None - hammasini)"""
+    if user_id is None:
+        _cache.clear()
+        return
+    for key in [k for k in _cache if k[0] == user_id]:
+        del _cache[key]
+
+
+async def check_cached(user_id: int, channel: Union[int, str], bot: Bot = None, recheck_negative: bool = False) -> bool:
+    """
+    check() ning keshlangan varianti
+
+    Args:
+        recheck_negative: True - "obuna emas" natijasini keshdan olmasdan qayta tekshirish
+
+    Faqat aniq javob (obuna / obuna emas) keshlanadi. Tekshirib bo'lmasa
+    user o'tkaziladi (UX uchun), lekin keyingi so'rovda qayta tekshiriladi -
+    bitta vaqtinchalik API xatosi 5 daqiqalik ruxsatga aylanmaydi.
+    """
+    cached = _get_cached(user_id, channel)
+    if cached is not None and (cached or not recheck_negative):
+        return cached
+
+    is_subscribed = await check(user_id=user_id, channel=channel, bot=bot)
+    if is_subscribed is None:
+        return True  # Xato bo'lsa, user'ni o'tkazamiz
+    _set_cached(user_id, channel, is_subscribed)
+    return is_subscribed
+
+
+async def get_not_subscribed(user_id: int, channels: list, recheck_negative: bool = False) -> List[Dict]:
+    """
+    Foydalanuvchi obuna bo'lmagan kanallar ro'yxati
+
+    Args:
+        channels: channel_db.get_all_channels() natijasi
+        recheck_negative: True - "obuna emas" holatlarini qayta tekshirish
+
+    Keshda yo'q kanallar bir vaqtda (asyncio.gather) tekshiriladi.
+    """
+    results = await asyncio.gather(
+        *(check_cached(user_id, channel[1], recheck_negative=recheck_negative) for channel in channels),
+        return_exceptions=True
+    )
+
+    not_subscribed = []
+    for channel, is_subscribed in zip(channels, results):
+        if isinstance(is_subscribed, Exception):
+            logger.error(f"❌ Kanal tekshirishda xato: {channel} - {is_subscribed}")
+            continue
+        if not is_subscribed:
+            not_subscribed.append({
+                'id': channel[1],
+                'title': channel[2],
+                'link': channel[3]
+            })
+    return not_subscribed